@@ -0,0 +1,500 @@
+# -*- coding: utf-8 -*-
+"""
+WebDriver 连接池模块
+
+抓取百度股市通页面时复用预热好的 Chrome 实例，避免每次取数都冷启动浏览器：
+- 有界：同时存在的 driver 数量不超过 `size`
+- 线程安全：多个抓取线程可同时借用/归还
+- 健康检查：借出前检查 driver 是否仍可用，失效的直接丢弃并重建
+- 回收：单个 driver 打开页面数达到 `max_pages` 后退出重建
+"""
+import atexit
+import os
+import shutil
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Callable, Optional, List
+
+try:
+    import fcntl
+except ImportError:  # Windows 上没有 flock，退化为不加锁
+    fcntl = None
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chrome.options import Options
+from selenium.common.exceptions import SessionNotCreatedException, TimeoutException
+from webdriver_manager.chrome import ChromeDriverManager
+
+from config.settings import settings
+from config.logging_config import get_logger
+from apps.core.stock.watchdog import current_deadline
+
+logger = get_logger(__name__)
+
+
+# 精简模式下按资源类型屏蔽的 URL 模式（Network.setBlockedURLs 通配符）
+RESOURCE_URL_PATTERNS = {
+    'image': ["*.png*", "*.jpg*", "*.jpeg*", "*.gif*", "*.webp*", "*.svg*", "*.ico*"],
+    'font': ["*.woff*", "*.ttf*", "*.otf*", "*.eot*"],
+    'stylesheet': ["*.css*"],
+    'media': ["*.mp4*", "*.webm*", "*.mp3*", "*.m3u8*"],
+}
+
+
+def _split_setting(value: str):
+    return [v.strip() for v in (value or "").split(',') if v.strip()]
+
+
+def blocked_url_patterns(resource_types=None, extra_urls=None):
+    """根据屏蔽的资源类型与额外的 URL 黑名单，生成 Network.setBlockedURLs 使用的模式列表"""
+    if resource_types is None:
+        resource_types = _split_setting(settings.CHROME_BLOCKED_RESOURCES)
+    if extra_urls is None:
+        extra_urls = _split_setting(settings.CHROME_BLOCKED_URLS)
+
+    patterns = []
+    for resource_type in resource_types:
+        if resource_type not in RESOURCE_URL_PATTERNS:
+            logger.warning(f"未知的屏蔽资源类型: {resource_type}")
+            continue
+        patterns.extend(RESOURCE_URL_PATTERNS[resource_type])
+    patterns.extend(extra_urls)
+    return patterns
+
+
+def worker_profile_dir(worker_id: int) -> Optional[Path]:
+    """返回第 worker_id 个池内浏览器的持久化用户目录；未配置 `CHROME_PROFILE_DIR` 时返回 None"""
+    if not settings.CHROME_PROFILE_DIR:
+        return None
+    return Path(settings.CHROME_PROFILE_DIR).expanduser().resolve() / f"worker-{worker_id}"
+
+
+# 持久化用户目录的锁文件：使用中的浏览器在其上持有 flock
+PROFILE_LOCK_FILE = ".lock"
+
+
+def _try_flock(lock_file: Path):
+    """以非阻塞方式对 lock_file 加独占 flock，成功返回打开的文件对象，已被占用时返回 None"""
+    handle = open(lock_file, "a")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+class ProfileLock:
+    """持久化用户目录的独占锁；文件描述符不会被 Chrome 子进程继承，本进程退出（含崩溃）时由内核自动释放"""
+
+    def __init__(self, path: Path, handle):
+        self.path = path
+        self._handle = handle
+
+    def release(self):
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def lock_profile_dir(worker_id: int) -> Optional[ProfileLock]:
+    """从 `worker-{worker_id}` 开始依次尝试，锁住第一个未被其他浏览器（含其他进程）占用的用户目录
+
+    常驻调度器与同时运行的 `main.py --fetch` 等进程因此不会打开同一个 user-data-dir；
+    未配置 `CHROME_PROFILE_DIR` 时返回 None。
+    """
+    if not settings.CHROME_PROFILE_DIR:
+        return None
+    index = worker_id
+    while True:
+        path = worker_profile_dir(index)
+        path.mkdir(parents=True, exist_ok=True)
+        handle = _try_flock(path / PROFILE_LOCK_FILE)
+        if handle is not None:
+            return ProfileLock(path, handle)
+        index += 1
+
+
+def release_profile_lock(driver):
+    """释放 `create_chrome_driver` 为该浏览器持有的用户目录锁"""
+    lock = getattr(driver, "profile_lock", None)
+    if isinstance(lock, ProfileLock):
+        lock.release()
+
+
+def _lock_for_removal(path: Path):
+    """锁住目录及其下一层子目录（抓取子进程的 process-N/worker-N）中的全部锁文件；
+
+    任一目录正被浏览器使用时返回 None，否则返回持有的文件对象列表（删除完成后关闭）。
+    """
+    handles = []
+    for lock_file in [path / PROFILE_LOCK_FILE, *path.glob(f"*/{PROFILE_LOCK_FILE}")]:
+        if not lock_file.exists():
+            continue
+        handle = _try_flock(lock_file)
+        if handle is None:
+            for held in handles:
+                held.close()
+            return None
+        handles.append(handle)
+    return handles
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def enforce_profile_size_cap(max_mb: Optional[int] = None) -> List[Path]:
+    """持久化用户目录总大小超过上限时，从最大的 worker 目录开始删除，返回被删除的目录
+
+    正被浏览器使用（锁文件被占用）的目录会被跳过，其他进程中运行的浏览器不受影响。
+    """
+    if not settings.CHROME_PROFILE_DIR:
+        return []
+    base = Path(settings.CHROME_PROFILE_DIR).expanduser().resolve()
+    if not base.exists():
+        return []
+
+    max_bytes = int(settings.CHROME_PROFILE_MAX_MB if max_mb is None else max_mb) * 1024 * 1024
+    # process-N 为抓取子进程（见 worker_supervisor）各自的用户目录
+    dirs = [path for pattern in ("worker-*", "process-*") for path in base.glob(pattern) if path.is_dir()]
+    sizes = {path: _dir_size(path) for path in dirs}
+    total = sum(sizes.values())
+
+    removed = []
+    skipped = []
+    for path, size in sorted(sizes.items(), key=lambda kv: kv[1], reverse=True):
+        # 上限为 0 时（手动清理）删除全部未使用的目录
+        if max_bytes > 0 and total <= max_bytes:
+            break
+        handles = _lock_for_removal(path)
+        if handles is None:
+            skipped.append(path)
+            continue
+        try:
+            shutil.rmtree(path, ignore_errors=True)
+        finally:
+            for handle in handles:
+                handle.close()
+        total -= size
+        removed.append(path)
+
+    if removed:
+        logger.info(f"浏览器用户目录超过 {max_bytes // (1024 * 1024)}MB 上限，已清理: {[str(p) for p in removed]}")
+    if skipped:
+        logger.info(f"以下浏览器用户目录正在使用，跳过清理: {[str(p) for p in skipped]}")
+    return removed
+
+
+def cleanup_profile_dirs() -> List[Path]:
+    """删除所有未被使用的持久化浏览器用户目录与磁盘缓存，返回被删除的目录"""
+    return enforce_profile_size_cap(max_mb=0)
+
+
+def build_chrome_options(profile_dir: Optional[Path] = None) -> Options:
+    """构造抓取使用的 Chrome 选项
+
+    `CHROME_LEAN_PROFILE` 开启时使用精简配置：不加载图片、关闭扩展/GPU/后台网络等，
+    其余资源类型与第三方脚本在 driver 创建后通过 DevTools 屏蔽（见 `apply_network_blocking`）。
+    指定 `profile_dir` 时使用持久化的用户目录与磁盘缓存，重复加载页面时静态资源直接走缓存。
+    """
+    chrome_options = Options()
+    chrome_options.page_load_strategy = 'eager'  # 等待DOM加载完成
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+
+    if profile_dir is not None:
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+        chrome_options.add_argument(f"--disk-cache-dir={profile_dir / 'cache'}")
+        chrome_options.add_argument(f"--disk-cache-size={int(settings.CHROME_DISK_CACHE_MB) * 1024 * 1024}")
+
+    if settings.CHROME_HEADLESS:
+        chrome_options.add_argument("--headless=new")
+        chrome_options.add_argument("--window-size=1280,900")
+
+    if settings.CHROME_LEAN_PROFILE:
+        for argument in (
+            "--disable-gpu",
+            "--disable-extensions",
+            "--disable-background-networking",
+            "--disable-component-update",
+            "--disable-default-apps",
+            "--disable-sync",
+            "--mute-audio",
+            "--no-first-run",
+            "--blink-settings=imagesEnabled=false",
+        ):
+            chrome_options.add_argument(argument)
+        chrome_options.add_experimental_option("prefs", {
+            "profile.managed_default_content_settings.images": 2,
+            "profile.default_content_setting_values.notifications": 2,
+        })
+
+    return chrome_options
+
+
+def apply_network_blocking(driver, patterns=None):
+    """通过 DevTools 协议屏蔽指定 URL（字体、CSS、统计/广告等第三方脚本）"""
+    patterns = blocked_url_patterns() if patterns is None else patterns
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+    except Exception as e:
+        logger.warning(f"设置 URL 屏蔽失败: {e}")
+
+
+_chromedriver_path: Optional[str] = None
+_chromedriver_lock = threading.Lock()
+
+
+def _chromedriver_cache_file() -> Optional[Path]:
+    if not settings.CHROMEDRIVER_CACHE_FILE:
+        return None
+    return Path(settings.CHROMEDRIVER_CACHE_FILE).expanduser()
+
+
+def resolve_chromedriver_path(refresh: bool = False) -> str:
+    """解析 chromedriver 路径，每个进程只解析一次
+
+    优先级：`CHROMEDRIVER_PATH` 指定的本地路径 > 缓存文件中记录的路径 > `ChromeDriverManager().install()`
+    （结果写入缓存文件供后续进程直接使用）。`refresh=True` 时忽略缓存重新下载/解析。
+    """
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path and not refresh:
+            return _chromedriver_path
+
+        if settings.CHROMEDRIVER_PATH:
+            if not os.path.exists(settings.CHROMEDRIVER_PATH):
+                raise RuntimeError(f"CHROMEDRIVER_PATH 指定的 chromedriver 不存在: {settings.CHROMEDRIVER_PATH}")
+            _chromedriver_path = settings.CHROMEDRIVER_PATH
+            return _chromedriver_path
+
+        cache_file = _chromedriver_cache_file()
+        if cache_file is not None and cache_file.exists() and not refresh:
+            cached = cache_file.read_text(encoding='utf-8').strip()
+            if cached and os.path.exists(cached):
+                _chromedriver_path = cached
+                logger.info(f"使用缓存的 chromedriver: {cached}")
+                return _chromedriver_path
+
+        path = ChromeDriverManager().install()
+        if cache_file is not None:
+            try:
+                cache_file.parent.mkdir(parents=True, exist_ok=True)
+                cache_file.write_text(path, encoding='utf-8')
+            except OSError as e:
+                logger.warning(f"写入 chromedriver 缓存文件失败: {e}")
+        _chromedriver_path = path
+        logger.info(f"✅ 已解析 chromedriver: {path}")
+        return _chromedriver_path
+
+
+def _start_chrome(service: Service, options: Options):
+    """启动浏览器；启动期间 chromedriver 进程登记到当前抓取的截止时间，卡住时可被看门狗杀掉"""
+    deadline = current_deadline()
+    if deadline is not None:
+        deadline.attach(service)
+    try:
+        return webdriver.Chrome(service=service, options=options)
+    finally:
+        if deadline is not None:
+            deadline.detach(service)
+
+
+def create_chrome_driver(worker_id: int = 0):
+    """创建一个新的 Chrome WebDriver 实例；配置了 `CHROME_PROFILE_DIR` 时锁定一个空闲的持久化用户目录
+
+    目录锁保存在 `driver.profile_lock` 上，浏览器退出后由 `release_profile_lock` 释放。
+    """
+    profile_lock = lock_profile_dir(worker_id)
+    options = build_chrome_options(profile_lock.path if profile_lock else None)
+    try:
+        try:
+            driver = _start_chrome(Service(resolve_chromedriver_path()), options)
+        except SessionNotCreatedException:
+            if settings.CHROMEDRIVER_PATH:
+                raise
+            # 缓存的 chromedriver 与升级后的 Chrome 版本不匹配时重新解析一次
+            logger.warning("chromedriver 与 Chrome 版本不匹配，重新解析 chromedriver")
+            driver = _start_chrome(Service(resolve_chromedriver_path(refresh=True)), options)
+    except Exception:
+        if profile_lock is not None:
+            profile_lock.release()
+        raise
+    driver.profile_lock = profile_lock
+    if settings.CHROME_LEAN_PROFILE:
+        apply_network_blocking(driver)
+    return driver
+
+
+class PooledDriver:
+    """池中的 driver 包装，记录已打开的页面数与是否已损坏"""
+
+    def __init__(self, driver, worker_id: int = 0):
+        self.driver = driver
+        self.worker_id = worker_id
+        self.pages = 0
+        self.broken = False
+
+    def mark_page(self):
+        """记录一次页面访问"""
+        self.pages += 1
+
+    def mark_broken(self):
+        """标记 driver 已损坏，归还时将被丢弃"""
+        self.broken = True
+
+
+class DriverPool:
+    def __init__(self, size: int = 2, max_pages: int = 50, driver_factory: Optional[Callable] = None):
+        """
+        有界、线程安全的 WebDriver 池
+
+        参数:
+            size (int): 池中最多同时存在的 driver 数量
+            max_pages (int): 单个 driver 最多打开的页面数，超过后回收重建（<=0 表示不限制）
+            driver_factory (callable): 创建 driver 的工厂函数 `factory(worker_id)`，默认 `create_chrome_driver`；
+                worker_id 在池内唯一（0 ~ size-1），作为查找空闲持久化用户目录（`worker-N`）的起点
+        """
+        self.size = max(1, int(size))
+        self.max_pages = int(max_pages)
+        self.driver_factory = driver_factory or create_chrome_driver
+
+        self._idle: List[PooledDriver] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._free_worker_ids = list(range(self.size - 1, -1, -1))
+        self._closed = False
+
+    def _is_healthy(self, item: PooledDriver) -> bool:
+        """健康检查：访问 window_handles 会与 chromedriver 通信，浏览器崩溃时会抛异常"""
+        if item.broken:
+            return False
+        if self.max_pages > 0 and item.pages >= self.max_pages:
+            return False
+        try:
+            return bool(item.driver.window_handles)
+        except Exception:
+            return False
+
+    def _quit(self, item: PooledDriver):
+        try:
+            item.driver.quit()
+        except Exception as e:
+            logger.warning(f"关闭 WebDriver 失败: {e}")
+        finally:
+            release_profile_lock(item.driver)
+            with self._lock:
+                self._free_worker_ids.append(item.worker_id)
+
+    def _create(self) -> PooledDriver:
+        with self._lock:
+            worker_id = self._free_worker_ids.pop()
+        try:
+            return PooledDriver(self.driver_factory(worker_id), worker_id)
+        except Exception:
+            with self._lock:
+                self._free_worker_ids.append(worker_id)
+            raise
+
+    def acquire(self, timeout: Optional[float] = None) -> PooledDriver:
+        """借出一个可用的 driver；池已满时阻塞等待（可设置超时）"""
+        if self._closed:
+            raise RuntimeError("WebDriver 池已关闭")
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError("等待可用 WebDriver 超时")
+
+        try:
+            while True:
+                with self._lock:
+                    item = self._idle.pop() if self._idle else None
+                if item is None:
+                    return self._create()
+                if self._is_healthy(item):
+                    return item
+                logger.info(f"回收 WebDriver（已打开 {item.pages} 个页面，broken={item.broken}）")
+                self._quit(item)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, item: PooledDriver):
+        """归还 driver；损坏、超过页面上限或池已关闭时直接退出"""
+        try:
+            if self._closed or not self._is_healthy(item):
+                self._quit(item)
+            else:
+                with self._lock:
+                    self._idle.append(item)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def driver(self, timeout: Optional[float] = None):
+        """借用 driver 的上下文管理器，异常时将 driver 标记为损坏"""
+        item = self.acquire(timeout=timeout)
+        try:
+            yield item
+        except TimeoutException:
+            # 等待元素超时不代表浏览器损坏，driver 可继续复用
+            raise
+        except Exception:
+            item.mark_broken()
+            raise
+        finally:
+            self.release(item)
+
+    def shutdown(self):
+        """关闭池中所有空闲 driver；借出中的 driver 会在归还时退出"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for item in idle:
+            self._quit(item)
+        if idle:
+            logger.info(f"✅ 已关闭 {len(idle)} 个 WebDriver")
+
+
+_pool: Optional[DriverPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_driver_pool() -> DriverPool:
+    """获取进程级共享的 WebDriver 池（惰性创建）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool._closed:
+            # 创建浏览器前先按上限清理未被使用的持久化用户目录，并解析好 chromedriver 路径
+            enforce_profile_size_cap()
+            resolve_chromedriver_path()
+            _pool = DriverPool(
+                size=settings.DRIVER_POOL_SIZE,
+                max_pages=settings.DRIVER_MAX_PAGES,
+            )
+        return _pool
+
+
+def shutdown_driver_pool():
+    """关闭进程级共享的 WebDriver 池（调度器退出时调用）"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown()
+
+
+atexit.register(shutdown_driver_pool)
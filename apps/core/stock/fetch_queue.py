@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+抓取优先队列模块
+
+每轮抓取前用优先队列为关注列表排序，使最可能触发告警的股票先被抓取、写入与告警：
+1. 用户设置的优先级（`stock_concern.priority`，越大越先）；
+2. 紧迫度：最新价格到最近阈值的相对距离，按距上次抓取的时间（陈旧度）折减——
+   离阈值越近、越久没有抓取的股票越先抓取；从未抓取过的股票最先抓取。
+"""
+import heapq
+import threading
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+from apps.core.stock.last_quotes import LastQuoteBook, get_last_quote_book
+from apps.core.stock.polling import threshold_distance
+
+# 没有设置阈值时视为距离阈值 100%，只按陈旧度排序
+_NO_THRESHOLD_DISTANCE = 1.0
+
+
+class FetchPriorityQueue:
+    def __init__(self, staleness_seconds: float = 300, book: Optional[LastQuoteBook] = None):
+        """
+        按优先级为每轮抓取排序
+
+        参数:
+            staleness_seconds (float): 陈旧度尺度（秒）：距上次抓取每过这么久，紧迫度中的阈值距离折减一倍
+            book (LastQuoteBook): 每只股票最近一次写入的行情，默认使用进程内共享的实例
+        """
+        self.staleness_seconds = max(float(staleness_seconds), 1.0)
+        self.book = book if book is not None else get_last_quote_book()
+
+    def priority_key(self, stock: dict, now: Optional[float] = None) -> Tuple[int, float]:
+        """排序键（越小越先抓取）：(-用户优先级, 紧迫度)"""
+        try:
+            user_priority = int(stock.get('priority') or 0)
+        except (TypeError, ValueError):
+            user_priority = 0
+
+        last = self.book.get(stock.get('stock_code'))
+        if last is None or not last['price']:
+            return -user_priority, 0.0
+
+        distance = threshold_distance(last['price'], stock.get('price_low'), stock.get('price_high'))
+        if distance is None:
+            distance = _NO_THRESHOLD_DISTANCE
+        fetched_at = last.get('fetched_at')
+        now = now if now is not None else self.book.clock()
+        age = max(now - fetched_at, 0.0) if fetched_at else self.staleness_seconds
+        return -user_priority, min(distance, _NO_THRESHOLD_DISTANCE) / (1.0 + age / self.staleness_seconds)
+
+    def order(self, storage, stocks: List[dict]) -> List[dict]:
+        """返回按优先级从高到低排列的关注列表（优先级相同时保持原有顺序）"""
+        self.book.seed(storage, stocks)
+        now = self.book.clock()
+        heap = [(self.priority_key(stock, now), index, stock) for index, stock in enumerate(stocks)]
+        heapq.heapify(heap)
+        return [heapq.heappop(heap)[2] for _ in range(len(heap))]
+
+
+_queue: Optional[FetchPriorityQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_fetch_queue() -> FetchPriorityQueue:
+    """获取进程内共享的抓取优先队列"""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = FetchPriorityQueue(settings.FETCH_STALENESS_SECONDS)
+        return _queue
@@ -1,23 +1,52 @@
 # -*- coding: utf-8 -*-
 import os
-import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
+import time
+from collections import deque
+from contextlib import contextmanager
 from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+from selenium.common.exceptions import TimeoutException
 import logging
 from typing import Optional, Dict
 
 
 
 # 导入日志配置
+from config.settings import settings
 from config.logging_config import get_logger
+from apps.core.stock import quote_parser
+from apps.core.stock.quote_corpus import record_fragments
+from apps.core.stock.driver_pool import apply_network_blocking, get_driver_pool
+from apps.core.stock.watchdog import FetchDeadlineExceeded, current_deadline, fetch_deadline
 logger = get_logger(__name__)
 
+# 股票页面中的交易信息（价格/时间）与盘口信息（PE/PB 等）区块
+TRADING_SELECTOR = "div.trading-info-box"
+PANKOU_SELECTOR = "div.pankou-fold-box"
+
+# 在浏览器内一次性提取价格、时间与盘口键值对（arguments[0]/[1] 为交易/盘口区块选择器），
+# 只回传紧凑的 JSON，避免传输 outerHTML 并在 Python 侧重新解析 DOM
+QUOTE_EXTRACT_SCRIPT = """
+var text = function (root, selector) {
+    var el = root ? root.querySelector(selector) : null;
+    return el ? el.textContent.trim() : null;
+};
+var trading = document.querySelector(arguments[0]);
+if (!trading) { return null; }
+var pankou = {};
+var pankouBox = document.querySelector(arguments[1]);
+if (pankouBox) {
+    var items = pankouBox.querySelectorAll('div.pankou-item');
+    for (var i = 0; i < items.length; i++) {
+        var key = text(items[i], 'div.key');
+        var value = text(items[i], 'div.value');
+        if (key && value !== null) { pankou[key] = value; }
+    }
+}
+return {price: text(trading, 'div.price'), time: text(trading, 'div.time-text'), pankou: pankou};
+"""
+
 def get_chrome_path():
     """获取Chrome浏览器在macOS上的默认安装路径"""
     possible_paths = [
@@ -30,115 +59,138 @@ def get_chrome_path():
     return None
 
 def get_element_without_full_load(url, element_selector, timeout=10):
-    """不等待页面完全加载就获取元素"""
+    """不等待页面完全加载就获取元素（从 WebDriver 池借用浏览器）"""
+    return get_elements_without_full_load(url, [element_selector], timeout).get(element_selector)
+
+def _load_and_wait(driver, url, element_selectors, timeout):
+    """访问页面并等待所有选择器对应的元素出现且可见，返回 {selector: WebElement 或 None}
+
+    所有选择器共享同一个 `timeout` 预算。
+    """
+    elements = {selector: None for selector in element_selectors}
+
+    # 访问页面（不会等待全部资源加载）
+    driver.get(url)
+
+    deadline = time.monotonic() + timeout
+    for selector in element_selectors:
+        remaining = max(deadline - time.monotonic(), 0.1)
+        try:
+            # 显式等待元素出现
+            wait = WebDriverWait(driver, remaining)
+            element = wait.until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, selector))
+            )
+
+            # 确保元素可见
+            wait.until(EC.visibility_of(element))
+            elements[selector] = element
+        except TimeoutException:
+            logger.warning(f"等待元素超时: {selector} ({url})")
+
+    return elements
+
+@contextmanager
+def _borrow_driver():
+    """从 WebDriver 池借用浏览器，并登记到当前抓取的截止时间（超时时由看门狗杀掉）"""
+    deadline = current_deadline()
+    pool = get_driver_pool()
+    with pool.driver(timeout=deadline.remaining() if deadline else None) as item:
+        if deadline is not None:
+            deadline.attach(item.driver)
+        try:
+            item.mark_page()
+            yield item
+        finally:
+            if deadline is not None:
+                deadline.detach(item.driver)
+                if deadline.expired:
+                    # 看门狗已杀掉该浏览器，归还时直接丢弃
+                    item.mark_broken()
+
+def _wait_timeout(timeout):
+    """等待元素的超时时间不超过当前抓取截止时间的剩余时间"""
+    deadline = current_deadline()
+    return min(timeout, deadline.remaining(timeout)) if deadline else timeout
+
+def get_elements_without_full_load(url, element_selectors, timeout=10):
+    """加载一次页面，等待所有选择器对应的元素出现，返回 {selector: outerHTML}
+
+    所有选择器共享同一个 `timeout` 预算；某个选择器超时或失败时其值为 None，
+    已获取到的其余片段仍然返回。
+    """
+    results = {selector: None for selector in element_selectors}
+    try:
+        with _borrow_driver() as item:
+            elements = _load_and_wait(item.driver, url, element_selectors, _wait_timeout(timeout))
+
+            # 获取元素内容
+            for selector, element in elements.items():
+                if element is not None:
+                    results[selector] = element.get_attribute("outerHTML")
+
+            return results
+
+    except Exception as e:
+        logger.warning(f"获取元素失败：{e}")
+        return results
+
+def get_quote_from_page(url, stock_path_code: str, timeout=10):
+    """加载一次页面，等待交易/盘口区块出现后从该页面提取行情（见 `_harvest_tab`）：
+
+    优先执行一次 QUOTE_EXTRACT_SCRIPT 在浏览器内提取，脚本未取到价格时直接读取同一页面上
+    已加载区块的 outerHTML 解析，不会为回退再加载一次页面；加载失败时返回 None。
+    """
     try:
-        # 配置Chrome选项
-        chrome_options = Options()
-        chrome_options.page_load_strategy = 'eager'  # 等待DOM加载完成
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        # 初始化WebDriver
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        # 访问页面（不会等待全部资源加载）
-        driver.get(url)
-        
-        # 显式等待元素出现
-        wait = WebDriverWait(driver, timeout)
-        element = wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, element_selector))
-        )
-        
-        # 确保元素可见
-        wait.until(EC.visibility_of(element))
-        
-        # 获取元素内容
-        element_text = element.text
-        element_html = element.get_attribute("outerHTML")
-        
-        # print(f"成功获取元素，文本内容：{element_text[:100]}...")
-        return element_html
-        
+        with _borrow_driver() as item:
+            _load_and_wait(item.driver, url, [TRADING_SELECTOR, PANKOU_SELECTOR], _wait_timeout(timeout))
+            return _harvest_tab(item.driver, stock_path_code)
+
     except Exception as e:
-        print(f"获取元素失败：{e}")
-        import traceback
-        traceback.print_exc()
+        logger.warning(f"提取行情失败: {e} ({url})")
         return None
-        
-    finally:
-        if 'driver' in locals():
-            driver.quit()
 
 def parse_html(html_content):
     """解析盘口数据的HTML内容"""
-    # 创建BeautifulSoup解析对象
-    soup = BeautifulSoup(html_content, 'lxml')  # 使用lxml解析器
-    
-    pankou_data = {}
-
-    # 示例1：获取所有段落文本
-    print("=== 所有段落文本 ===")
-    pankou_items = soup.find_all('div', class_ = 'pankou-item')
-    for item in pankou_items:
-        key_div = item.find('div', class_='key')
-        if key_div:
-            key = key_div.get_text(strip=True)
-            value_div = item.find('div', class_='value')
-            if value_div:
-                value=value_div.get_text(strip=True)
-                pankou_data[key] = value
-    logger.info(pankou_data)
-    
+    pankou_data = quote_parser.parse_pankou_html(html_content)
+    logger.debug(pankou_data)
     return pankou_data
 
 def fetch_stock_by_element_selector(stock_path_code: str, element_selector: str):
     """抓取指定元素的股票数据"""
+    return fetch_stock_by_element_selectors(stock_path_code, [element_selector]).get(element_selector)
+
+def fetch_stock_by_element_selectors(stock_path_code: str, element_selectors):
+    """加载一次股票页面，抓取多个元素，返回 {selector: html}"""
+    url = f"https://gushitong.baidu.com/stock/{stock_path_code}"
+
+    return get_elements_without_full_load(url, element_selectors)
+
+def fetch_stock_by_script(stock_path_code: str):
+    """加载一次股票页面，优先在浏览器内用脚本提取行情（失败时在同一页面回退到 HTML 解析），返回行情 dict 或 None"""
     url = f"https://gushitong.baidu.com/stock/{stock_path_code}"
-    
-    html_content = get_element_without_full_load(url, element_selector)
-    return html_content
+
+    return get_quote_from_page(url, stock_path_code)
 
 def _extract_number(value: str):
     """从字符串中提取数字，支持带‘%’或中文单位的字符串，返回 float 或 None。"""
-    if value is None:
-        return None
-    try:
-        v = value.replace('\u200b', '').strip()
-        is_percent = '%' in v
-        import re
-        cleaned = re.sub(r"[^0-9.%\-]", "", v)
-        if cleaned == '' or cleaned == '.' or cleaned == '-' or cleaned == '%':
-            return None
-        if is_percent:
-            cleaned = cleaned.replace('%', '')
-            return float(cleaned)
-        return float(cleaned)
-    except Exception:
-        return None
+    return quote_parser.extract_number(value)
 
-def fetch_stock(stock_path_code: str):
-    """抓取股票信息：价格、时间、PE(TTM)、PB，并基于 PE 和 PB 计算 ROE（百分比，保留两位）"""
+def build_price_data(price_text: Optional[str] = None, time_text: Optional[str] = None, pankou: Optional[Dict[str, str]] = None):
+    """由页面上的价格、时间文本与盘口键值对构造统一的行情 dict：price、time、pe_ttm、pb、roe
+
+    各数据源（浏览器、HTTP 接口等）拿到原始文本后都通过此函数得到相同结构的结果。
+    """
     price_data = {}
 
-    # 获取交易信息（价格与时间）
-    trading_html = fetch_stock_by_element_selector(stock_path_code, "div.trading-info-box")
-    if trading_html:
-        soup = BeautifulSoup(trading_html, 'lxml')
-        price_div = soup.find('div', class_='price')
-        if price_div:
-            price_data['price'] = price_div.get_text(strip=True)
-        time_div = soup.find('div', class_='time-text')
-        if time_div:
-            time_text = time_div.get_text(strip=True)
-            price_data['time'] = parse_time_string(time_text)
-
-    # 获取盘口信息（PE / PB）
+    if price_text:
+        price_data['price'] = price_text
+    if time_text:
+        price_data['time'] = parse_time_string(time_text)
+
+    # 盘口信息（PE / PB）
     try:
-        pankou_html = fetch_stock_by_element_selector(stock_path_code, "div.pankou-fold-box")
-        if pankou_html:
-            pankou = parse_html(pankou_html)
+        if pankou:
             # 常见键名匹配
             pe_candidates = [k for k in pankou.keys() if '市盈' in k]
             pb_candidates = [k for k in pankou.keys() if '市净' in k]
@@ -164,78 +216,170 @@ def fetch_stock(stock_path_code: str):
     except Exception as e:
         logger.warning(f"解析盘口指标失败: {e}")
 
+    return price_data
+
+def fetch_stock(stock_path_code: str):
+    """抓取股票信息：价格、时间、PE(TTM)、PB，并基于 PE 和 PB 计算 ROE（百分比，保留两位）
+
+    `settings.FETCH_EXTRACT_MODE` 为 'js' 时优先在浏览器内用脚本提取，脚本失败再回退到 outerHTML 解析。
+    整个抓取受 `settings.FETCH_STOCK_DEADLINE` 墙钟截止时间约束，超时会强制结束浏览器并抛出 `FetchDeadlineExceeded`。
+    """
+    with fetch_deadline(settings.FETCH_STOCK_DEADLINE, stock_path_code) as deadline:
+        price_data = _fetch_stock(stock_path_code)
+
+    if deadline.exceeded:
+        raise FetchDeadlineExceeded(f"抓取 {stock_path_code} 超过 {settings.FETCH_STOCK_DEADLINE}s 截止时间")
+    return price_data
+
+def _use_script_extraction():
+    """是否使用浏览器内脚本提取；录制模式下需要保存 outerHTML 片段，始终走 HTML 解析"""
+    return settings.FETCH_EXTRACT_MODE == 'js' and not settings.QUOTE_RECORD_ENABLED
+
+def _fetch_stock(stock_path_code: str):
+    if _use_script_extraction():
+        # 脚本提取与 HTML 回退共用同一次页面加载
+        price_data = fetch_stock_by_script(stock_path_code)
+        logger.info(price_data)
+        return price_data if price_data else None
+
+    # 一次页面加载同时获取交易信息与盘口信息，保证价格与 PE/PB 来自同一时刻
+    fragments = fetch_stock_by_element_selectors(stock_path_code, [TRADING_SELECTOR, PANKOU_SELECTOR])
+    record_fragments(stock_path_code, fragments)
+
+    price_data = price_data_from_fragments(fragments)
     logger.info(price_data)
     return price_data if price_data else None
 
-def parse_time_string(time_str):
-    """解析时间字符串为datetime对象"""
-    today = datetime.datetime.today()  # 修复：使用 datetime.datetime.today()
-    
-    # 尝试多种时间格式
-    formats_to_try = [
-        "%Y-%m-%d %H:%M:%S",  # 2026-01-02 14:00:00
-        "%Y-%m-%d %H:%M",
-        "%Y-%m-%d",  # 2026-01-02 (如果输入只有日期)
-        "%m-%d %H:%M:%S",    # 12-31 15:00:00 -> 2025-12-31 15:00:00
-        "%m-%d %H:%M",
-        "%H:%M:%S",
-        "%H:%M"
-    ]
-    
-    # 尝试解析各种格式
-    for fmt in formats_to_try:
+def price_data_from_fragments(fragments: Dict[str, Optional[str]]):
+    """由交易信息/盘口信息的 outerHTML 片段解析出行情 dict（HTML 解析路径）"""
+    price_text = None
+    time_text = None
+    pankou = None
+
+    # 交易信息（价格与时间）
+    trading_html = fragments.get(TRADING_SELECTOR)
+    if trading_html:
+        price_text, time_text = quote_parser.parse_trading_html(trading_html)
+
+    # 盘口信息（PE / PB）
+    pankou_html = fragments.get(PANKOU_SELECTOR)
+    if pankou_html:
+        try:
+            pankou = parse_html(pankou_html)
+        except Exception as e:
+            logger.warning(f"解析盘口指标失败: {e}")
+
+    return build_price_data(price_text, time_text, pankou)
+
+def _harvest_tab(driver, stock_path_code: str):
+    """从当前标签页提取行情：优先脚本提取，失败回退到 outerHTML 解析"""
+    if _use_script_extraction():
         try:
-            parsed_time = datetime.datetime.strptime(time_str, fmt)
-            
-            # 如果是带有年份的格式，直接返回格式化字符串
-            if '%Y' in fmt:
-                return parsed_time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 如果是月日时间格式（如 "12-31 15:00:00"），加上适当的年份
-            elif fmt in ["%m-%d %H:%M:%S", "%m-%d %H:%M"]:
-                # 判断是否需要使用下一年的年份（例如12-31 15:00:00 在当前日期是1月2日，应该转换为今年的12-31）
-                target_date = datetime.datetime(today.year, parsed_time.month, parsed_time.day, parsed_time.hour, parsed_time.minute, parsed_time.second)
-                
-                # 如果目标日期晚于当前日期，则使用上一年的日期
-                if target_date > today.replace(hour=0, minute=0, second=0):
-                    target_date = datetime.datetime(today.year - 1, parsed_time.month, parsed_time.day, parsed_time.hour, parsed_time.minute, parsed_time.second)
-                    
-                return target_date.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 如果是只有时间格式，加上今天的日期
-            elif fmt in ["%H:%M:%S", "%H:%M"]:
-                parsed_time = datetime.datetime(
-                    today.year, 
-                    today.month, 
-                    today.day, 
-                    parsed_time.hour, 
-                    parsed_time.minute, 
-                    parsed_time.second if fmt == "%H:%M:%S" else 0
-                )
-                return parsed_time.strftime("%Y-%m-%d %H:%M:%S")
-            
-            # 其他情况直接返回解析结果
-            return parsed_time.strftime("%Y-%m-%d %H:%M:%S")
-            
-        except ValueError:
-            continue
-    
-    # 特殊处理只有月日格式的情况，如 "12-31"
-    if len(time_str) == 5 and time_str[2] == '-':
+            extracted = driver.execute_script(QUOTE_EXTRACT_SCRIPT, TRADING_SELECTOR, PANKOU_SELECTOR)
+        except Exception as e:
+            logger.warning(f"脚本提取行情失败: {e}")
+            extracted = None
+        if isinstance(extracted, dict) and extracted.get('price'):
+            return build_price_data(extracted.get('price'), extracted.get('time'), extracted.get('pankou'))
+        logger.info(f"脚本提取未获取到价格，回退到 HTML 解析: {stock_path_code}")
+
+    fragments = {}
+    for selector in (TRADING_SELECTOR, PANKOU_SELECTOR):
+        found = driver.find_elements(By.CSS_SELECTOR, selector)
+        fragments[selector] = found[0].get_attribute("outerHTML") if found else None
+    record_fragments(stock_path_code, fragments)
+    return price_data_from_fragments(fragments)
+
+def _tab_state(driver):
+    """检查当前标签页：返回 (交易信息是否已出现, 盘口信息是否已出现)"""
+    return (
+        bool(driver.find_elements(By.CSS_SELECTOR, TRADING_SELECTOR)),
+        bool(driver.find_elements(By.CSS_SELECTOR, PANKOU_SELECTOR)),
+    )
+
+def fetch_stocks(stock_path_codes, max_tabs: Optional[int] = None, timeout: float = 10, poll_interval: float = 0.1):
+    """在同一个浏览器中以多个标签页并行加载多只股票页面，哪个标签页就绪就先提取哪个
+
+    参数:
+        stock_path_codes: 股市通路径代码列表
+        max_tabs (int): 同时在途的标签页数量，默认 `settings.FETCH_TABS_PER_BROWSER`
+        timeout (float): 单个标签页等待元素的超时时间（秒），超时时尽量提取已出现的内容
+        poll_interval (float): 轮询各标签页的间隔（秒）
+
+    返回 {stock_path_code: 行情 dict 或 None}。整批抓取受
+    `FETCH_STOCK_DEADLINE * 批次轮数` 的截止时间约束，超时后未完成的股票为 None。
+    """
+    codes = list(dict.fromkeys(stock_path_codes))
+    results: Dict[str, Optional[dict]] = {code: None for code in codes}
+    if not codes:
+        return results
+
+    max_tabs = max(1, int(max_tabs or settings.FETCH_TABS_PER_BROWSER))
+    rounds = -(-len(codes) // max_tabs)
+    pending = deque(codes)
+
+    with fetch_deadline(settings.FETCH_STOCK_DEADLINE * rounds, f"{len(codes)} 只股票") as deadline:
         try:
-            month, day = time_str.split('-')
-            month = int(month)
-            day = int(day)
-            
-            # 创建当前年份的日期
-            target_date = datetime.datetime(today.year, month, day)
-            
-            # 如果目标日期早于当前日期，则使用下一年的日期
-            if target_date < today.replace(hour=0, minute=0, second=0):
-                target_date = datetime.datetime(today.year + 1, month, day)
-            return target_date.strftime("%Y-%m-%d %H:%M:%S")
-        except ValueError:
-            pass
-    
-    # 如果所有格式都不匹配，抛出异常
-    raise ValueError(f"无法解析时间字符串: {time_str}")
\ No newline at end of file
+            with _borrow_driver() as item:
+                driver = item.driver
+                base_handle = driver.current_window_handle
+                in_flight = {}  # handle -> (code, 打开时间)
+
+                while (pending or in_flight) and not deadline.exceeded:
+                    # 补足在途标签页：先打开空白页再导航，以便对新标签页应用 URL 屏蔽
+                    while pending and len(in_flight) < max_tabs:
+                        code = pending.popleft()
+                        driver.switch_to.new_window('tab')
+                        if settings.CHROME_LEAN_PROFILE:
+                            apply_network_blocking(driver)
+                        driver.execute_script(
+                            "window.location.href = arguments[0];",
+                            f"https://gushitong.baidu.com/stock/{code}",
+                        )
+                        item.mark_page()
+                        in_flight[driver.current_window_handle] = (code, time.monotonic())
+
+                    progressed = False
+                    for handle, (code, opened_at) in list(in_flight.items()):
+                        driver.switch_to.window(handle)
+                        has_trading, has_pankou = _tab_state(driver)
+                        timed_out = time.monotonic() - opened_at >= timeout
+                        if not (has_trading and has_pankou) and not timed_out:
+                            continue
+
+                        if has_trading:
+                            try:
+                                price_data = _harvest_tab(driver, code)
+                                results[code] = price_data if price_data else None
+                            except ValueError as e:
+                                logger.warning(f"解析行情失败 {code}: {e}")
+                        else:
+                            logger.warning(f"等待元素超时: {TRADING_SELECTOR} ({code})")
+                        driver.close()
+                        del in_flight[handle]
+                        progressed = True
+
+                    driver.switch_to.window(base_handle)
+                    if not progressed:
+                        time.sleep(poll_interval)
+
+                # 截止时间已到：关闭剩余标签页
+                for handle in list(in_flight):
+                    try:
+                        driver.switch_to.window(handle)
+                        driver.close()
+                    except Exception:
+                        pass
+                if in_flight:
+                    driver.switch_to.window(base_handle)
+
+        except Exception as e:
+            logger.warning(f"多标签页批量抓取失败: {e}")
+
+    done = sum(1 for value in results.values() if value)
+    logger.info(f"多标签页批量抓取完成: {done}/{len(codes)}（每个浏览器 {max_tabs} 个标签页）")
+    return results
+
+def parse_time_string(time_str):
+    """解析时间字符串为 "%Y-%m-%d %H:%M:%S" 格式的字符串，无法解析时抛出 ValueError"""
+    return quote_parser.parse_time_string(time_str)
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+最近一次写入的行情
+
+在内存中记录每只股票最近一次写入 `stock_price_history` 的价格与行情时间，
+首次遇到某只股票时从数据库载入（进程启动后的第一轮抓取）。
+抓取任务据此跳过未变化的行情（页面时间没有前进），抓取优先队列据此计算距阈值远近与陈旧度。
+"""
+import datetime
+import threading
+import time
+from typing import Dict, List, Optional
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _format_time(value) -> Optional[str]:
+    if isinstance(value, datetime.datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return str(value) if value else None
+
+
+def _timestamp(value) -> Optional[float]:
+    """把数据库中的 stock_time / fetch_date 转换为时间戳"""
+    if isinstance(value, datetime.datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+class LastQuoteBook:
+    def __init__(self, clock=time.time):
+        """
+        每只股票最近一次写入的行情：{'price', 'stock_time', 'fetched_at'}
+
+        参数:
+            clock: 墙钟（测试中可替换）
+        """
+        self.clock = clock
+        self._quotes: Dict[str, dict] = {}
+        self._seeded = set()
+        self._lock = threading.Lock()
+
+    def seed(self, storage, stocks: List[dict], latest_prices: Optional[Dict[str, dict]] = None):
+        """首次遇到的股票从 `stock_price_history` 载入最新一条记录（一次查询载入全部）
+
+        调用方已经查询过 `get_latest_prices` 时可通过 `latest_prices` 传入，不再重复查询。
+        """
+        codes = []
+        with self._lock:
+            for stock in stocks:
+                code = stock.get('stock_code')
+                if code is None or code in self._seeded:
+                    continue
+                self._seeded.add(code)
+                codes.append(code)
+        if not codes:
+            return
+        if latest_prices is None:
+            try:
+                latest_prices = storage.get_latest_prices(codes)
+            except Exception as e:
+                logger.warning(f"载入最新价格失败: {e}")
+                return
+
+        for code in codes:
+            latest = latest_prices.get(code)
+            if not latest or latest.get('stock_price') is None:
+                continue
+            try:
+                price = float(latest['stock_price'])
+            except (TypeError, ValueError):
+                continue
+            quote = {
+                'price': price,
+                'stock_time': _format_time(latest.get('stock_time')),
+                'fetched_at': _timestamp(latest.get('stock_time')) or _timestamp(latest.get('fetch_date')),
+            }
+            with self._lock:
+                self._quotes.setdefault(code, quote)
+
+    def get(self, stock_code: str) -> Optional[dict]:
+        with self._lock:
+            quote = self._quotes.get(stock_code)
+            return dict(quote) if quote else None
+
+    def is_unchanged(self, stock_code: str, stock_time: Optional[str]) -> bool:
+        """行情时间与最近一次写入的相同（页面时间没有前进）时视为未变化"""
+        if not stock_time:
+            return False
+        last = self.get(stock_code)
+        return last is not None and last.get('stock_time') == stock_time
+
+    def record(self, stock_code: str, price: float, stock_time: Optional[str] = None):
+        """记录一次成功写入的行情"""
+        with self._lock:
+            self._seeded.add(stock_code)
+            self._quotes[stock_code] = {'price': float(price), 'stock_time': stock_time, 'fetched_at': self.clock()}
+
+
+_book: Optional[LastQuoteBook] = None
+_book_lock = threading.Lock()
+
+
+def get_last_quote_book() -> LastQuoteBook:
+    """获取进程内共享的最近行情记录"""
+    global _book
+    with _book_lock:
+        if _book is None:
+            _book = LastQuoteBook()
+        return _book
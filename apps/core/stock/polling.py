@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+自适应轮询模块
+
+为每只关注股票单独计算下一次抓取时间：依据 `stock_price_history` 中最近价格的波动率，
+以及最新价格距离 `price_low` / `price_high` 的远近。离阈值（以波动率衡量）越近的股票抓取越频繁，
+远离阈值且波动小的股票抓取越少，同样的抓取量下更快发现需要告警的股票。
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import settings
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def volatility(prices: Iterable[float]) -> Optional[float]:
+    """按时间顺序的价格序列的波动率（相邻对数收益率的标准差），样本不足时返回 None"""
+    prices = [p for p in prices if p and p > 0]
+    returns = [math.log(b / a) for a, b in zip(prices, prices[1:])]
+    if len(returns) < 2:
+        return None
+    mean = sum(returns) / len(returns)
+    return math.sqrt(sum((r - mean) ** 2 for r in returns) / (len(returns) - 1))
+
+
+def threshold_distance(price: float, price_low=None, price_high=None) -> Optional[float]:
+    """最新价格到最近阈值的相对距离（已越过阈值时为 0），没有设置阈值时返回 None"""
+    distances = []
+    low = _to_float(price_low)
+    high = _to_float(price_high)
+    if low is not None:
+        distances.append(max(price - low, 0.0) / price)
+    if high is not None:
+        distances.append(max(high - price, 0.0) / price)
+    return min(distances) if distances else None
+
+
+class PollingPlanner:
+    def __init__(self, min_interval: float, max_interval: float, window: int = 20,
+                 volatility_floor: float = 0.001, clock=time.monotonic):
+        """
+        每只股票独立的轮询计划
+
+        参数:
+            min_interval (float): 最短抓取间隔（秒），接近或越过阈值的股票使用该间隔
+            max_interval (float): 最长抓取间隔（秒），未设置阈值或远离阈值的股票最多间隔这么久
+            window (int): 计算波动率使用的最近价格条数
+            volatility_floor (float): 波动率下限，避免价格长时间不变时间隔被无限放大
+            clock: 单调时钟（测试中可替换）
+        """
+        self.min_interval = float(min_interval)
+        self.max_interval = max(float(max_interval), self.min_interval)
+        self.window = max(3, int(window))
+        self.volatility_floor = float(volatility_floor)
+        self.clock = clock
+        self._prices: Dict[str, Deque[float]] = {}
+        self._next_due: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def interval_for(self, stock: dict) -> float:
+        """根据最近价格计算该股票的抓取间隔（秒）"""
+        with self._lock:
+            prices = list(self._prices.get(stock.get('stock_code'), ()))
+        if not prices:
+            return self.min_interval
+
+        distance = threshold_distance(prices[-1], stock.get('price_low'), stock.get('price_high'))
+        if distance is None:
+            return self.max_interval
+
+        # 距离阈值还有多少个“单次抓取间隔内的典型波动”：越少越需要尽快再抓
+        sigma = max(volatility(prices) or 0.0, self.volatility_floor)
+        steps = distance / sigma
+        return min(max(self.min_interval * steps, self.min_interval), self.max_interval)
+
+    def seed(self, storage, stock: dict):
+        """首次遇到某只股票时，从 `stock_price_history` 载入最近价格"""
+        code = stock.get('stock_code')
+        with self._lock:
+            if code in self._prices:
+                return
+            self._prices[code] = deque(maxlen=self.window)
+        try:
+            rows = storage.get_recent_prices(code, limit=self.window)
+        except Exception as e:
+            logger.warning(f"载入 {code} 最近价格失败: {e}")
+            rows = []
+        history = [_to_float(row.get('stock_price')) for row in reversed(rows or [])]
+        with self._lock:
+            self._prices[code].extend(p for p in history if p is not None)
+
+    def split_due(self, storage, stocks: List[dict]) -> Tuple[List[dict], List[dict]]:
+        """拆分关注列表，返回 (已到抓取时间的股票, 尚未到期的股票)；首次出现的股票立即到期"""
+        now = self.clock()
+        due, deferred = [], []
+        for stock in stocks:
+            code = stock.get('stock_code')
+            if code is not None:
+                self.seed(storage, stock)
+            with self._lock:
+                next_due = self._next_due.get(code)
+            (due if next_due is None or next_due <= now else deferred).append(stock)
+        return due, deferred
+
+    def observe(self, stock: dict, price: float):
+        """记录一次新抓取的价格，并据此安排下一次抓取时间"""
+        with self._lock:
+            self._prices.setdefault(stock.get('stock_code'), deque(maxlen=self.window)).append(float(price))
+        self.reschedule(stock)
+
+    def reschedule(self, stock: dict):
+        """按已有价格重新安排下一次抓取时间（行情未变化时不追加价格，避免低估波动率）"""
+        code = stock.get('stock_code')
+        interval = self.interval_for(stock)
+        with self._lock:
+            self._next_due[code] = self.clock() + interval
+        logger.debug(f"{code} 下一次抓取间隔 {interval:.0f}s")
+
+    def next_due_in(self, stock_code: str) -> Optional[float]:
+        """距离该股票下一次抓取还有多少秒（未安排时返回 None）"""
+        with self._lock:
+            next_due = self._next_due.get(stock_code)
+        return None if next_due is None else max(next_due - self.clock(), 0.0)
+
+
+_planner: Optional[PollingPlanner] = None
+_planner_lock = threading.Lock()
+
+
+def get_polling_planner() -> PollingPlanner:
+    """获取进程内共享的轮询计划"""
+    global _planner
+    with _planner_lock:
+        if _planner is None:
+            _planner = PollingPlanner(
+                settings.POLL_MIN_INTERVAL,
+                settings.POLL_MAX_INTERVAL,
+                window=settings.POLL_VOLATILITY_WINDOW,
+            )
+        return _planner
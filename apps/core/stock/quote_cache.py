@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+行情缓存模块
+
+在 `fetch_quote` 之前加一层按 `stock_path_code` 缓存的 TTL 行情缓存，基于 sqlite 文件，
+同一台机器上的多个进程（`main.py --fetch`、`scripts/run_fetch.py`、调度器）共享：
+TTL 内重复查询同一只股票直接返回缓存结果，不再重复抓取。
+"""
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+from config.settings import settings
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class QuoteCache:
+    def __init__(self, path: str, ttl: float = 30, max_entries: int = 5000):
+        """
+        基于 sqlite 的跨进程行情缓存
+
+        参数:
+            path (str): sqlite 文件路径
+            ttl (float): 缓存有效期（秒）
+            max_entries (int): 最多保留的条目数，超过时淘汰最早写入的条目
+        """
+        self.path = Path(path).expanduser()
+        self.ttl = float(ttl)
+        self.max_entries = int(max_entries)
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS quote_cache ("
+                        "stock_path_code TEXT PRIMARY KEY, data TEXT NOT NULL, cached_at REAL NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_cached_at ON quote_cache (cached_at)")
+                    conn.execute("CREATE TABLE IF NOT EXISTS quote_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                    self._initialized = True
+        return conn
+
+    def _count(self, conn, name: str, n: int = 1):
+        if n:
+            conn.execute(
+                "INSERT INTO quote_cache_stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (name, n),
+            )
+
+    def get_many(self, stock_path_codes: Iterable[str]) -> Dict[str, dict]:
+        """批量查询缓存，只返回 TTL 内命中的条目"""
+        codes = list(stock_path_codes)
+        if not codes:
+            return {}
+        conn = self._connect()
+        try:
+            placeholders = ", ".join("?" for _ in codes)
+            rows = conn.execute(
+                f"SELECT stock_path_code, data FROM quote_cache WHERE cached_at >= ? AND stock_path_code IN ({placeholders})",
+                [time.time() - self.ttl] + codes,
+            ).fetchall()
+            hits = {code: json.loads(data) for code, data in rows}
+            self._count(conn, 'hits', len(hits))
+            self._count(conn, 'misses', len(codes) - len(hits))
+            return hits
+        finally:
+            conn.close()
+
+    def get(self, stock_path_code: str) -> Optional[dict]:
+        """查询单只股票的缓存行情，未命中或已过期返回 None"""
+        return self.get_many([stock_path_code]).get(stock_path_code)
+
+    def set_many(self, quotes: Dict[str, Optional[dict]]):
+        """写入行情（值为空的不缓存），并在超过条目上限时淘汰"""
+        rows = [(code, json.dumps(data, ensure_ascii=False, default=str), time.time())
+                for code, data in quotes.items() if data]
+        if not rows:
+            return
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO quote_cache (stock_path_code, data, cached_at) VALUES (?, ?, ?)", rows
+            )
+            self._evict(conn)
+        finally:
+            conn.close()
+
+    def set(self, stock_path_code: str, data: Optional[dict]):
+        self.set_many({stock_path_code: data})
+
+    def _evict(self, conn) -> int:
+        removed = conn.execute("DELETE FROM quote_cache WHERE cached_at < ?", (time.time() - self.ttl,)).rowcount
+        if self.max_entries > 0:
+            removed += conn.execute(
+                "DELETE FROM quote_cache WHERE stock_path_code NOT IN "
+                "(SELECT stock_path_code FROM quote_cache ORDER BY cached_at DESC LIMIT ?)",
+                (self.max_entries,),
+            ).rowcount
+        self._count(conn, 'evictions', removed)
+        return removed
+
+    def evict(self) -> int:
+        """淘汰过期与超出条目上限的缓存，返回删除的条目数"""
+        conn = self._connect()
+        try:
+            return self._evict(conn)
+        finally:
+            conn.close()
+
+    def clear(self):
+        """清空缓存与统计"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM quote_cache")
+            conn.execute("DELETE FROM quote_cache_stats")
+        finally:
+            conn.close()
+
+    def stats(self) -> dict:
+        """返回跨进程累计的命中/未命中/淘汰次数与当前条目数"""
+        conn = self._connect()
+        try:
+            result = {'hits': 0, 'misses': 0, 'evictions': 0}
+            result.update(dict(conn.execute("SELECT name, value FROM quote_cache_stats").fetchall()))
+            result['entries'] = conn.execute("SELECT COUNT(*) FROM quote_cache").fetchone()[0]
+            return result
+        finally:
+            conn.close()
+
+
+_cache: Optional[QuoteCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_quote_cache() -> Optional[QuoteCache]:
+    """获取进程内共享的行情缓存实例；`QUOTE_CACHE_ENABLED` 关闭或初始化失败时返回 None"""
+    global _cache
+    if not settings.QUOTE_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                path = Path(settings.QUOTE_CACHE_PATH).expanduser()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _cache = QuoteCache(path, ttl=settings.QUOTE_CACHE_TTL, max_entries=settings.QUOTE_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                logger.warning(f"初始化行情缓存失败，不使用缓存: {e}")
+                return None
+        return _cache
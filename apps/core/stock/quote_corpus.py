@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+行情页面片段语料库
+
+录制模式（`QUOTE_RECORD_ENABLED=true`）下，浏览器每抓取一只股票就把交易信息（trading-info-box）
+与盘口信息（pankou-fold-box）的 outerHTML 片段压缩后写入 sqlite 语料库；
+回放数据源（`DEFAULT_SOURCE=replay`）把语料一次性载入内存，按股票代码轮流返回，
+使抓取任务、吞吐测试与解析基准可以在没有网络的情况下针对真实页面运行。
+"""
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class QuoteCorpus:
+    def __init__(self, path: str):
+        """
+        基于 sqlite 的页面片段语料库（每条记录为 zlib 压缩的 {selector: outerHTML} JSON）
+
+        参数:
+            path (str): sqlite 文件路径
+        """
+        self.path = Path(path).expanduser()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    conn.execute("PRAGMA journal_mode=WAL")
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS quote_fragments ("
+                        "id INTEGER PRIMARY KEY AUTOINCREMENT, stock_path_code TEXT NOT NULL, "
+                        "recorded_at REAL NOT NULL, data BLOB NOT NULL)"
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS idx_stock_path_code ON quote_fragments (stock_path_code)")
+                    self._initialized = True
+        return conn
+
+    def record(self, stock_path_code: str, fragments: Dict[str, Optional[str]]):
+        """写入一次抓取得到的页面片段（全部片段为空时不写入）"""
+        if not any(fragments.values()):
+            return
+        data = zlib.compress(json.dumps(fragments, ensure_ascii=False).encode('utf-8'))
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO quote_fragments (stock_path_code, recorded_at, data) VALUES (?, ?, ?)",
+                (stock_path_code, time.time(), data),
+            )
+        finally:
+            conn.close()
+
+    def iter_fragments(self) -> Iterator[Tuple[str, Dict[str, Optional[str]]]]:
+        """按录制顺序遍历所有记录，产出 (stock_path_code, {selector: outerHTML})"""
+        conn = self._connect()
+        try:
+            for code, data in conn.execute("SELECT stock_path_code, data FROM quote_fragments ORDER BY id"):
+                yield code, json.loads(zlib.decompress(data).decode('utf-8'))
+        finally:
+            conn.close()
+
+    def load(self) -> Dict[str, List[Dict[str, Optional[str]]]]:
+        """载入全部记录，返回 {stock_path_code: [片段, ...]}"""
+        corpus: Dict[str, List[Dict[str, Optional[str]]]] = {}
+        for code, fragments in self.iter_fragments():
+            corpus.setdefault(code, []).append(fragments)
+        return corpus
+
+    def count(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM quote_fragments").fetchone()[0]
+        finally:
+            conn.close()
+
+
+_recorder: Optional[QuoteCorpus] = None
+_recorder_lock = threading.Lock()
+
+
+def get_recorder() -> Optional[QuoteCorpus]:
+    """获取录制用的语料库实例；`QUOTE_RECORD_ENABLED` 关闭或初始化失败时返回 None"""
+    global _recorder
+    if not settings.QUOTE_RECORD_ENABLED:
+        return None
+    with _recorder_lock:
+        if _recorder is None:
+            try:
+                path = Path(settings.QUOTE_CORPUS_PATH).expanduser()
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _recorder = QuoteCorpus(path)
+            except Exception as e:
+                logger.warning(f"初始化行情语料库失败，不录制: {e}")
+                return None
+        return _recorder
+
+
+def record_fragments(stock_path_code: str, fragments: Dict[str, Optional[str]]):
+    """录制模式下保存一次抓取的页面片段；写入失败只记录日志，不影响抓取"""
+    recorder = get_recorder()
+    if recorder is None:
+        return
+    try:
+        recorder.record(stock_path_code, fragments)
+    except Exception as e:
+        logger.warning(f"录制页面片段失败 {stock_path_code}: {e}")
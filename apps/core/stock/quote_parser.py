@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+行情解析模块
+
+抓取得到的价格、盘口数值与时间文本的快速解析路径：正则在导入时预编译，
+时间字符串按输入形状一次匹配到对应格式（不再逐个 `strptime` 试错），
+重复出现的数值与时间文本直接复用缓存结果；HTML 片段用预编译的 XPath 解析。
+`fetcher` 中的 `_extract_number` / `parse_time_string` / `parse_html` 均委托到这里。
+"""
+import datetime
+import re
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from lxml import etree
+
+# 数值中除数字、小数点、百分号、负号以外的字符（千分位逗号、中文单位、零宽空格等）
+_NUMBER_NOISE_RE = re.compile(r"[^0-9.%\-]")
+
+# 时间字符串的几种形状（与原先依次尝试的 strptime 格式一一对应）
+_DATETIME_RE = re.compile(r"(\d{4})-(\d{1,2})-(\d{1,2})(?:\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?)?")
+_MONTH_DAY_TIME_RE = re.compile(r"(\d{1,2})-(\d{1,2})\s+(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+_TIME_RE = re.compile(r"(\d{1,2}):(\d{1,2})(?::(\d{1,2}))?")
+_MONTH_DAY_RE = re.compile(r"(\d{2})-(\d{2})")
+
+_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def _class_xpath(tag: str, class_name: str, relative: bool = False) -> etree.XPath:
+    """按 class 中的单个类名匹配元素（等价于 BeautifulSoup 的 `class_=`）"""
+    prefix = ".//" if relative else "//"
+    return etree.XPath(
+        f"{prefix}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')]"
+    )
+
+
+_PANKOU_ITEM_XPATH = _class_xpath('div', 'pankou-item')
+_KEY_XPATH = _class_xpath('div', 'key', relative=True)
+_VALUE_XPATH = _class_xpath('div', 'value', relative=True)
+_PRICE_XPATH = _class_xpath('div', 'price')
+_TIME_TEXT_XPATH = _class_xpath('div', 'time-text')
+
+
+def extract_number(value: Optional[str]) -> Optional[float]:
+    """从字符串中提取数字，支持带‘%’或中文单位的字符串，返回 float 或 None。"""
+    if not isinstance(value, str):
+        return None
+    return _extract_number_cached(value)
+
+
+@lru_cache(maxsize=4096)
+def _extract_number_cached(value: str) -> Optional[float]:
+    cleaned = _NUMBER_NOISE_RE.sub("", value)
+    if cleaned in ('', '.', '-', '%'):
+        return None
+    try:
+        return float(cleaned.replace('%', ''))
+    except ValueError:
+        return None
+
+
+def parse_time_string(time_str: str, today: Optional[datetime.datetime] = None) -> str:
+    """解析时间字符串，返回 "%Y-%m-%d %H:%M:%S" 格式的字符串
+
+    支持 "2026-01-02 14:00:00"、"2026-01-02 14:00"、"2026-01-02"、"12-31 15:00:00"、"12-31 15:00"、
+    "14:00:00"、"14:00" 与 "12-31"；缺少的年份/日期按 `today`（默认当前时间）补全。无法解析时抛出 ValueError。
+    """
+    today = today or datetime.datetime.today()
+    return _parse_time_cached(time_str, today.date())
+
+
+@lru_cache(maxsize=4096)
+def _parse_time_cached(time_str: str, today: datetime.date) -> str:
+    try:
+        parsed = _parse_time(time_str, today)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f"无法解析时间字符串: {time_str}")
+    return parsed.strftime(_TIME_FORMAT)
+
+
+def _parse_time(time_str: str, today: datetime.date) -> Optional[datetime.datetime]:
+    match = _DATETIME_RE.fullmatch(time_str)
+    if match:
+        year, month, day, hour, minute, second = (int(g or 0) for g in match.groups())
+        return datetime.datetime(year, month, day, hour, minute, second)
+
+    match = _MONTH_DAY_TIME_RE.fullmatch(time_str)
+    if match:
+        # 没有年份的 "12-31 15:00:00"：晚于今天的日期属于上一年（如 1 月 2 日看到的 12-31），
+        # 按日期比较，当天盘中的 "01-02 09:30" 仍属于今年
+        month, day, hour, minute, second = (int(g or 0) for g in match.groups())
+        target = datetime.datetime(today.year, month, day, hour, minute, second)
+        if target.date() > today:
+            target = target.replace(year=today.year - 1)
+        return target
+
+    match = _TIME_RE.fullmatch(time_str)
+    if match:
+        hour, minute, second = (int(g or 0) for g in match.groups())
+        return datetime.datetime(today.year, today.month, today.day, hour, minute, second)
+
+    match = _MONTH_DAY_RE.fullmatch(time_str)
+    if match:
+        # 只有月日的 "12-31"：早于今天的日期顺延到下一年
+        month, day = int(match.group(1)), int(match.group(2))
+        target = datetime.datetime(today.year, month, day)
+        if target.date() < today:
+            target = datetime.datetime(today.year + 1, month, day)
+        return target
+
+    return None
+
+
+def _parse_fragment(html_content: Optional[str]):
+    if not html_content:
+        return None
+    return etree.HTML(html_content)
+
+
+def _text(element) -> str:
+    """等价于 BeautifulSoup 的 `get_text(strip=True)`"""
+    return "".join(text.strip() for text in element.itertext())
+
+
+def parse_pankou_html(html_content: Optional[str]) -> Dict[str, str]:
+    """解析盘口信息 HTML 片段，返回 {键: 值}（如 {'市盈率(TTM)': '12.34'}）"""
+    root = _parse_fragment(html_content)
+    if root is None:
+        return {}
+
+    pankou_data = {}
+    for item in _PANKOU_ITEM_XPATH(root):
+        keys = _KEY_XPATH(item)
+        values = _VALUE_XPATH(item)
+        if keys and values:
+            pankou_data[_text(keys[0])] = _text(values[0])
+    return pankou_data
+
+
+def parse_trading_html(html_content: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """解析交易信息 HTML 片段，返回 (价格文本, 时间文本)，缺失的项为 None"""
+    root = _parse_fragment(html_content)
+    if root is None:
+        return None, None
+
+    prices = _PRICE_XPATH(root)
+    times = _TIME_TEXT_XPATH(root)
+    return (_text(prices[0]) if prices else None), (_text(times[0]) if times else None)
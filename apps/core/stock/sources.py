@@ -0,0 +1,590 @@
+# -*- coding: utf-8 -*-
+"""
+行情数据源模块
+
+把“按股票代码取一条行情”抽象为可插拔的数据源，由 `settings.DEFAULT_SOURCE` 选择：
+- 'http'：通过 requests 直接请求百度股市通行情接口（连接池化的 Session），失败时回退到浏览器
+- 'gushitong'：使用 Selenium 渲染百度股市通页面（`fetcher.fetch_stock`）
+- 'yfinance'：通过 yfinance 一次批量下载所有股票的行情（`batch = True`）
+- 'replay'：离线回放录制模式保存的页面片段（`quote_corpus`），不访问网络
+
+所有数据源返回与 `fetch_stock` 相同结构的 dict：price、time、pe_ttm、pb、roe。
+访问网络的数据源都包装在 `GuardedSource` 中，按数据源限流并在连续失败后熔断。
+"""
+import datetime
+import threading
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import settings
+from config.logging_config import get_logger
+from apps.core.stock.quote_cache import get_quote_cache
+from apps.core.stock.quote_corpus import QuoteCorpus
+from apps.core.stock.throttle import CircuitBreaker, TokenBucket, parse_rate_limits
+
+logger = get_logger(__name__)
+
+
+def split_stock_path_code(stock_path_code: str) -> Tuple[str, str]:
+    """拆分股市通路径代码，例如 'ab-600519' -> ('ab', '600519')；无市场前缀时默认 A 股"""
+    if '-' in stock_path_code:
+        market, code = stock_path_code.split('-', 1)
+        return market.lower(), code
+    return 'ab', stock_path_code
+
+
+class QuoteSource:
+    """行情数据源基类"""
+
+    name = 'base'
+    # 是否支持一次请求批量获取（抓取任务据此选择逐只并发抓取或批量抓取）
+    batch = False
+    # 批量抓取时并行执行 fetch_many 的分组数（关注列表均分为这么多组）
+    batch_workers = 1
+    # 是否读写跨进程行情缓存（回放等非实时数据源不能读到实时行情，也不能把历史行情写给实时抓取）
+    cacheable = True
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        """获取单只股票行情，失败返回 None"""
+        raise NotImplementedError
+
+    def fetch_many(self, stock_path_codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+        """批量获取行情，默认逐只调用 `fetch`"""
+        return {code: self.fetch(code) for code in stock_path_codes}
+
+    def request_cost(self, stock_path_codes) -> int:
+        """一次 `fetch_many` 对上游的请求数（用于限流），默认每只股票一次"""
+        return len(stock_path_codes)
+
+
+class SeleniumSource(QuoteSource):
+    """基于 Selenium 渲染百度股市通页面的数据源
+
+    `FETCH_TABS_PER_BROWSER` 大于 1 时支持批量：每个浏览器以多个标签页并行加载页面（`fetcher.fetch_stocks`），
+    关注列表按 `FETCH_CONCURRENCY` 分组，每组占用池中的一个浏览器。
+    """
+
+    name = 'gushitong'
+
+    @property
+    def batch(self):
+        return int(settings.FETCH_TABS_PER_BROWSER) > 1
+
+    @property
+    def batch_workers(self):
+        return max(1, int(settings.FETCH_CONCURRENCY))
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        # 调用时再取 fetch_stock，便于测试中 patch
+        from apps.core.stock import fetcher
+        return fetcher.fetch_stock(stock_path_code)
+
+    def fetch_many(self, stock_path_codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+        from apps.core.stock import fetcher
+        return fetcher.fetch_stocks(stock_path_codes)
+
+
+class HttpSource(QuoteSource):
+    """基于 requests 直接请求百度股市通行情接口的数据源（不启动浏览器）"""
+
+    name = 'http'
+
+    def __init__(self, url_template: Optional[str] = None, timeout: Optional[float] = None, pool_size: Optional[int] = None):
+        self.url_template = url_template or settings.HTTP_QUOTE_URL
+        self.timeout = float(timeout if timeout is not None else settings.REQUEST_TIMEOUT)
+        pool_size = int(pool_size or settings.HTTP_POOL_SIZE)
+
+        # 复用 TCP/TLS 连接：同一 Session 在多个抓取线程间共享
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 "
+                          "(KHTML, like Gecko) Chrome/120.0 Safari/537.36",
+            "Referer": "https://gushitong.baidu.com/",
+            "Accept": "application/json, text/plain, */*",
+        })
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        market, code = split_stock_path_code(stock_path_code)
+        url = self.url_template.format(market=market, code=code)
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            payload = response.json()
+        except Exception as e:
+            logger.warning(f"HTTP 行情请求失败 {stock_path_code}: {e}")
+            return None
+
+        return parse_quotation_payload(payload)
+
+
+class GuardedSource(QuoteSource):
+    """为数据源加上令牌桶限流与熔断：熔断打开期间直接返回 None（不访问上游）"""
+
+    def __init__(self, source: QuoteSource, limiter: TokenBucket, breaker: CircuitBreaker):
+        self.source = source
+        self.limiter = limiter
+        self.breaker = breaker
+        self.name = source.name
+
+    @property
+    def batch(self):
+        return self.source.batch
+
+    @property
+    def batch_workers(self):
+        return self.source.batch_workers
+
+    @property
+    def cacheable(self):
+        return self.source.cacheable
+
+    def request_cost(self, stock_path_codes) -> int:
+        return self.source.request_cost(stock_path_codes)
+
+    def _call(self, func, cost: int, *args):
+        if not self.breaker.allow():
+            logger.warning(f"数据源 {self.name} 熔断中，跳过请求")
+            return None, False
+        self.limiter.acquire(max(1, cost))
+        try:
+            return func(*args), True
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        data, called = self._call(self.source.fetch, 1, stock_path_code)
+        if called:
+            if data and data.get('price'):
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+        return data
+
+    def fetch_many(self, stock_path_codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+        codes = list(stock_path_codes)
+        if not codes:
+            return {}
+        results, called = self._call(self.source.fetch_many, self.request_cost(codes), codes)
+        if not called:
+            return {code: None for code in codes}
+        # 整批都没有拿到行情才算一次失败
+        if any(data and data.get('price') for data in results.values()):
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+        return results
+
+
+class FallbackSource(QuoteSource):
+    """优先使用 primary，失败（异常、无结果或无价格）时回退到 fallback"""
+
+    def __init__(self, primary: QuoteSource, fallback: QuoteSource):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+        self.cacheable = primary.cacheable and fallback.cacheable
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        try:
+            data = self.primary.fetch(stock_path_code)
+        except Exception as e:
+            logger.warning(f"数据源 {self.primary.name} 获取 {stock_path_code} 异常: {e}")
+            data = None
+
+        if data and data.get('price'):
+            return data
+
+        logger.info(f"数据源 {self.primary.name} 未获取到 {stock_path_code} 的价格，回退到 {self.fallback.name}")
+        return self.fallback.fetch(stock_path_code)
+
+
+def to_yfinance_symbol(stock_path_code: str) -> str:
+    """把股市通路径代码转换为 yfinance 代码，例如 'ab-600519' -> '600519.SS'，'hk-00700' -> '0700.HK'
+
+    已是 yfinance 格式（如 '000858.SZ'、'AAPL'）的代码原样返回。
+    """
+    if '-' not in stock_path_code:
+        if stock_path_code.isdigit() and len(stock_path_code) == 6:
+            return to_yfinance_symbol(f"ab-{stock_path_code}")
+        return stock_path_code
+
+    market, code = split_stock_path_code(stock_path_code)
+    if market == 'ab':
+        if code.startswith(('6', '9')):
+            return f"{code}.SS"
+        if code.startswith(('4', '8')):
+            return f"{code}.BJ"
+        return f"{code}.SZ"
+    if market == 'hk':
+        return f"{int(code):04d}.HK" if code.isdigit() else f"{code}.HK"
+    return code.upper()
+
+
+class YFinanceSource(QuoteSource):
+    """基于 yfinance 的数据源，`fetch_many` 一次请求下载所有股票的分钟行情"""
+
+    name = 'yfinance'
+    batch = True
+
+    def __init__(self, fundamentals: Optional[bool] = None):
+        # 是否额外获取 PE/PB（yfinance 需要逐只请求 info，较慢）
+        self.fundamentals = settings.YFINANCE_FUNDAMENTALS if fundamentals is None else bool(fundamentals)
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        return self.fetch_many([stock_path_code]).get(stock_path_code)
+
+    def request_cost(self, stock_path_codes) -> int:
+        # 整个列表一次下载
+        return 1
+
+    def fetch_many(self, stock_path_codes: Iterable[str]) -> Dict[str, Optional[dict]]:
+        try:
+            import yfinance as yf
+        except Exception:
+            raise RuntimeError("请先安装包 `yfinance`：pip install yfinance")
+
+        codes = list(stock_path_codes)
+        symbols = {code: to_yfinance_symbol(code) for code in codes}
+        results: Dict[str, Optional[dict]] = {code: None for code in codes}
+        if not codes:
+            return results
+
+        unique_symbols = sorted(set(symbols.values()))
+        try:
+            data = yf.download(
+                tickers=unique_symbols,
+                period="1d",
+                interval="1m",
+                group_by="ticker",
+                auto_adjust=False,
+                ignore_tz=True,
+                threads=True,
+                progress=False,
+                timeout=settings.REQUEST_TIMEOUT,
+            )
+        except Exception as e:
+            logger.warning(f"yfinance 批量下载失败: {e}")
+            return results
+
+        if data is None or data.empty:
+            logger.warning(f"yfinance 未返回任何行情: {unique_symbols}")
+            return results
+
+        fundamentals = self._fetch_fundamentals(yf, unique_symbols) if self.fundamentals else {}
+
+        for code, symbol in symbols.items():
+            quote = self._latest_quote(data, symbol)
+            if quote is None:
+                logger.warning(f"yfinance 未返回 {symbol} 的行情")
+                continue
+            price, ts = quote
+            price_data = {
+                'price': f"{price:.2f}",
+                'time': ts.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+            pe_val, pb_val = fundamentals.get(symbol, (None, None))
+            if pe_val is not None:
+                price_data['pe_ttm'] = round(pe_val, 2)
+            if pb_val is not None:
+                price_data['pb'] = round(pb_val, 2)
+            # 与 fetch_stock 一致：ROE = PB / PE * 100
+            if pe_val and pb_val is not None:
+                price_data['roe'] = round((pb_val / pe_val) * 100.0, 2)
+            results[code] = price_data
+
+        return results
+
+    @staticmethod
+    def _latest_quote(data, symbol):
+        """从 yf.download 的结果中取出某只股票最后一个有效收盘价及其时间"""
+        try:
+            columns = data.columns
+            if getattr(columns, 'nlevels', 1) > 1:
+                if symbol not in columns.get_level_values(0):
+                    return None
+                frame = data[symbol]
+            else:
+                frame = data
+            close = frame['Close'].dropna()
+        except Exception:
+            return None
+        if close.empty:
+            return None
+        return float(close.iloc[-1]), close.index[-1].to_pydatetime()
+
+    @staticmethod
+    def _fetch_fundamentals(yf, symbols):
+        """逐只获取 trailingPE / priceToBook，返回 {symbol: (pe, pb)}"""
+        fundamentals = {}
+        tickers = yf.Tickers(" ".join(symbols))
+        for symbol in symbols:
+            try:
+                info = tickers.tickers[symbol].info or {}
+                pe_val = info.get('trailingPE')
+                pb_val = info.get('priceToBook')
+                fundamentals[symbol] = (
+                    float(pe_val) if pe_val is not None else None,
+                    float(pb_val) if pb_val is not None else None,
+                )
+            except Exception as e:
+                logger.warning(f"yfinance 获取 {symbol} 基本面失败: {e}")
+        return fundamentals
+
+
+class ReplaySource(QuoteSource):
+    """回放录制的页面片段的数据源：语料一次性载入内存，同一只股票的多条记录轮流返回
+
+    片段经过与浏览器抓取相同的解析路径（`fetcher.price_data_from_fragments`），
+    可替代任意在线数据源做离线吞吐测试与回归测试。
+    """
+
+    name = 'replay'
+    batch = True
+    cacheable = False
+
+    def __init__(self, path: Optional[str] = None, corpus: Optional[Dict[str, list]] = None):
+        self.path = path or settings.QUOTE_CORPUS_PATH
+        self._corpus = corpus
+        self._positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _load(self) -> Dict[str, list]:
+        with self._lock:
+            if self._corpus is None:
+                try:
+                    self._corpus = QuoteCorpus(self.path).load()
+                except Exception as e:
+                    logger.warning(f"载入行情语料库失败 {self.path}: {e}")
+                    self._corpus = {}
+                logger.info(f"已载入行情语料库: {len(self._corpus)} 只股票 ({self.path})")
+            return self._corpus
+
+    def _next_fragments(self, stock_path_code: str):
+        records = self._load().get(stock_path_code)
+        if not records:
+            return None
+        with self._lock:
+            position = self._positions.get(stock_path_code, 0)
+            self._positions[stock_path_code] = position + 1
+        return records[position % len(records)]
+
+    def fetch(self, stock_path_code: str) -> Optional[dict]:
+        from apps.core.stock.fetcher import price_data_from_fragments
+
+        fragments = self._next_fragments(stock_path_code)
+        if fragments is None:
+            logger.warning(f"行情语料库中没有 {stock_path_code} 的记录")
+            return None
+        try:
+            price_data = price_data_from_fragments(fragments)
+        except ValueError as e:
+            logger.warning(f"解析回放片段失败 {stock_path_code}: {e}")
+            return None
+        return price_data if price_data else None
+
+
+def _find_first(obj, keys):
+    """在嵌套的 dict/list 中深度优先查找第一个出现的非空键值"""
+    if isinstance(obj, dict):
+        for key in keys:
+            value = obj.get(key)
+            if value not in (None, '', [], {}):
+                return value
+        for value in obj.values():
+            found = _find_first(value, keys)
+            if found is not None:
+                return found
+    elif isinstance(obj, list):
+        for value in obj:
+            found = _find_first(value, keys)
+            if found is not None:
+                return found
+    return None
+
+
+def _collect_pankou(obj, pankou):
+    """收集接口返回中 {name/key, value} 形式的盘口条目"""
+    if isinstance(obj, dict):
+        name = obj.get('name') or obj.get('key')
+        value = obj.get('value')
+        if isinstance(name, str) and isinstance(value, (str, int, float)):
+            pankou.setdefault(name, str(value))
+        for child in obj.values():
+            _collect_pankou(child, pankou)
+    elif isinstance(obj, list):
+        for child in obj:
+            _collect_pankou(child, pankou)
+    return pankou
+
+
+def parse_quotation_payload(payload) -> Optional[dict]:
+    """把百度股市通行情接口的 JSON 转换为与 `fetch_stock` 相同结构的 dict"""
+    from apps.core.stock.fetcher import build_price_data
+
+    if not isinstance(payload, dict):
+        return None
+    result = payload.get('Result', payload)
+
+    # 当前价格与时间只从 `Result.cur` 读取：其他位置的 price/time（如分时数据 minute）是历史价格，
+    # 缺少 `cur` 时返回 None，由 FallbackSource 回退到浏览器抓取
+    cur = result.get('cur') if isinstance(result, dict) else None
+    if not isinstance(cur, dict):
+        return None
+    price = next((cur[key] for key in ('price', 'curPrice', 'cur_price') if cur.get(key) not in (None, '')), None)
+    time_text = next((cur[key] for key in ('time', 'update_time', 'updateTime') if cur.get(key) not in (None, '')), None)
+    pankou_section = _find_first(result, ('pankouinfos', 'pankou'))
+    pankou = _collect_pankou(pankou_section, {}) if pankou_section is not None else {}
+
+    # 接口可能返回 Unix 时间戳（秒或毫秒）
+    if isinstance(time_text, (int, float)) or (isinstance(time_text, str) and time_text.isdigit() and len(time_text) in (10, 13)):
+        ts = int(time_text)
+        if ts > 10 ** 12:
+            ts //= 1000
+        time_text = datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")
+
+    try:
+        price_data = build_price_data(
+            str(price) if price is not None else None,
+            str(time_text) if time_text is not None else None,
+            pankou,
+        )
+    except ValueError as e:
+        logger.warning(f"解析 HTTP 行情失败: {e}")
+        return None
+
+    return price_data if price_data.get('price') else None
+
+
+_sources: Dict[str, QuoteSource] = {}
+_sources_lock = threading.RLock()  # _create_source 会递归调用 get_source
+_guards: Dict[str, Tuple[TokenBucket, CircuitBreaker]] = {}
+_guard_factory: Optional[Callable[[str], Tuple[TokenBucket, CircuitBreaker]]] = None
+
+
+def _create_guard(name: str) -> Tuple[TokenBucket, CircuitBreaker]:
+    rate = parse_rate_limits(settings.SOURCE_RATE_LIMITS).get(name, 0)
+    return (
+        TokenBucket(rate, settings.SOURCE_RATE_BURST),
+        CircuitBreaker(
+            name,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.CIRCUIT_RESET_TIMEOUT,
+            half_open_max=settings.CIRCUIT_HALF_OPEN_MAX,
+        ),
+    )
+
+
+def source_guard(name: str) -> Tuple[TokenBucket, CircuitBreaker]:
+    """按数据源名称获取（并缓存）进程内共享的 (限流器, 熔断器)，按 `SOURCE_RATE_LIMITS` 与 `CIRCUIT_*` 配置"""
+    with _sources_lock:
+        if name not in _guards:
+            _guards[name] = (_guard_factory or _create_guard)(name)
+        return _guards[name]
+
+
+def set_guard_factory(factory: Optional[Callable[[str], Tuple[TokenBucket, CircuitBreaker]]]):
+    """替换限流器与熔断器的创建方式，并清空已创建的数据源
+
+    抓取子进程启动时用它改为转发到父进程的代理，所有子进程共用父进程中的同一组限流器与熔断器。
+    """
+    global _guard_factory
+    with _sources_lock:
+        _guard_factory = factory
+        _guards.clear()
+        _sources.clear()
+
+
+def guarded(source: QuoteSource) -> GuardedSource:
+    """为数据源加上限流与熔断（同名数据源共用 `source_guard` 返回的限流器与熔断器）"""
+    limiter, breaker = source_guard(source.name)
+    return GuardedSource(source, limiter, breaker)
+
+
+def _create_source(name: str) -> QuoteSource:
+    if name == 'gushitong':
+        return guarded(SeleniumSource())
+    if name == 'http':
+        # HTTP 接口熔断时直接回退到浏览器
+        return FallbackSource(guarded(HttpSource()), _selenium_source())
+    if name == 'yfinance':
+        return guarded(YFinanceSource())
+    if name == 'replay':
+        return ReplaySource()
+    logger.warning(f"未知的数据源 {name}，使用默认的 'http'")
+    return _create_source('http')
+
+
+def _selenium_source() -> QuoteSource:
+    """'gushitong' 与 'http' 的浏览器回退共用同一个限流器与熔断器"""
+    return get_source('gushitong')
+
+
+def get_source(name: Optional[str] = None) -> QuoteSource:
+    """按名称获取（并缓存）数据源实例，默认使用 `settings.DEFAULT_SOURCE`"""
+    name = (name or settings.DEFAULT_SOURCE or 'http').lower()
+    with _sources_lock:
+        if name not in _sources:
+            _sources[name] = _create_source(name)
+        return _sources[name]
+
+
+def _resolve_source(source: Union[str, QuoteSource, None]) -> QuoteSource:
+    return source if isinstance(source, QuoteSource) else get_source(source)
+
+
+def _cache_get_many(stock_path_codes, use_cache: bool) -> Dict[str, dict]:
+    cache = get_quote_cache() if use_cache else None
+    if cache is None:
+        return {}
+    try:
+        return cache.get_many(stock_path_codes)
+    except Exception as e:
+        logger.warning(f"读取行情缓存失败: {e}")
+        return {}
+
+
+def _cache_set_many(quotes: Dict[str, Optional[dict]], use_cache: bool):
+    cache = get_quote_cache() if use_cache else None
+    if cache is None:
+        return
+    try:
+        cache.set_many(quotes)
+    except Exception as e:
+        logger.warning(f"写入行情缓存失败: {e}")
+
+
+def fetch_quote(stock_path_code: str, source: Union[str, QuoteSource, None] = None, use_cache: bool = True) -> Optional[dict]:
+    """使用配置的数据源获取单只股票行情
+
+    TTL 内命中跨进程行情缓存时直接返回缓存结果；`use_cache=False` 绕过缓存强制抓取（结果仍写回缓存）。
+    不读写缓存的数据源（`cacheable=False`，如 'replay'）既不读取也不写回缓存。
+    """
+    source = _resolve_source(source)
+    cached = _cache_get_many([stock_path_code], use_cache and source.cacheable)
+    if stock_path_code in cached:
+        logger.info(f"行情缓存命中: {stock_path_code}")
+        return cached[stock_path_code]
+
+    data = source.fetch(stock_path_code)
+    _cache_set_many({stock_path_code: data}, source.cacheable)
+    return data
+
+
+def fetch_quotes(stock_path_codes: Iterable[str], source: Union[str, QuoteSource, None] = None,
+                 use_cache: bool = True) -> Dict[str, Optional[dict]]:
+    """使用配置的数据源批量获取行情，返回 {stock_path_code: dict 或 None}；只抓取缓存未命中的股票"""
+    codes = list(stock_path_codes)
+    source = _resolve_source(source)
+    results: Dict[str, Optional[dict]] = dict(_cache_get_many(codes, use_cache and source.cacheable))
+    missing = [code for code in codes if code not in results]
+    if missing:
+        fetched = source.fetch_many(missing)
+        _cache_set_many(fetched, source.cacheable)
+        results.update(fetched)
+    return {code: results.get(code) for code in codes}
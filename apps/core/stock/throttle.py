@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+"""
+限流与熔断模块
+
+每个行情数据源各自拥有一个令牌桶限流器与一个熔断器：
+- 令牌桶按 `rate` 次/秒匀速发放令牌（最多积攒 `burst` 个），请求前先取令牌，超出速率时阻塞等待；
+- 熔断器在连续失败 `failure_threshold` 次后打开，打开期间直接拒绝请求；
+  `reset_timeout` 秒后进入半开状态，只放行少量探测请求，探测成功则关闭，失败则重新打开。
+"""
+import threading
+import time
+from typing import Dict
+
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """解析形如 'gushitong=1,http=5' 的每个数据源速率配置（次/秒）"""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' not in item:
+            continue
+        name, value = item.split('=', 1)
+        try:
+            limits[name.strip().lower()] = float(value)
+        except ValueError:
+            logger.warning(f"忽略无法解析的限流配置: {item}")
+    return limits
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic, sleep=time.sleep):
+        """
+        令牌桶限流器
+
+        参数:
+            rate (float): 每秒发放的令牌数（<=0 表示不限流）
+            burst (int): 桶容量，即允许的最大突发请求数
+        """
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """尝试取出令牌（不超过桶容量）：成功返回 0，否则返回还需等待的秒数（不取出）"""
+        if self.rate <= 0:
+            return 0.0
+        tokens = float(tokens)
+        if tokens > self.capacity:
+            raise ValueError(f"一次最多取出 {self.capacity:g} 个令牌，请使用 acquire 分批取出")
+        with self._lock:
+            self._refill(self.clock())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def reserve(self, tokens: float = 1) -> float:
+        """预约令牌：立即扣除（不足时透支，之后的请求顺延），返回调用方发出请求前需要等待的秒数
+
+        不阻塞，供抓取子进程的监管者代为限流（见 worker_supervisor）。
+        """
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(self.clock())
+            self._tokens -= float(tokens)
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self, tokens: float = 1):
+        """取出令牌，令牌不足时阻塞等待
+
+        一次请求的令牌数超过桶容量时（例如多标签页批量加载多个页面）按桶容量分批取出，
+        每个页面都按配置的速率计费，总等待时间约为 (tokens - burst) / rate 秒。
+        """
+        if self.rate <= 0:
+            return
+        remaining = float(tokens)
+        while remaining > 0:
+            chunk = min(remaining, self.capacity)
+            while True:
+                wait = self.try_acquire(chunk)
+                if wait <= 0:
+                    break
+                self.sleep(wait)
+            remaining -= chunk
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 60,
+                 half_open_max: int = 1, clock=time.monotonic):
+        """
+        熔断器
+
+        参数:
+            name (str): 日志中标识的数据源名称
+            failure_threshold (int): 连续失败多少次后打开（<=0 表示不熔断）
+            reset_timeout (float): 打开多少秒后进入半开状态
+            half_open_max (int): 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_threshold = int(failure_threshold)
+        self.reset_timeout = float(reset_timeout)
+        self.half_open_max = max(1, int(half_open_max))
+        self.clock = clock
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self):
+        if self._state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+            logger.info(f"熔断器半开，开始探测数据源 {self.name}")
+
+    def allow(self) -> bool:
+        """是否放行一次请求（半开状态下占用一个探测名额，须随后调用 record_success / record_failure）"""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            self._update_state()
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_max:
+                self._probes += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"熔断器关闭，数据源 {self.name} 已恢复")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(
+                        f"熔断器打开：数据源 {self.name} 连续失败 {self._failures} 次，{self.reset_timeout}s 内暂停请求"
+                    )
+                self._state = self.OPEN
+                self._opened_at = self.clock()
+                self._probes = 0
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+交易日历模块
+
+按市场（A 股 'ab'、港股 'hk'、美股 'us'）判断当前是否处于交易时段：
+周末与本地节假日文件（`settings.TRADING_HOLIDAYS_FILE`）中列出的日期休市。
+抓取任务据此跳过休市市场的股票，只在每次收盘（及收盘竞价结束）后补抓一次收盘快照；
+已抓取过的收盘快照记录在 sqlite 文件中，cron / 一次性运行之间共享，抓取失败时撤销记录以便下一轮重抓。
+"""
+import datetime
+import sqlite3
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from config.settings import settings
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class MarketHours:
+    """单个市场的交易时段（交易所当地时间）"""
+
+    timezone: str
+    # 连续竞价时段列表，例如 A 股 ((09:30, 11:30), (13:00, 15:00))
+    sessions: Tuple[Tuple[datetime.time, datetime.time], ...]
+    # 收盘后等待多久再抓取收盘快照（例如港股收市竞价持续到 16:10 左右才产生收盘价）
+    snapshot_delay: datetime.timedelta = datetime.timedelta(0)
+
+    @property
+    def tz(self) -> ZoneInfo:
+        return ZoneInfo(self.timezone)
+
+    @property
+    def close_time(self) -> datetime.time:
+        return self.sessions[-1][1]
+
+
+MARKET_HOURS: Dict[str, MarketHours] = {
+    'ab': MarketHours('Asia/Shanghai', (
+        (datetime.time(9, 30), datetime.time(11, 30)),
+        (datetime.time(13, 0), datetime.time(15, 0)),
+    )),
+    'hk': MarketHours('Asia/Hong_Kong', (
+        (datetime.time(9, 30), datetime.time(12, 0)),
+        (datetime.time(13, 0), datetime.time(16, 0)),
+    ), snapshot_delay=datetime.timedelta(minutes=10)),
+    'us': MarketHours('America/New_York', (
+        (datetime.time(9, 30), datetime.time(16, 0)),
+    )),
+}
+
+
+def load_holidays(path) -> Dict[str, Set[datetime.date]]:
+    """读取节假日文件，返回 {market: {休市日期}}
+
+    每行格式为 `<市场> <YYYY-MM-DD> [说明]`，'#' 开头的行为注释，例如：
+
+        ab 2026-10-01 国庆节
+    """
+    holidays: Dict[str, Set[datetime.date]] = {}
+    path = Path(path).expanduser()
+    if not path.exists():
+        logger.warning(f"节假日文件不存在，仅按周末判断休市: {path}")
+        return holidays
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            parts = line.split()
+            try:
+                market, date = parts[0].lower(), datetime.date.fromisoformat(parts[1])
+            except (IndexError, ValueError):
+                logger.warning(f"忽略无法解析的节假日行 {path}:{line_no}: {line}")
+                continue
+            holidays.setdefault(market, set()).add(date)
+    return holidays
+
+
+class TradingCalendar:
+    def __init__(self, holidays: Optional[Dict[str, Set[datetime.date]]] = None,
+                 markets: Optional[Dict[str, MarketHours]] = None):
+        """
+        交易日历
+
+        参数:
+            holidays (dict): {market: {休市日期}}，通常由 `load_holidays` 读取
+            markets (dict): {market: MarketHours}，默认 `MARKET_HOURS`
+        """
+        self.holidays = holidays or {}
+        self.markets = markets or MARKET_HOURS
+
+    def knows(self, market: str) -> bool:
+        return market in self.markets
+
+    def _local_now(self, market: str, now: Optional[datetime.datetime] = None) -> datetime.datetime:
+        tz = self.markets[market].tz
+        if now is None:
+            return datetime.datetime.now(tz)
+        # 不带时区的时间视为本机本地时间
+        return (now if now.tzinfo else now.astimezone()).astimezone(tz)
+
+    def is_trading_day(self, market: str, date: datetime.date) -> bool:
+        """是否为交易日（非周末且不在节假日文件中）"""
+        return date.weekday() < 5 and date not in self.holidays.get(market, ())
+
+    def is_open(self, market: str, now: Optional[datetime.datetime] = None) -> bool:
+        """市场当前是否处于连续交易时段（未知市场视为始终开市）"""
+        if not self.knows(market):
+            return True
+        local = self._local_now(market, now)
+        if not self.is_trading_day(market, local.date()):
+            return False
+        current = local.time()
+        return any(start <= current < end for start, end in self.markets[market].sessions)
+
+    def last_close(self, market: str, now: Optional[datetime.datetime] = None) -> Optional[datetime.datetime]:
+        """最近一次已经发生的收盘时间（交易所当地时间），未知市场或近期无交易日时返回 None
+
+        收盘后 `snapshot_delay` 内仍返回上一次收盘，当日收盘价产生后才返回当日收盘。
+        """
+        if not self.knows(market):
+            return None
+        hours = self.markets[market]
+        local = self._local_now(market, now)
+        date = local.date()
+        # 最多回溯一个月，覆盖最长的长假
+        for _ in range(31):
+            if self.is_trading_day(market, date):
+                close = datetime.datetime.combine(date, hours.close_time, tzinfo=hours.tz)
+                if close + hours.snapshot_delay <= local:
+                    return close
+            date -= datetime.timedelta(days=1)
+        return None
+
+
+class MemorySnapshotStore:
+    """进程内的收盘快照记录（未配置持久化记录或其不可用时使用）"""
+
+    def __init__(self):
+        self._snapshots: Dict[str, datetime.datetime] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, market: str, close: datetime.datetime) -> bool:
+        with self._lock:
+            if self._snapshots.get(market) == close:
+                return False
+            self._snapshots[market] = close
+            return True
+
+    def release(self, market: str, close: datetime.datetime):
+        with self._lock:
+            if self._snapshots.get(market) == close:
+                del self._snapshots[market]
+
+
+class SnapshotStore:
+    def __init__(self, path: str):
+        """
+        基于 sqlite 的收盘快照记录：每个市场最近一次已放行的收盘时间，跨进程、跨重启共享
+
+        参数:
+            path (str): sqlite 文件路径
+        """
+        self.path = Path(path).expanduser()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.path), timeout=5, isolation_level=None)
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    self.path.parent.mkdir(parents=True, exist_ok=True)
+                    conn.execute(
+                        "CREATE TABLE IF NOT EXISTS market_snapshots (market TEXT PRIMARY KEY, last_close TEXT NOT NULL)"
+                    )
+                    self._initialized = True
+        return conn
+
+    def claim(self, market: str, close: datetime.datetime) -> bool:
+        """记录 market 的 close 这次收盘快照；已记录过时返回 False（多个进程同时调用只有一个返回 True）"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "INSERT INTO market_snapshots (market, last_close) VALUES (?, ?) "
+                "ON CONFLICT(market) DO UPDATE SET last_close = excluded.last_close "
+                "WHERE last_close <> excluded.last_close",
+                (market, close.isoformat()),
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    def release(self, market: str, close: datetime.datetime):
+        """撤销 market 的 close 这次收盘快照记录（抓取失败时调用，下一轮重新放行）"""
+        conn = self._connect()
+        try:
+            conn.execute(
+                "DELETE FROM market_snapshots WHERE market = ? AND last_close = ?", (market, close.isoformat())
+            )
+        finally:
+            conn.close()
+
+
+class MarketSessionGate:
+    def __init__(self, calendar: TradingCalendar, store=None):
+        """
+        按交易时段决定某个市场本轮是否需要抓取：开市时始终抓取；
+        休市时每次收盘后只放行一次（收盘快照），之后跳过直到下一次开市；
+        收盘快照未能写入时由调用方 `release`，下一轮重新放行
+
+        参数:
+            calendar (TradingCalendar): 交易日历
+            store: 收盘快照记录（`SnapshotStore` 等，提供 `claim(market, close)`），默认只记录在进程内
+        """
+        self.calendar = calendar
+        self.store = store or MemorySnapshotStore()
+        self._fallback = MemorySnapshotStore()
+
+    def _claim(self, market: str, close: datetime.datetime) -> bool:
+        try:
+            return self.store.claim(market, close)
+        except Exception as e:
+            logger.warning(f"读写收盘快照记录失败，改为进程内记录: {e}")
+            return self._fallback.claim(market, close)
+
+    def decide(self, market: str, now: Optional[datetime.datetime] = None) -> Tuple[bool, Optional[datetime.datetime]]:
+        """返回 (本轮是否抓取, 本轮放行的收盘快照对应的收盘时间；开市或跳过时为 None)"""
+        if self.calendar.is_open(market, now):
+            return True, None
+        last_close = self.calendar.last_close(market, now)
+        if last_close is None or not self._claim(market, last_close):
+            return False, None
+        logger.info(f"市场 {market} 已休市，抓取 {last_close:%Y-%m-%d %H:%M} 收盘快照")
+        return True, last_close
+
+    def should_fetch(self, market: str, now: Optional[datetime.datetime] = None) -> bool:
+        return self.decide(market, now)[0]
+
+    def release(self, market: str, close: datetime.datetime):
+        """撤销 market 的收盘快照记录，下一轮重新抓取"""
+        logger.warning(f"市场 {market} 的 {close:%Y-%m-%d %H:%M} 收盘快照未能写入，下一轮重新抓取")
+        try:
+            self.store.release(market, close)
+        except Exception as e:
+            logger.warning(f"读写收盘快照记录失败，改为进程内记录: {e}")
+        self._fallback.release(market, close)
+
+
+_calendar: Optional[TradingCalendar] = None
+_gate: Optional[MarketSessionGate] = None
+_calendar_lock = threading.Lock()
+
+
+def get_trading_calendar() -> TradingCalendar:
+    """获取进程内共享的交易日历（首次调用时读取节假日文件）"""
+    global _calendar
+    with _calendar_lock:
+        if _calendar is None:
+            _calendar = TradingCalendar(load_holidays(settings.TRADING_HOLIDAYS_FILE))
+        return _calendar
+
+
+def get_session_gate() -> MarketSessionGate:
+    """获取进程内共享的交易时段闸门（已抓取过的收盘快照记录在 `MARKET_SNAPSHOT_STATE_PATH`）"""
+    global _gate
+    calendar = get_trading_calendar()
+    with _calendar_lock:
+        if _gate is None:
+            store = SnapshotStore(settings.MARKET_SNAPSHOT_STATE_PATH) if settings.MARKET_SNAPSHOT_STATE_PATH else None
+            _gate = MarketSessionGate(calendar, store)
+        return _gate
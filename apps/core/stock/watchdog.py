@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+抓取看门狗模块
+
+为单只股票的抓取设置墙钟截止时间（deadline），由独立的计时线程在驱动之外强制执行：
+超时后直接杀掉 chromedriver 及其启动的 Chrome 进程树，使卡住的 WebDriver 调用立即失败，
+调度器据此记录超时并继续处理其他股票。
+"""
+import os
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+from config.logging_config import get_logger
+
+try:
+    import psutil
+except ImportError:  # psutil 为可选依赖，缺失时在 Linux 上通过 /proc 查找子进程
+    psutil = None
+
+logger = get_logger(__name__)
+
+
+class FetchDeadlineExceeded(TimeoutError):
+    """单只股票抓取超过截止时间"""
+
+
+def _descendant_pids(pid: int) -> List[int]:
+    """返回 pid 的所有后代进程（优先使用 psutil，否则扫描 /proc）"""
+    if psutil is not None:
+        try:
+            return [child.pid for child in psutil.Process(pid).children(recursive=True)]
+        except Exception:
+            return []
+
+    children = {}
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                stat = f.read()
+            # 第 4 个字段为 ppid；进程名可能含空格，从最后一个 ')' 之后解析
+            ppid = int(stat[stat.rindex(')') + 2:].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    result, stack = [], [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def kill_process_tree(pid: int):
+    """强制结束进程及其所有后代进程（先收集后代，再从父进程开始结束，避免父进程继续拉起子进程）"""
+    kill_signal = getattr(signal, 'SIGKILL', signal.SIGTERM)
+    for target in [pid] + _descendant_pids(pid):
+        try:
+            os.kill(target, kill_signal)
+        except (OSError, ProcessLookupError):
+            pass
+
+
+def process_tree_rss(pid: int) -> int:
+    """进程及其所有后代进程的常驻内存（RSS）之和，单位字节；进程不存在时返回 0"""
+    total = 0
+    for target in [pid] + _descendant_pids(pid):
+        if psutil is not None:
+            try:
+                total += psutil.Process(target).memory_info().rss
+            except Exception:
+                pass
+            continue
+        try:
+            with open(f'/proc/{target}/statm', 'r') as f:
+                total += int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            pass
+    return total
+
+
+def _service_pid(obj) -> Optional[int]:
+    """从 WebDriver 或 Service 对象中取 chromedriver 进程 pid"""
+    service = getattr(obj, 'service', obj)
+    process = getattr(service, 'process', None)
+    pid = getattr(process, 'pid', None)
+    return pid if isinstance(pid, int) else None
+
+
+class FetchDeadline:
+    def __init__(self, seconds: float, label: str = ""):
+        """
+        单只股票抓取的截止时间
+
+        参数:
+            seconds (float): 允许的墙钟时间（<=0 表示不限制）
+            label (str): 日志中标识本次抓取（通常为股票代码）
+        """
+        self.seconds = float(seconds)
+        self.label = label
+        self.expired = False
+        self._started = time.monotonic()
+        self._targets = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def start(self):
+        if self.seconds > 0:
+            self._timer = threading.Timer(self.seconds, self._expire)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def cancel(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+    def remaining(self, default: Optional[float] = None) -> Optional[float]:
+        """剩余时间（秒）；未设置截止时间时返回 default"""
+        if self.seconds <= 0:
+            return default
+        return max(self.seconds - (time.monotonic() - self._started), 0.0)
+
+    @property
+    def exceeded(self) -> bool:
+        """是否已超过截止时间（计时线程已触发，或剩余时间已耗尽）"""
+        return self.expired or self.remaining(default=1.0) <= 0
+
+    def attach(self, target):
+        """登记一个 WebDriver 或 chromedriver Service，超时时连同其进程树一起杀掉"""
+        with self._lock:
+            self._targets.append(target)
+            expired = self.expired
+        if expired:
+            self._kill(target)
+
+    def detach(self, target):
+        with self._lock:
+            if target in self._targets:
+                self._targets.remove(target)
+
+    def _kill(self, target):
+        pid = _service_pid(target)
+        if pid is not None:
+            kill_process_tree(pid)
+
+    def _expire(self):
+        with self._lock:
+            self.expired = True
+            targets = list(self._targets)
+        logger.error(f"⏱️ 抓取超过 {self.seconds}s 截止时间，强制结束浏览器: {self.label}")
+        for target in targets:
+            self._kill(target)
+
+
+_local = threading.local()
+
+
+def current_deadline() -> Optional[FetchDeadline]:
+    """返回当前线程正在执行的抓取截止时间（没有则返回 None）"""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def fetch_deadline(seconds: float, label: str = ""):
+    """在当前线程上设置抓取截止时间；期间创建或借用的浏览器通过 `current_deadline().attach` 登记"""
+    deadline = FetchDeadline(seconds, label).start()
+    previous = current_deadline()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+        deadline.cancel()
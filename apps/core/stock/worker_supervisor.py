@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+"""
+抓取子进程监管模块
+
+常驻调度器中长期运行的 Chrome 会持续泄漏内存。开启 `FETCH_WORKER_PROCESSES` 后，
+浏览器抓取改由若干独立的子进程执行，每个子进程拥有自己的浏览器（WebDriver 池大小为 1），
+父进程中的监管者负责：
+- 分发：每个子进程同一时间只处理一只股票，结果通过管道返回，由父进程写库；
+- 回收：子进程及其浏览器进程树的 RSS 超过 `max_rss_mb`，或处理的页面数达到 `max_pages` 时，优雅退出并重建；
+- 重启：子进程崩溃或单只股票超过 `task_timeout` 仍未返回时，强制结束其进程树并重建，该股票记为失败/超时；
+- 限流与熔断：子进程中的数据源不持有自己的令牌桶与熔断器，每次请求上游前经管道向父进程预约令牌、
+  询问熔断器，并回报结果。所有子进程与父进程共用同一组按数据源划分的限流器与熔断器
+  （`sources.source_guard`），开启 N 个子进程时上游看到的仍是 `SOURCE_RATE_LIMITS` 配置的速率。
+"""
+import atexit
+import multiprocessing
+import signal
+import threading
+import time
+from collections import deque
+from multiprocessing.connection import wait
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import settings
+from config.logging_config import get_logger
+from apps.core.stock.sources import source_guard
+from apps.core.stock.watchdog import FetchDeadlineExceeded, kill_process_tree, process_tree_rss
+
+logger = get_logger(__name__)
+
+# 子进程发往父进程的限流/熔断请求：(GUARD_MESSAGE, 操作, 数据源名称, 令牌数)
+GUARD_MESSAGE = 'guard'
+
+
+class RemoteLimiter:
+    """子进程中的限流器代理：向父进程预约令牌，按返回的时间在本进程中等待"""
+
+    def __init__(self, conn, name: str, sleep=time.sleep):
+        self.conn = conn
+        self.name = name
+        self.sleep = sleep
+
+    def acquire(self, tokens: float = 1):
+        self.conn.send((GUARD_MESSAGE, 'reserve', self.name, tokens))
+        wait = self.conn.recv()
+        if wait > 0:
+            self.sleep(wait)
+
+
+class RemoteBreaker:
+    """子进程中的熔断器代理：放行判断与成功/失败记录都由父进程中的熔断器完成"""
+
+    def __init__(self, conn, name: str):
+        self.conn = conn
+        self.name = name
+
+    def allow(self) -> bool:
+        self.conn.send((GUARD_MESSAGE, 'allow', self.name, None))
+        return bool(self.conn.recv())
+
+    def record_success(self):
+        self.conn.send((GUARD_MESSAGE, 'success', self.name, None))
+
+    def record_failure(self):
+        self.conn.send((GUARD_MESSAGE, 'failure', self.name, None))
+
+
+def fetch_worker_main(worker_id: int, conn, source_name: Optional[str] = None):
+    """子进程入口：循环接收 (task_id, stock_path_code)，抓取后回传 (task_id, status, data)，收到 None 时退出"""
+    # Ctrl-C 由父进程统一处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from config.logging_config import setup_logging
+    from apps.core.stock.driver_pool import shutdown_driver_pool
+    from apps.core.stock.sources import fetch_quote, set_guard_factory
+
+    setup_logging()
+    # 限流与熔断转发到父进程，所有子进程共用同一组限流器与熔断器
+    set_guard_factory(lambda name: (RemoteLimiter(conn, name), RemoteBreaker(conn, name)))
+    # 每个子进程只需要一个浏览器；持久化用户目录按子进程区分，避免多个 Chrome 争用同一目录
+    settings.DRIVER_POOL_SIZE = 1
+    if settings.CHROME_PROFILE_DIR:
+        settings.CHROME_PROFILE_DIR = str(Path(settings.CHROME_PROFILE_DIR).expanduser() / f"process-{worker_id}")
+
+    try:
+        while True:
+            try:
+                task = conn.recv()
+            except (EOFError, OSError):
+                break
+            if task is None:
+                break
+            task_id, stock_path_code = task
+            status, data = 'ok', None
+            try:
+                data = fetch_quote(stock_path_code, source=source_name)
+            except FetchDeadlineExceeded as e:
+                logger.error(f"⏱️ 子进程 {worker_id} 抓取超时 {stock_path_code}: {e}")
+                status = 'timeout'
+            except Exception as e:
+                logger.error(f"子进程 {worker_id} 抓取失败 {stock_path_code}: {e}")
+                status = 'failed'
+            conn.send((task_id, status, data))
+    finally:
+        shutdown_driver_pool()
+        conn.close()
+
+
+class WorkerHandle:
+    """监管者持有的子进程句柄，记录已处理的页面数与正在处理的任务"""
+
+    def __init__(self, worker_id: int, process, conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.pages = 0
+        self.task: Optional[Tuple[int, str]] = None
+        self.task_started = 0.0
+        # 熔断器已放行、子进程尚未回报结果的请求数（按数据源）
+        self.guard_calls: Dict[str, int] = {}
+
+
+class FetchWorkerSupervisor:
+    def __init__(self, workers: int = 2, source_name: Optional[str] = None, max_rss_mb: float = 1024,
+                 max_pages: int = 200, task_timeout: float = 120, worker_target: Optional[Callable] = None,
+                 start_method: str = 'spawn', rss_reader: Callable[[int], int] = process_tree_rss,
+                 clock=time.monotonic, guards: Callable[[str], tuple] = source_guard):
+        """
+        抓取子进程监管者
+
+        参数:
+            workers (int): 子进程数量
+            source_name (str): 子进程使用的数据源名称（默认 `settings.DEFAULT_SOURCE`）
+            max_rss_mb (float): 子进程（含浏览器进程树）RSS 上限（MB），超过后回收重建（<=0 表示不限制）
+            max_pages (int): 单个子进程最多处理的页面数，达到后回收重建（<=0 表示不限制）
+            task_timeout (float): 单只股票的最长等待时间（秒），超过后强制结束子进程（<=0 表示不限制）
+            worker_target (callable): 子进程入口 `target(worker_id, conn, source_name)`，默认 `fetch_worker_main`
+            start_method (str): multiprocessing 启动方式，默认 'spawn'（父进程中有线程，避免 fork）
+            rss_reader (callable): 读取进程树 RSS（字节）的函数（测试中可替换）
+            guards (callable): 按数据源名称返回 (限流器, 熔断器)，代子进程限流与熔断，默认 `sources.source_guard`
+        """
+        self.workers = max(1, int(workers))
+        self.source_name = source_name
+        self.max_rss_bytes = float(max_rss_mb) * 1024 * 1024
+        self.max_pages = int(max_pages)
+        self.task_timeout = float(task_timeout)
+        self.worker_target = worker_target or fetch_worker_main
+        self.context = multiprocessing.get_context(start_method)
+        self.rss_reader = rss_reader
+        self.clock = clock
+        self.guards = guards
+        self.restarts = 0
+        self._handles: List[WorkerHandle] = []
+        self._lock = threading.Lock()
+
+    def _spawn(self, worker_id: int) -> WorkerHandle:
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=self.worker_target,
+            args=(worker_id, child_conn, self.source_name),
+            name=f"fetch-worker-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        child_conn.close()
+        logger.info(f"启动抓取子进程 {worker_id}（pid={process.pid}）")
+        return WorkerHandle(worker_id, process, parent_conn)
+
+    def _stop(self, handle: WorkerHandle, graceful: bool = True):
+        """结束子进程：优雅退出时先通知其关闭浏览器，等待超时或强制结束时杀掉整个进程树"""
+        if graceful and handle.process.is_alive():
+            try:
+                handle.conn.send(None)
+                handle.process.join(timeout=10)
+            except (OSError, ValueError):
+                pass
+        if handle.process.is_alive():
+            kill_process_tree(handle.process.pid)
+            handle.process.join(timeout=5)
+        handle.conn.close()
+
+    def _serve_guard(self, handle: WorkerHandle, message):
+        """代子进程执行一次限流/熔断操作，需要回复的操作把结果发回子进程"""
+        _, op, name, tokens = message
+        limiter, breaker = self.guards(name)
+        if op == 'reserve':
+            handle.conn.send(limiter.reserve(tokens))
+        elif op == 'allow':
+            allowed = breaker.allow()
+            if allowed:
+                handle.guard_calls[name] = handle.guard_calls.get(name, 0) + 1
+            handle.conn.send(allowed)
+        else:
+            handle.guard_calls[name] = max(0, handle.guard_calls.get(name, 0) - 1)
+            if op == 'success':
+                breaker.record_success()
+            else:
+                breaker.record_failure()
+
+    def _receive(self, handle: WorkerHandle):
+        """读取子进程发来的消息：限流/熔断请求就地处理，返回抓取结果（尚未返回时为 None）"""
+        try:
+            while handle.conn.poll():
+                message = handle.conn.recv()
+                if message[0] != GUARD_MESSAGE:
+                    return message
+                self._serve_guard(handle, message)
+        except (EOFError, OSError):
+            pass
+        return None
+
+    def _abandon_guard_calls(self, handle: WorkerHandle):
+        """子进程在回报结果前被结束时，已放行的请求按失败记入熔断器（释放半开状态的探测名额）"""
+        calls, handle.guard_calls = handle.guard_calls, {}
+        for name, count in calls.items():
+            breaker = self.guards(name)[1]
+            for _ in range(count):
+                breaker.record_failure()
+
+    def _restart(self, handle: WorkerHandle, reason: str, graceful: bool = True):
+        logger.warning(f"重建抓取子进程 {handle.worker_id}（pid={handle.process.pid}）：{reason}")
+        self._abandon_guard_calls(handle)
+        self._stop(handle, graceful=graceful)
+        self.restarts += 1
+        self._handles[handle.worker_id] = self._spawn(handle.worker_id)
+
+    def _recycle_reason(self, handle: WorkerHandle) -> Optional[str]:
+        if self.max_pages > 0 and handle.pages >= self.max_pages:
+            return f"已处理 {handle.pages} 个页面"
+        if self.max_rss_bytes > 0:
+            rss = self.rss_reader(handle.process.pid)
+            if rss > self.max_rss_bytes:
+                return f"内存 {rss / 1024 / 1024:.0f}MB 超过上限"
+        return None
+
+    def start(self):
+        """启动全部子进程（首次调用 `map` 时自动启动）"""
+        with self._lock:
+            if not self._handles:
+                self._handles = [self._spawn(worker_id) for worker_id in range(self.workers)]
+
+    def map(self, stock_path_codes: Iterable[str]) -> Iterator[Tuple[int, str, Optional[dict]]]:
+        """把股票分发给子进程抓取，按完成顺序产出 (下标, 状态, 行情)；状态为 'ok' / 'failed' / 'timeout'"""
+        self.start()
+        # 上一轮提前中止时仍在处理的任务结果已无人接收，直接重建这些子进程
+        for handle in list(self._handles):
+            if handle.task is not None:
+                handle.task = None
+                self._restart(handle, "上一轮任务未完成", graceful=False)
+        pending = deque(enumerate(stock_path_codes))
+
+        while True:
+            for handle in list(self._handles):
+                if handle.task is not None or not pending:
+                    continue
+                if not handle.process.is_alive():
+                    self._restart(handle, f"空闲时退出（exitcode={handle.process.exitcode}）", graceful=False)
+                    handle = self._handles[handle.worker_id]
+                task = pending.popleft()
+                try:
+                    handle.conn.send(task)
+                except (OSError, ValueError):
+                    pending.appendleft(task)
+                    self._restart(handle, "管道已断开", graceful=False)
+                    continue
+                handle.task = task
+                handle.task_started = self.clock()
+
+            busy = [handle for handle in self._handles if handle.task is not None]
+            if not busy:
+                if not pending:
+                    return
+                continue
+            wait([handle.conn for handle in busy] + [handle.process.sentinel for handle in busy], timeout=0.5)
+
+            for handle in busy:
+                task_id, stock_path_code = handle.task
+                result = self._receive(handle)
+
+                if result is not None:
+                    handle.task = None
+                    handle.pages += 1
+                    yield result
+                    reason = self._recycle_reason(handle)
+                    if reason:
+                        self._restart(handle, reason)
+                elif not handle.process.is_alive():
+                    handle.task = None
+                    logger.error(f"抓取子进程 {handle.worker_id} 崩溃（exitcode={handle.process.exitcode}）: {stock_path_code}")
+                    yield task_id, 'failed', None
+                    self._restart(handle, "崩溃", graceful=False)
+                elif self.task_timeout > 0 and self.clock() - handle.task_started > self.task_timeout:
+                    handle.task = None
+                    logger.error(f"⏱️ 抓取子进程 {handle.worker_id} 超过 {self.task_timeout}s 未返回: {stock_path_code}")
+                    yield task_id, 'timeout', None
+                    self._restart(handle, "抓取超时", graceful=False)
+
+    def shutdown(self):
+        """通知所有子进程退出并关闭浏览器"""
+        with self._lock:
+            handles, self._handles = self._handles, []
+        for handle in handles:
+            self._stop(handle)
+        if handles:
+            logger.info(f"✅ 已关闭 {len(handles)} 个抓取子进程")
+
+
+_supervisor: Optional[FetchWorkerSupervisor] = None
+_supervisor_lock = threading.Lock()
+
+
+def get_worker_supervisor() -> FetchWorkerSupervisor:
+    """获取进程级共享的抓取子进程监管者（惰性创建）"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = FetchWorkerSupervisor(
+                workers=settings.FETCH_WORKER_PROCESSES,
+                max_rss_mb=settings.FETCH_WORKER_MAX_RSS_MB,
+                max_pages=settings.FETCH_WORKER_MAX_PAGES,
+                task_timeout=settings.FETCH_WORKER_TASK_TIMEOUT,
+            )
+        return _supervisor
+
+
+def shutdown_worker_supervisor():
+    """关闭进程级共享的监管者及其子进程（调度器退出时调用）"""
+    global _supervisor
+    with _supervisor_lock:
+        supervisor, _supervisor = _supervisor, None
+    if supervisor is not None:
+        supervisor.shutdown()
+
+
+atexit.register(shutdown_worker_supervisor)
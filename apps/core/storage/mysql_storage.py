@@ -1,12 +1,42 @@
 import pymysql
 from pymysql.cursors import DictCursor
 
+from apps.core.storage.partitions import add_months, partition_name
+
 # 配置日志
 from config.logging_config import get_logger
 logger = get_logger(__name__)
 
+
+# 只有行情时间不早于已有记录时才覆盖 `stock_latest_price`（stock_time 必须最后更新，MySQL 按顺序求值）；
+# 目标表列名带表名限定，回填时的 INSERT ... SELECT 中不会与查询列产生歧义
+_LATEST = "`stock_latest_price`"
+_LATEST_NEWER = (
+    f"({_LATEST}.stock_time IS NULL OR VALUES(stock_time) IS NULL OR VALUES(stock_time) >= {_LATEST}.stock_time)"
+)
+_LATEST_ON_DUPLICATE = "ON DUPLICATE KEY UPDATE " + ", ".join(
+    f"{column} = IF({_LATEST_NEWER}, {value}, {_LATEST}.{column})"
+    for column, value in (
+        ("stock_date", "VALUES(stock_date)"),
+        ("stock_price", "VALUES(stock_price)"),
+        ("pe_ttm", "VALUES(pe_ttm)"),
+        ("pb", "VALUES(pb)"),
+        ("roe", "VALUES(roe)"),
+        ("fetch_date", "CURRENT_TIMESTAMP"),
+        ("stock_time", "VALUES(stock_time)"),
+    )
+)
+_LATEST_UPSERT_SQL = (
+    f"INSERT INTO {_LATEST} "
+    "(stock_code, stock_date, stock_time, stock_price, pe_ttm, pb, roe) "
+    "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+    + _LATEST_ON_DUPLICATE
+)
+
+
 class MySQLStorage:
-    def __init__(self, host, port, user, password, database, mincached=1, maxcached=5, blocking=True):
+    def __init__(self, host, port, user, password, database, mincached=1, maxcached=5, blocking=True,
+                 latest_price_table=False):
         """
         使用 DBUtils.PooledDB 实现的 MySQL 存储类（连接池）
 
@@ -15,6 +45,8 @@ class MySQLStorage:
             mincached (int): 初始连接数量
             maxcached (int): 最大连接数量
             blocking (bool): 当连接池满时是否阻塞等待
+            latest_price_table (bool): 是否维护并读取 `stock_latest_price`（需先执行迁移）：
+                写入价格历史时在同一事务中更新每只股票的最新价格，读取最新价格时按主键直接查询
         """
         self.host = host
         self.port = port
@@ -24,6 +56,11 @@ class MySQLStorage:
         self.mincached = int(mincached)
         self.maxcached = int(maxcached)
         self.blocking = bool(blocking)
+        self.latest_price_table = bool(latest_price_table)
+        # `stock_concern.priority` 列是否存在（None 表示尚未检测，见 `_concern_has_priority`）
+        self.concern_priority_column = None
+        # `stock_price_history.effective_time` 生成列是否存在（None 表示尚未检测，见 `_history_time`）
+        self.history_effective_time_column = None
 
         # 初始化连接池：使用 `dbutils.pooled_db.PooledDB`（不再支持旧版 `DBUtils`）
         try:
@@ -59,13 +96,48 @@ class MySQLStorage:
             logger.error(f"❌ 获取连接失败: {e}")
             return False
 
+    def _concern_has_priority(self, cur) -> bool:
+        """`stock_concern` 是否已有 priority 列（首次调用时检测并缓存）
+
+        未执行 20261017 迁移时只记录一次警告，关注股票按默认优先级 0 读写，抓取、告警与网页不受影响。
+        """
+        if self.concern_priority_column is None:
+            cur.execute("SHOW COLUMNS FROM `stock_concern` LIKE 'priority'")
+            self.concern_priority_column = cur.fetchone() is not None
+            if not self.concern_priority_column:
+                logger.warning(
+                    "⚠️ stock_concern 缺少 priority 列，按默认优先级 0 处理；"
+                    "请执行 data/migrations/20261017_add_priority_to_stock_concern.sql"
+                )
+        return self.concern_priority_column
+
+    def _history_time(self, cur, alias=None) -> str:
+        """`stock_price_history` 排序与取最新时间使用的列（首次调用时检测并缓存 effective_time 生成列）
+
+        未执行 20261019 迁移时只记录一次警告，改用 `COALESCE(stock_time, fetch_date)`（无法使用复合索引，结果相同）。
+        """
+        if self.history_effective_time_column is None:
+            cur.execute("SHOW COLUMNS FROM `stock_price_history` LIKE 'effective_time'")
+            self.history_effective_time_column = cur.fetchone() is not None
+            if not self.history_effective_time_column:
+                logger.warning(
+                    "⚠️ stock_price_history 缺少 effective_time 列，按 COALESCE(stock_time, fetch_date) 排序；"
+                    "请执行 data/migrations/20261019_add_effective_time_to_stock_price_history.sql"
+                )
+        prefix = f"{alias}." if alias else ""
+        if self.history_effective_time_column:
+            return f"{prefix}effective_time"
+        return f"COALESCE({prefix}stock_time, {prefix}fetch_date)"
+
     def query_concern_stocks(self):
         """查询关注的股票信息（固定表 `stock_concern`），返回列表（字段与表结构保持一致）"""
         try:
-            query_sql = "SELECT id, stockname, stock_code, stock_url, price_low, price_high FROM `stock_concern` WHERE state = 1"
-
             conn = self.pool.connection()
             cur = conn.cursor()
+            if self._concern_has_priority(cur):
+                query_sql = "SELECT id, stockname, stock_code, stock_url, price_low, price_high, priority FROM `stock_concern` WHERE state = 1"
+            else:
+                query_sql = "SELECT id, stockname, stock_code, stock_url, price_low, price_high, 0 AS priority FROM `stock_concern` WHERE state = 1"
             cur.execute(query_sql)
             results = cur.fetchall()
             cur.close()
@@ -77,13 +149,16 @@ class MySQLStorage:
             logger.error(f"❌ 查询关注的股票信息失败: {e}")
             return []
 
-    def add_concern_stock(self, stockname, stock_code, stock_url, price_low=None, price_high=None):
+    def add_concern_stock(self, stockname, stock_code, stock_url, price_low=None, price_high=None, priority=0):
         try:
-            insert_sql = "INSERT INTO `stock_concern` (stockname, stock_code, stock_url, price_low, price_high) VALUES (%s, %s, %s, %s, %s)"
-
             conn = self.pool.connection()
             cur = conn.cursor()
-            cur.execute(insert_sql, (stockname, stock_code, stock_url, price_low, price_high))
+            if self._concern_has_priority(cur):
+                insert_sql = "INSERT INTO `stock_concern` (stockname, stock_code, stock_url, price_low, price_high, priority) VALUES (%s, %s, %s, %s, %s, %s)"
+                cur.execute(insert_sql, (stockname, stock_code, stock_url, price_low, price_high, int(priority or 0)))
+            else:
+                insert_sql = "INSERT INTO `stock_concern` (stockname, stock_code, stock_url, price_low, price_high) VALUES (%s, %s, %s, %s, %s)"
+                cur.execute(insert_sql, (stockname, stock_code, stock_url, price_low, price_high))
             conn.commit()
             cur.close()
             conn.close()
@@ -98,7 +173,7 @@ class MySQLStorage:
             logger.error(f"❌ 添加关注股票失败: {e}")
             return False
 
-    def update_concern_stock(self, id, stockname=None, stock_code=None, stock_url=None, price_low=None, price_high=None, state=None):
+    def update_concern_stock(self, id, stockname=None, stock_code=None, stock_url=None, price_low=None, price_high=None, state=None, priority=None):
         try:
             updates = []
             params = []
@@ -122,16 +197,21 @@ class MySQLStorage:
                 updates.append("state = %s")
                 params.append(state)
 
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            if priority is not None and self._concern_has_priority(cur):
+                updates.append("priority = %s")
+                params.append(int(priority))
+
             if not updates:
                 logger.warning("❌ 未提供任何更新字段")
+                cur.close()
+                conn.close()
                 return False
 
             params.append(id)
 
             update_sql = "UPDATE `stock_concern` SET " + ", ".join(updates) + " WHERE id = %s"
-
-            conn = self.pool.connection()
-            cur = conn.cursor()
             cur.execute(update_sql, params)
             conn.commit()
             cur.close()
@@ -183,9 +263,13 @@ class MySQLStorage:
                 "VALUES (%s, %s, %s, %s, %s, %s, %s)"
             )
 
+            params = (stock_code, stock_date, stock_time, stock_price, pe_ttm, pb, roe)
+
             conn = self.pool.connection()
             cur = conn.cursor()
-            cur.execute(insert_sql, (stock_code, stock_date, stock_time, stock_price, pe_ttm, pb, roe))
+            cur.execute(insert_sql, params)
+            if self.latest_price_table:
+                cur.execute(_LATEST_UPSERT_SQL, params)
             conn.commit()
             cur.close()
             conn.close()
@@ -202,17 +286,65 @@ class MySQLStorage:
             logger.error(f"❌ 保存股票价格历史失败: {e}")
             return False
 
+    def save_stock_price_history_many(self, rows):
+        """在一个事务中批量保存股票价格历史（一轮抓取只提交一次）。
+
+        参数：
+            rows (list[dict]): 每项包含 stock_code、stock_date、stock_price，可选 stock_time、pe_ttm、pb、roe
+
+        与 `uk_stock_code_date` 重复的记录按幂等写入处理：更新价格与指标，而不是报错。
+        全部写入成功返回 True，失败时整批回滚并返回 False。
+        """
+        if not rows:
+            return True
+        try:
+            insert_sql = (
+                "INSERT INTO `stock_price_history` "
+                "(stock_code, stock_date, stock_time, stock_price, pe_ttm, pb, roe) "
+                "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+                "ON DUPLICATE KEY UPDATE stock_price = VALUES(stock_price), pe_ttm = VALUES(pe_ttm), "
+                "pb = VALUES(pb), roe = VALUES(roe)"
+            )
+            params = [
+                (
+                    row['stock_code'], row['stock_date'], row.get('stock_time'), row['stock_price'],
+                    row.get('pe_ttm'), row.get('pb'), row.get('roe'),
+                )
+                for row in rows
+            ]
+
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            # pymysql 会把 executemany 的 INSERT ... VALUES 合并为一条多行 INSERT
+            cur.executemany(insert_sql, params)
+            if self.latest_price_table:
+                cur.executemany(_LATEST_UPSERT_SQL, params)
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            logger.info(f"✅ 成功批量保存股票价格历史: {len(params)} 条")
+            return True
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            logger.error(f"❌ 批量保存股票价格历史失败: {e}")
+            return False
+
     def get_latest_price(self, stock_code):
         """获取指定股票的最新价格记录，返回 dict 或 None"""
+        if self.latest_price_table:
+            return self.get_latest_prices([stock_code]).get(stock_code)
         try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
             query_sql = (
                 "SELECT stock_price, stock_time, stock_date, fetch_date, pe_ttm, pb, roe "
                 "FROM `stock_price_history` WHERE stock_code = %s "
-                "ORDER BY COALESCE(stock_time, fetch_date) DESC LIMIT 1"
+                f"ORDER BY {self._history_time(cur)} DESC LIMIT 1"
             )
-
-            conn = self.pool.connection()
-            cur = conn.cursor()
             cur.execute(query_sql, (stock_code,))
             row = cur.fetchone()
             cur.close()
@@ -223,6 +355,182 @@ class MySQLStorage:
             logger.error(f"❌ 获取最新股票价格失败: {e}")
             return None
 
+    def get_latest_prices(self, stock_codes):
+        """一次查询获取多只股票各自的最新价格记录，返回 {stock_code: dict}（没有记录的股票不在结果中）
+
+        启用 `stock_latest_price` 时按主键直接读取；否则先按股票分组取最新时间，再关联回明细行，
+        避免逐只股票排序扫描。
+        """
+        codes = list(dict.fromkeys(code for code in stock_codes if code))
+        if not codes:
+            return {}
+        try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            placeholders = ", ".join(["%s"] * len(codes))
+            if self.latest_price_table:
+                query_sql = (
+                    "SELECT stock_code, stock_price, stock_time, stock_date, fetch_date, pe_ttm, pb, roe "
+                    f"FROM `stock_latest_price` WHERE stock_code IN ({placeholders})"
+                )
+            else:
+                query_sql = (
+                    "SELECT h.id, h.stock_code, h.stock_price, h.stock_time, h.stock_date, h.fetch_date, h.pe_ttm, h.pb, h.roe "
+                    "FROM `stock_price_history` h "
+                    f"JOIN (SELECT stock_code, MAX({self._history_time(cur)}) AS latest "
+                    f"FROM `stock_price_history` WHERE stock_code IN ({placeholders}) GROUP BY stock_code) m "
+                    f"ON h.stock_code = m.stock_code AND {self._history_time(cur, 'h')} = m.latest "
+                    "ORDER BY h.id"
+                )
+            cur.execute(query_sql, codes)
+            rows = cur.fetchall()
+            cur.close()
+            conn.close()
+
+            # 同一时间有多条记录时保留最后写入的一条
+            return {row['stock_code']: row for row in rows}
+        except Exception as e:
+            logger.error(f"❌ 批量获取最新股票价格失败: {e}")
+            return {}
+
+    def backfill_latest_prices(self):
+        """从 `stock_price_history` 回填 `stock_latest_price`（每只股票取最新一条），返回受影响的行数"""
+        try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            backfill_sql = (
+                "INSERT INTO `stock_latest_price` "
+                "(stock_code, stock_date, stock_time, stock_price, pe_ttm, pb, roe) "
+                "SELECT h.stock_code, h.stock_date, h.stock_time, h.stock_price, h.pe_ttm, h.pb, h.roe "
+                "FROM `stock_price_history` h "
+                f"JOIN (SELECT stock_code, MAX({self._history_time(cur)}) AS latest "
+                "FROM `stock_price_history` GROUP BY stock_code) m "
+                f"ON h.stock_code = m.stock_code AND {self._history_time(cur, 'h')} = m.latest "
+                "ORDER BY h.id "
+            ) + _LATEST_ON_DUPLICATE
+            affected = cur.execute(backfill_sql)
+            conn.commit()
+            cur.close()
+            conn.close()
+
+            logger.info(f"✅ 成功回填最新价格表: {affected} 行")
+            return affected
+        except Exception as e:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            logger.error(f"❌ 回填最新价格表失败: {e}")
+            return None
+
+    def get_recent_prices(self, stock_code, limit=20):
+        """获取指定股票最近 `limit` 条价格记录（按时间从新到旧），返回列表"""
+        try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            query_sql = (
+                "SELECT stock_price, stock_time, fetch_date "
+                "FROM `stock_price_history` WHERE stock_code = %s "
+                f"ORDER BY {self._history_time(cur)} DESC LIMIT %s"
+            )
+            cur.execute(query_sql, (stock_code, int(limit)))
+            rows = cur.fetchall()
+            cur.close()
+            conn.close()
+
+            return list(rows)
+        except Exception as e:
+            logger.error(f"❌ 获取最近股票价格失败: {e}")
+            return []
+
+    def list_price_history_partitions(self):
+        """列出 `stock_price_history` 的分区 [(名称, 上界描述)]，按顺序；表未分区时返回空列表"""
+        try:
+            query_sql = (
+                "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'stock_price_history' AND PARTITION_NAME IS NOT NULL "
+                "ORDER BY PARTITION_ORDINAL_POSITION"
+            )
+
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            cur.execute(query_sql)
+            rows = cur.fetchall()
+            cur.close()
+            conn.close()
+
+            return [(row['PARTITION_NAME'], row['PARTITION_DESCRIPTION']) for row in rows]
+        except Exception as e:
+            logger.error(f"❌ 查询价格历史分区失败: {e}")
+            return []
+
+    def _alter_price_history(self, statements, action):
+        """依次执行分区维护 DDL（DDL 隐式提交，无法回滚），全部成功返回 True"""
+        try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            for statement in statements:
+                cur.execute(statement)
+            cur.close()
+            conn.close()
+
+            logger.info(f"✅ 成功{action}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ {action}失败: {e}")
+            return False
+
+    def add_price_history_partitions(self, months):
+        """从 `pmax` 中拆出按月分区（months 为每个分区所在月份的第一天，需从现有最大上界起连续）"""
+        if not months:
+            return True
+        partitions = ", ".join(
+            f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1).isoformat()}')"
+            for month in months
+        )
+        statement = (
+            "ALTER TABLE `stock_price_history` REORGANIZE PARTITION pmax INTO "
+            f"({partitions}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+        )
+        return self._alter_price_history([statement], f"新建价格历史分区 {[partition_name(m) for m in months]}")
+
+    def drop_price_history_partitions(self, names):
+        """直接删除价格历史分区（连同其中的数据）"""
+        if not names:
+            return True
+        statement = "ALTER TABLE `stock_price_history` DROP PARTITION " + ", ".join(names)
+        return self._alter_price_history([statement], f"删除价格历史分区 {list(names)}")
+
+    def archive_price_history_partition(self, name):
+        """把一个价格历史分区交换到归档表 `stock_price_history_<分区名>` 后删除该分区（只修改元数据）
+
+        归档表已存在且有数据时（上次交换成功但删除分区失败）不再交换，直接删除已清空的分区。
+        """
+        archive_name = f"stock_price_history_{name}"
+        archive = f"`{archive_name}`"
+        try:
+            conn = self.pool.connection()
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT 1 FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+                (archive_name,),
+            )
+            if not cur.fetchone():
+                cur.execute(f"CREATE TABLE {archive} LIKE `stock_price_history`")
+                cur.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+            cur.execute(f"SELECT 1 FROM {archive} LIMIT 1")
+            if not cur.fetchone():
+                cur.execute(f"ALTER TABLE `stock_price_history` EXCHANGE PARTITION {name} WITH TABLE {archive}")
+            cur.execute(f"ALTER TABLE `stock_price_history` DROP PARTITION {name}")
+            cur.close()
+            conn.close()
+
+            logger.info(f"✅ 成功归档价格历史分区 {name} 到 {archive}")
+            return True
+        except Exception as e:
+            logger.error(f"❌ 归档价格历史分区 {name} 失败: {e}")
+            return False
+
     def get_alert_state(self, concern_id, alert_type):
         """获取指定关注项（concern_id）和告警类型（'low'/'high'）的当前状态"""
         try:
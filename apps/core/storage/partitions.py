@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+价格历史分区维护模块
+
+`stock_price_history` 按 `stock_date` 做按月的 RANGE COLUMNS 分区（见
+data/migrations/20261020_partition_stock_price_history.sql），末尾为 `VALUES LESS THAN (MAXVALUE)` 的 `pmax`。
+维护任务：
+- 预建分区：从 `pmax` 中拆出未来 `months_ahead` 个月的分区（`pmax` 中没有数据，拆分只改元数据）；
+- 过期清理：上界不晚于保留期起点的分区整体删除（'drop'），或先与同结构的归档表交换再删除（'archive'），
+  两种方式都只修改元数据，不需要大范围 DELETE 扫描。
+"""
+import datetime
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+from config.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+RETENTION_MODES = ('drop', 'archive')
+
+
+def month_start(value: datetime.date) -> datetime.date:
+    return value.replace(day=1)
+
+
+def add_months(value: datetime.date, months: int) -> datetime.date:
+    """value 所在月份的第一天加上 months 个月"""
+    index = value.year * 12 + value.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime.date) -> str:
+    """按月分区的名称，例如 2026-01 -> 'p202601'"""
+    return f"p{month.year:04d}{month.month:02d}"
+
+
+def parse_bound(description: Optional[str]) -> Optional[datetime.date]:
+    """解析 information_schema 中的分区上界（形如 "'2026-02-01'"），MAXVALUE 返回 None"""
+    text = (description or '').strip().strip("'")
+    if not text or text.upper() == 'MAXVALUE':
+        return None
+    return datetime.date.fromisoformat(text)
+
+
+def plan_partitions(partitions: List[Tuple[str, Optional[str]]], today: datetime.date,
+                    retention_months: int, months_ahead: int) -> Tuple[List[datetime.date], List[str]]:
+    """根据现有分区 [(名称, 上界描述)] 计算需要预建的月份与需要过期的分区名称
+
+    - 预建：保证覆盖到 today 所在月份之后 `months_ahead` 个月（含）；
+    - 过期：上界不晚于 today 所在月份往前 `retention_months` 个月的分区（retention_months <= 0 时不过期）。
+    """
+    bounds = [(name, parse_bound(description)) for name, description in partitions]
+    bounded = [bound for _, bound in bounds if bound is not None]
+
+    target = add_months(month_start(today), max(int(months_ahead), 0) + 1)
+    month = max(bounded) if bounded else month_start(today)
+    to_add = []
+    while month < target:
+        to_add.append(month)
+        month = add_months(month, 1)
+
+    to_expire = []
+    if retention_months > 0:
+        cutoff = add_months(month_start(today), -int(retention_months))
+        to_expire = [name for name, bound in bounds if bound is not None and bound <= cutoff]
+    return to_add, to_expire
+
+
+def run_price_history_retention(storage, today: Optional[datetime.date] = None, retention_months: Optional[int] = None,
+                                mode: Optional[str] = None, months_ahead: Optional[int] = None) -> Optional[dict]:
+    """预建未来分区并清理过期分区，返回 {'added': [...], 'expired': [...], 'mode': ...}；表未分区或失败时返回 None"""
+    today = today or datetime.date.today()
+    retention_months = settings.PRICE_HISTORY_RETENTION_MONTHS if retention_months is None else retention_months
+    months_ahead = settings.PRICE_HISTORY_PARTITIONS_AHEAD if months_ahead is None else months_ahead
+    mode = (mode or settings.PRICE_HISTORY_RETENTION_MODE).lower()
+    if mode not in RETENTION_MODES:
+        logger.error(f"❌ 未知的价格历史保留方式: {mode}（可选 {', '.join(RETENTION_MODES)}）")
+        return None
+
+    partitions = storage.list_price_history_partitions()
+    if not partitions:
+        logger.error("❌ stock_price_history 未分区，请先执行 data/migrations/20261020_partition_stock_price_history.sql")
+        return None
+
+    to_add, to_expire = plan_partitions(partitions, today, retention_months, months_ahead)
+    if to_add and not storage.add_price_history_partitions(to_add):
+        return None
+
+    expired = []
+    for name in to_expire:
+        if mode == 'archive':
+            done = storage.archive_price_history_partition(name)
+        else:
+            done = storage.drop_price_history_partitions([name])
+        if not done:
+            break
+        expired.append(name)
+
+    summary = {'added': [partition_name(month) for month in to_add], 'expired': expired, 'mode': mode}
+    logger.info(f"价格历史分区维护完成: 新建 {summary['added']}，{mode} {expired}")
+    return summary
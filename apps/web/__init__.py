@@ -13,6 +13,16 @@ from config.logging_config import setup_logging
 setup_logging()
 logger = logging.getLogger(__name__)
 
+def _attach_latest_prices(storage, stocks):
+    """为关注列表附加最新价格（一次查询，启用 `stock_latest_price` 时按主键读取）"""
+    latest_prices = storage.get_latest_prices([stock.get('stock_code') for stock in stocks])
+    for stock in stocks:
+        latest = latest_prices.get(stock.get('stock_code')) or {}
+        stock['latest_price'] = latest.get('stock_price')
+        stock['latest_time'] = latest.get('stock_time')
+    return stocks
+
+
 def create_app():
     """创建Flask应用实例"""
     # 设置模板和静态文件路径
@@ -32,7 +42,7 @@ def create_app():
         
         try:
             if storage.connect():
-                stocks = storage.query_concern_stocks()
+                stocks = _attach_latest_prices(storage, storage.query_concern_stocks())
         except Exception as e:
             logger.error(f"❌ 查询股票信息失败: {e}")
             flash(f"查询股票信息失败: {e}", 'error')
@@ -51,6 +61,7 @@ def create_app():
         stock_url = request.form.get('stock_url', '').strip()
         price_low = request.form.get('price_low', '').strip()
         price_high = request.form.get('price_high', '').strip()
+        priority = request.form.get('priority', '').strip()
         
         # 验证必填字段
         if not stock_name or not stock_code:
@@ -64,6 +75,12 @@ def create_app():
         except ValueError:
             flash('价格提醒值必须为数字', 'error')
             return redirect(url_for('index'))
+
+        try:
+            priority_val = int(priority) if priority else 0
+        except ValueError:
+            flash('抓取优先级必须为整数', 'error')
+            return redirect(url_for('index'))
         
         # 添加到数据库
         storage = get_db_storage()
@@ -75,7 +92,8 @@ def create_app():
                     stock_code=stock_code,
                     stock_url=stock_url,
                     price_low=price_low_val,
-                    price_high=price_high_val
+                    price_high=price_high_val,
+                    priority=priority_val
                 )
                 
                 if success:
@@ -93,6 +111,44 @@ def create_app():
         
         return redirect(url_for('index'))
 
+    @app.route('/update_stock/<int:stock_id>', methods=['POST'])
+    def update_stock(stock_id):
+        """处理修改股票请求（抓取优先级与价格提醒值，留空的字段不修改）"""
+        price_low = request.form.get('price_low', '').strip()
+        price_high = request.form.get('price_high', '').strip()
+        priority = request.form.get('priority', '').strip()
+
+        try:
+            price_low_val = float(price_low) if price_low else None
+            price_high_val = float(price_high) if price_high else None
+            priority_val = int(priority) if priority else None
+        except ValueError:
+            flash('价格提醒值必须为数字，抓取优先级必须为整数', 'error')
+            return redirect(url_for('index'))
+
+        storage = get_db_storage()
+
+        try:
+            if storage.connect():
+                success = storage.update_concern_stock(
+                    id=stock_id,
+                    price_low=price_low_val,
+                    price_high=price_high_val,
+                    priority=priority_val
+                )
+
+                if success:
+                    flash('修改成功', 'success')
+                else:
+                    flash('修改股票失败', 'error')
+            else:
+                flash('数据库连接失败', 'error')
+        except Exception as e:
+            logger.error(f"❌ 修改股票失败: {e}")
+            flash(f'修改股票失败: {e}', 'error')
+
+        return redirect(url_for('index'))
+
     @app.route('/delete_stock/<int:stock_id>', methods=['POST'])
     def delete_stock(stock_id):
         """删除股票"""
@@ -123,7 +179,7 @@ def create_app():
         
         try:
             if storage.connect():
-                stocks = storage.query_concern_stocks()
+                stocks = _attach_latest_prices(storage, storage.query_concern_stocks())
         except Exception as e:
             logger.error(f"❌ 查询股票信息失败: {e}")
         finally:
@@ -39,7 +39,8 @@ class DatabaseManager:
                 database=settings.MYSQL_DB,
                 mincached=settings.MYSQL_POOL_MINCACHED,
                 maxcached=settings.MYSQL_POOL_MAXCACHED,
-                blocking=settings.MYSQL_POOL_BLOCKING
+                blocking=settings.MYSQL_POOL_BLOCKING,
+                latest_price_table=settings.MYSQL_LATEST_PRICE_TABLE,
             )
 
         return self._storage
@@ -37,12 +37,125 @@ class Settings:
     MYSQL_POOL_MINCACHED: int = int(os.getenv("MYSQL_POOL_MINCACHED", "1"))
     MYSQL_POOL_MAXCACHED: int = int(os.getenv("MYSQL_POOL_MAXCACHED", "5"))
     MYSQL_POOL_BLOCKING: bool = os.getenv("MYSQL_POOL_BLOCKING", "true").lower() == "true"
+    # 价格历史保留策略（`stock_price_history` 按月分区）：保留最近多少个月（0 表示永久保留），
+    # 过期分区的处理方式 'archive'（交换到 stock_price_history_pYYYYMM 归档表）或 'drop'（直接删除），预建未来多少个月的分区
+    PRICE_HISTORY_RETENTION_MONTHS: int = int(os.getenv("PRICE_HISTORY_RETENTION_MONTHS", "24"))
+    PRICE_HISTORY_RETENTION_MODE: str = os.getenv("PRICE_HISTORY_RETENTION_MODE", "archive").lower()
+    PRICE_HISTORY_PARTITIONS_AHEAD: int = int(os.getenv("PRICE_HISTORY_PARTITIONS_AHEAD", "3"))
+    # 抓取任务每攒满多少条行情批量写入一次；最新价格距阈值的相对距离不超过多少（或设置了优先级）时立即写入
+    PRICE_HISTORY_FLUSH_SIZE: int = int(os.getenv("PRICE_HISTORY_FLUSH_SIZE", "20"))
+    PRICE_HISTORY_URGENT_DISTANCE: float = float(os.getenv("PRICE_HISTORY_URGENT_DISTANCE", "0.02"))
+    # 维护并读取 `stock_latest_price` 最新价格表（默认关闭，先执行 data/migrations/20261018_add_stock_latest_price.sql 再开启）
+    MYSQL_LATEST_PRICE_TABLE: bool = os.getenv("MYSQL_LATEST_PRICE_TABLE", "false").lower() == "true"
 
     # 网络请求
     REQUEST_TIMEOUT: float = float(os.getenv("REQUEST_TIMEOUT", "10"))
 
-    # 数据源: 'gushitong' 或 'yfinance'
-    DEFAULT_SOURCE: str = os.getenv("DEFAULT_SOURCE", "gushitong")
+    # 数据源: 'http'（HTTP 接口优先，失败回退浏览器）、'gushitong'（仅浏览器）、'yfinance' 或 'replay'（回放录制的页面）
+    DEFAULT_SOURCE: str = os.getenv("DEFAULT_SOURCE", "http")
+
+    # HTTP 行情接口（'http' 数据源使用），{market} 为 ab/hk/us，{code} 为股票代码
+    HTTP_QUOTE_URL: str = os.getenv(
+        "HTTP_QUOTE_URL",
+        "https://finance.pae.baidu.com/vapi/v1/getquotation?srcid=5353&pointType=string&group=quotation_minute_{market}"
+        "&query={code}&code={code}&market_type={market}&newFormat=1&finClientType=pc",
+    )
+    # HTTP 连接池大小（requests.Session 复用的连接数）
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "10"))
+    # yfinance 数据源是否额外获取 PE/PB（需要逐只请求，较慢）
+    YFINANCE_FUNDAMENTALS: bool = os.getenv("YFINANCE_FUNDAMENTALS", "false").lower() == "true"
+
+    # 每个数据源的限流（次/秒，未列出或 <=0 表示不限流），形如 "gushitong=1,http=5,yfinance=0.5"
+    SOURCE_RATE_LIMITS: str = os.getenv("SOURCE_RATE_LIMITS", "gushitong=1,http=5,yfinance=0.5")
+    # 令牌桶容量（允许的突发请求数）
+    SOURCE_RATE_BURST: int = int(os.getenv("SOURCE_RATE_BURST", "2"))
+    # 熔断：连续失败多少次后暂停该数据源（<=0 表示不熔断），暂停多少秒后放行探测请求，半开时同时放行的探测数
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT: float = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "60"))
+    CIRCUIT_HALF_OPEN_MAX: int = int(os.getenv("CIRCUIT_HALF_OPEN_MAX", "1"))
+
+    # 跨进程行情缓存（sqlite），TTL 内重复查询同一只股票直接返回缓存
+    QUOTE_CACHE_ENABLED: bool = os.getenv("QUOTE_CACHE_ENABLED", "true").lower() == "true"
+    QUOTE_CACHE_TTL: float = float(os.getenv("QUOTE_CACHE_TTL", "30"))
+    QUOTE_CACHE_PATH: str = os.getenv("QUOTE_CACHE_PATH", "~/.cache/stock_project/quote_cache.sqlite3")
+    QUOTE_CACHE_MAX_ENTRIES: int = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "5000"))
+
+    # 录制模式：浏览器抓取的页面片段（交易信息/盘口信息 outerHTML）压缩保存到语料库，供 'replay' 数据源离线回放
+    QUOTE_RECORD_ENABLED: bool = os.getenv("QUOTE_RECORD_ENABLED", "false").lower() == "true"
+    QUOTE_CORPUS_PATH: str = os.getenv("QUOTE_CORPUS_PATH", "~/.cache/stock_project/quote_corpus.sqlite3")
+
+    # WebDriver 池（Selenium 抓取复用浏览器）
+    # 池中最多同时存在的浏览器数量
+    DRIVER_POOL_SIZE: int = int(os.getenv("DRIVER_POOL_SIZE", "2"))
+    # 单个浏览器打开页面数达到该值后回收重建（0 表示不限制）
+    DRIVER_MAX_PAGES: int = int(os.getenv("DRIVER_MAX_PAGES", "50"))
+
+    # 固定使用的本地 chromedriver 路径（为空则通过 webdriver-manager 解析）
+    CHROMEDRIVER_PATH: str = os.getenv("CHROMEDRIVER_PATH", "")
+    # webdriver-manager 解析结果的缓存文件（为空则不缓存到磁盘，仅在进程内缓存）
+    CHROMEDRIVER_CACHE_FILE: str = os.getenv("CHROMEDRIVER_CACHE_FILE", "~/.cache/stock_project/chromedriver_path")
+
+    # Chrome 配置：是否无头运行
+    CHROME_HEADLESS: bool = os.getenv("CHROME_HEADLESS", "true").lower() == "true"
+    # 是否使用精简配置（不加载图片、屏蔽下列资源类型与 URL）
+    CHROME_LEAN_PROFILE: bool = os.getenv("CHROME_LEAN_PROFILE", "true").lower() == "true"
+    # 精简配置下屏蔽的资源类型（逗号分隔）：image, font, stylesheet, media
+    CHROME_BLOCKED_RESOURCES: str = os.getenv("CHROME_BLOCKED_RESOURCES", "image,font,stylesheet,media")
+    # 精简配置下屏蔽的 URL 模式（逗号分隔，支持 * 通配符），默认屏蔽统计与广告脚本
+    CHROME_BLOCKED_URLS: str = os.getenv(
+        "CHROME_BLOCKED_URLS",
+        "*hm.baidu.com*,*hmcdn.baidu.com*,*pos.baidu.com*,*cpro.baidu.com*,*eclick.baidu.com*,"
+        "*google-analytics.com*,*googletagmanager.com*,*doubleclick.net*",
+    )
+
+    # 持久化的浏览器用户目录（为空则每个浏览器使用临时目录）；池内每个浏览器使用其下的 worker-N 子目录
+    CHROME_PROFILE_DIR: str = os.getenv("CHROME_PROFILE_DIR", "")
+    # 每个浏览器的 HTTP 磁盘缓存上限（MB）
+    CHROME_DISK_CACHE_MB: int = int(os.getenv("CHROME_DISK_CACHE_MB", "100"))
+    # 所有持久化用户目录的总大小上限（MB），创建 WebDriver 池前超出则清理
+    CHROME_PROFILE_MAX_MB: int = int(os.getenv("CHROME_PROFILE_MAX_MB", "500"))
+
+    # 浏览器抓取的数据提取方式：'js'（浏览器内脚本提取，失败回退 HTML 解析）或 'html'（outerHTML + lxml 解析）
+    FETCH_EXTRACT_MODE: str = os.getenv("FETCH_EXTRACT_MODE", "js").lower()
+
+    # 单只股票浏览器抓取的墙钟截止时间（秒，含等待浏览器、启动与页面加载；0 表示不限制）
+    FETCH_STOCK_DEADLINE: float = float(os.getenv("FETCH_STOCK_DEADLINE", "30"))
+
+    # 抓取任务并发数（同时抓取的股票数量，建议不超过 DRIVER_POOL_SIZE）
+    FETCH_CONCURRENCY: int = int(os.getenv("FETCH_CONCURRENCY", "2"))
+    # 抓取子进程数量（>0 时逐只抓取改由独立子进程执行，每个子进程拥有自己的浏览器；0 表示在本进程内用线程抓取）
+    FETCH_WORKER_PROCESSES: int = int(os.getenv("FETCH_WORKER_PROCESSES", "0"))
+    # 子进程（含浏览器进程树）RSS 上限（MB）与处理页面数上限，超过后回收重建（0 表示不限制）
+    FETCH_WORKER_MAX_RSS_MB: float = float(os.getenv("FETCH_WORKER_MAX_RSS_MB", "1024"))
+    FETCH_WORKER_MAX_PAGES: int = int(os.getenv("FETCH_WORKER_MAX_PAGES", "200"))
+    # 单只股票在子进程中的最长等待时间（秒），超过后强制结束并重建子进程（0 表示不限制）
+    FETCH_WORKER_TASK_TIMEOUT: float = float(os.getenv("FETCH_WORKER_TASK_TIMEOUT", "120"))
+    # 'gushitong' 数据源每个浏览器同时加载的标签页数量（大于 1 时启用多标签页批量抓取）
+    FETCH_TABS_PER_BROWSER: int = int(os.getenv("FETCH_TABS_PER_BROWSER", "1"))
+
+    # 只在交易时段抓取：休市（夜间、周末、节假日）的市场跳过，每次收盘后只补抓一次收盘快照
+    FETCH_MARKET_HOURS_ONLY: bool = os.getenv("FETCH_MARKET_HOURS_ONLY", "true").lower() == "true"
+    # 各市场节假日文件（每行 `<市场> <YYYY-MM-DD> [说明]`）
+    TRADING_HOLIDAYS_FILE: str = os.getenv("TRADING_HOLIDAYS_FILE") or str(
+        Path(__file__).resolve().parents[1] / "data" / "trading_holidays.txt"
+    )
+    # 各市场已抓取过的收盘快照记录（sqlite），一次性运行（cron、run_fetch.py）之间共享
+    MARKET_SNAPSHOT_STATE_PATH: str = os.getenv("MARKET_SNAPSHOT_STATE_PATH", "~/.cache/stock_project/market_snapshots.sqlite3")
+
+    # 自适应轮询：按波动率与距阈值远近为每只股票单独安排下一次抓取时间（调度器每 POLL_MIN_INTERVAL 秒检查一次）
+    FETCH_ADAPTIVE_POLLING: bool = os.getenv("FETCH_ADAPTIVE_POLLING", "false").lower() == "true"
+    # 最短 / 最长抓取间隔（秒）
+    POLL_MIN_INTERVAL: float = float(os.getenv("POLL_MIN_INTERVAL", "60"))
+    POLL_MAX_INTERVAL: float = float(os.getenv("POLL_MAX_INTERVAL", "900"))
+    # 计算波动率使用的最近价格条数
+    POLL_VOLATILITY_WINDOW: int = int(os.getenv("POLL_VOLATILITY_WINDOW", "20"))
+
+    # 每轮按优先队列排序抓取：用户优先级（stock_concern.priority）、距阈值远近与距上次抓取的时间
+    FETCH_PRIORITY_ORDER: bool = os.getenv("FETCH_PRIORITY_ORDER", "true").lower() == "true"
+    # 陈旧度尺度（秒）：距上次抓取每过这么久，排序时的阈值距离折减一倍
+    FETCH_STALENESS_SECONDS: float = float(os.getenv("FETCH_STALENESS_SECONDS", "300"))
+    # 跳过未变化的行情：行情时间与该股票最近一次写入的相同时不再写入价格历史
+    SKIP_UNCHANGED_QUOTES: bool = os.getenv("SKIP_UNCHANGED_QUOTES", "true").lower() == "true"
 
     # 企业微信配置
     WECHAT_WORK_CORP_ID: str = os.getenv("WECHAT_WORK_CORP_ID", "")
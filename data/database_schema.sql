@@ -21,6 +21,7 @@ CREATE TABLE `stock_concern` (
   `price_low` decimal(10, 2) DEFAULT NULL COMMENT '价格低于此值提醒',
   `price_high` decimal(10, 2) DEFAULT NULL COMMENT '价格高于此值提醒',
   `state` tinyint(1) DEFAULT 1 COMMENT '状态 1-启用 0-禁用',
+  `priority` int(11) NOT NULL DEFAULT 0 COMMENT '抓取优先级，越大越先抓取',
   `created_at` timestamp DEFAULT CURRENT_TIMESTAMP COMMENT '创建时间',
   `updated_at` timestamp DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
   PRIMARY KEY (`id`),
@@ -42,11 +43,47 @@ CREATE TABLE `stock_price_history` (
   `pb` decimal(10, 2) DEFAULT NULL COMMENT '市净率',
   `roe` decimal(6, 2) DEFAULT NULL COMMENT '净资产收益率（百分比，保留两位）',
   `fetch_date` timestamp DEFAULT CURRENT_TIMESTAMP COMMENT '抓取日期',
-  PRIMARY KEY (`id`),
+  `effective_time` datetime GENERATED ALWAYS AS (COALESCE(`stock_time`, `fetch_date`)) STORED COMMENT '排序用的行情时间（stock_time 缺失时取抓取时间）',
+  PRIMARY KEY (`id`, `stock_date`),
   UNIQUE KEY `uk_stock_code_date` (`stock_code`, `stock_date`, `stock_time`),
-  INDEX `idx_stock_code` (`stock_code`),
+  INDEX `idx_stock_code_effective_time` (`stock_code`, `effective_time`),
   INDEX `idx_stock_date` (`stock_date`)
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票价格历史表';
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票价格历史表'
+-- 按 stock_date 按月分区：未来的分区与过期分区由 `python main.py --price-history-retention` 维护
+PARTITION BY RANGE COLUMNS(`stock_date`) (
+  PARTITION p_before_202601 VALUES LESS THAN ('2026-01-01'),
+  PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+  PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+  PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+  PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+  PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+  PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+  PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+  PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+  PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+  PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+  PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+  PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+  PARTITION p202701 VALUES LESS THAN ('2027-02-01'),
+  PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- 
+-- 最新价格表
+-- 每只股票一行，写入价格历史时在同一事务中更新，读取当前价格按主键直接查询
+-- 
+DROP TABLE IF EXISTS `stock_latest_price`;
+CREATE TABLE `stock_latest_price` (
+  `stock_code` varchar(50) NOT NULL COMMENT '股票代码',
+  `stock_date` date NOT NULL COMMENT '股票日期',
+  `stock_time` datetime DEFAULT NULL COMMENT '股票精确时间（时分秒）',
+  `stock_price` decimal(10, 2) NOT NULL COMMENT '股票价格',
+  `pe_ttm` decimal(10, 2) DEFAULT NULL COMMENT '市盈率(TTM)',
+  `pb` decimal(10, 2) DEFAULT NULL COMMENT '市净率',
+  `roe` decimal(6, 2) DEFAULT NULL COMMENT '净资产收益率（百分比，保留两位）',
+  `fetch_date` timestamp DEFAULT CURRENT_TIMESTAMP COMMENT '最近一次更新时间',
+  PRIMARY KEY (`stock_code`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票最新价格表';
 
 
 -- ===== 告警相关表（由开发者新增，用于存储告警状态与历史）
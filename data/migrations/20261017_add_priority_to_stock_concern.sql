@@ -0,0 +1,5 @@
+-- Add user-assigned fetch priority to stock_concern (higher is fetched first)
+ALTER TABLE `stock_concern`
+  ADD COLUMN `priority` INT(11) NOT NULL DEFAULT 0 COMMENT '抓取优先级，越大越先抓取' AFTER `state`;
+
+-- Note: Run this migration on your DB: mysql -u <user> -p < data/migrations/20261017_add_priority_to_stock_concern.sql
@@ -0,0 +1,15 @@
+-- Add stock_latest_price: one row per stock, upserted in the same transaction as every stock_price_history insert
+CREATE TABLE IF NOT EXISTS `stock_latest_price` (
+  `stock_code` varchar(50) NOT NULL COMMENT '股票代码',
+  `stock_date` date NOT NULL COMMENT '股票日期',
+  `stock_time` datetime DEFAULT NULL COMMENT '股票精确时间（时分秒）',
+  `stock_price` decimal(10, 2) NOT NULL COMMENT '股票价格',
+  `pe_ttm` decimal(10, 2) DEFAULT NULL COMMENT '市盈率(TTM)',
+  `pb` decimal(10, 2) DEFAULT NULL COMMENT '市净率',
+  `roe` decimal(6, 2) DEFAULT NULL COMMENT '净资产收益率（百分比，保留两位）',
+  `fetch_date` timestamp DEFAULT CURRENT_TIMESTAMP COMMENT '最近一次更新时间',
+  PRIMARY KEY (`stock_code`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COMMENT='股票最新价格表';
+
+-- Note: Run this migration on your DB: mysql -u <user> -p < data/migrations/20261018_add_stock_latest_price.sql
+-- Then backfill it from existing history: python main.py --backfill-latest-prices
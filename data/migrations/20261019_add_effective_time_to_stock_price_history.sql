@@ -0,0 +1,11 @@
+-- Add an index-friendly ordering column to stock_price_history.
+-- Latest/range queries order by effective_time instead of COALESCE(stock_time, fetch_date), so they can use
+-- (stock_code, effective_time) without a filesort. idx_stock_code is a prefix of the new index and is dropped.
+ALTER TABLE `stock_price_history`
+  ADD COLUMN `effective_time` DATETIME GENERATED ALWAYS AS (COALESCE(`stock_time`, `fetch_date`)) STORED
+    COMMENT '排序用的行情时间（stock_time 缺失时取抓取时间）' AFTER `fetch_date`,
+  ADD INDEX `idx_stock_code_effective_time` (`stock_code`, `effective_time`),
+  DROP INDEX `idx_stock_code`;
+
+-- Note: Run this migration on your DB: mysql -u <user> -p < data/migrations/20261019_add_effective_time_to_stock_price_history.sql
+-- On large tables the ALTER rebuilds the table; run it outside trading hours.
@@ -0,0 +1,31 @@
+-- Range-partition stock_price_history by stock_date (one partition per month).
+-- MySQL requires every unique key to contain the partitioning column, so the primary key becomes (id, stock_date);
+-- uk_stock_code_date already contains stock_date.
+-- Rows older than 2026-01 land in p_before_202601; pmax (MAXVALUE) must stay last and empty so that future months
+-- can be split off cheaply. Later months are created, and expired months dropped/archived, by:
+--   python main.py --price-history-retention
+ALTER TABLE `stock_price_history`
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (`id`, `stock_date`);
+
+ALTER TABLE `stock_price_history`
+PARTITION BY RANGE COLUMNS(`stock_date`) (
+  PARTITION p_before_202601 VALUES LESS THAN ('2026-01-01'),
+  PARTITION p202601 VALUES LESS THAN ('2026-02-01'),
+  PARTITION p202602 VALUES LESS THAN ('2026-03-01'),
+  PARTITION p202603 VALUES LESS THAN ('2026-04-01'),
+  PARTITION p202604 VALUES LESS THAN ('2026-05-01'),
+  PARTITION p202605 VALUES LESS THAN ('2026-06-01'),
+  PARTITION p202606 VALUES LESS THAN ('2026-07-01'),
+  PARTITION p202607 VALUES LESS THAN ('2026-08-01'),
+  PARTITION p202608 VALUES LESS THAN ('2026-09-01'),
+  PARTITION p202609 VALUES LESS THAN ('2026-10-01'),
+  PARTITION p202610 VALUES LESS THAN ('2026-11-01'),
+  PARTITION p202611 VALUES LESS THAN ('2026-12-01'),
+  PARTITION p202612 VALUES LESS THAN ('2027-01-01'),
+  PARTITION p202701 VALUES LESS THAN ('2027-02-01'),
+  PARTITION pmax VALUES LESS THAN (MAXVALUE)
+);
+
+-- Note: Run this migration on your DB: mysql -u <user> -p < data/migrations/20261020_partition_stock_price_history.sql
+-- The partitioning ALTER copies the table once; run it outside trading hours.
@@ -7,6 +7,9 @@ stock_project 主入口文件
 - --api: 启动API服务
 - --schedule: 启动定时任务
 - --fetch: 获取指定股票数据
+- --clean-browser-profiles: 清理持久化的浏览器用户目录与磁盘缓存
+- --backfill-latest-prices: 从价格历史回填最新价格表
+- --price-history-retention: 预建价格历史分区并清理过期分区
 """
 
 import argparse
@@ -22,7 +25,12 @@ def main():
     parser.add_argument('--web', action='store_true', help='启动Web应用')
     parser.add_argument('--schedule', action='store_true', help='启动定时任务')
     parser.add_argument('--fetch', metavar='CODE', help='获取指定股票数据')
+    parser.add_argument('--no-cache', action='store_true', help='与 --fetch 一起使用，绕过行情缓存强制抓取')
+    parser.add_argument('--quote-cache-stats', action='store_true', help='显示行情缓存命中统计')
     parser.add_argument('--show-config', action='store_true', help='显示当前配置')
+    parser.add_argument('--clean-browser-profiles', action='store_true', help='清理持久化的浏览器用户目录与磁盘缓存')
+    parser.add_argument('--backfill-latest-prices', action='store_true', help='从价格历史回填最新价格表 stock_latest_price')
+    parser.add_argument('--price-history-retention', action='store_true', help='预建价格历史的未来分区，并按保留策略归档或删除过期分区')
     
     args = parser.parse_args()
     
@@ -39,6 +47,39 @@ def main():
         }, ensure_ascii=False, indent=2))
         return
     
+    if args.quote_cache_stats:
+        from apps.core.stock.quote_cache import get_quote_cache
+        import json
+        cache = get_quote_cache()
+        print(json.dumps(cache.stats() if cache else {"enabled": False}, ensure_ascii=False, indent=2))
+        return
+
+    if args.clean_browser_profiles:
+        from apps.core.stock.driver_pool import cleanup_profile_dirs
+        removed = cleanup_profile_dirs()
+        print(f"已清理 {len(removed)} 个浏览器用户目录")
+        return
+
+    if args.backfill_latest_prices:
+        from config.database import get_db_storage
+        affected = get_db_storage().backfill_latest_prices()
+        if affected is None:
+            print("❌ 回填最新价格表失败，请查看日志")
+            sys.exit(1)
+        print(f"已回填最新价格表（受影响 {affected} 行）")
+        return
+
+    if args.price_history_retention:
+        from config.database import get_db_storage
+        from apps.core.storage.partitions import run_price_history_retention
+        import json
+        summary = run_price_history_retention(get_db_storage())
+        if summary is None:
+            print("❌ 价格历史分区维护失败，请查看日志")
+            sys.exit(1)
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+        return
+
     if args.api:
         from apps.api.endpoints import start_api_server
         start_api_server()
@@ -46,9 +87,9 @@ def main():
         from scripts.schedule_task import start_scheduler
         start_scheduler()
     elif args.fetch:
-        from apps.core.stock.fetcher import fetch_stock
+        from apps.core.stock.sources import fetch_quote
         import json
-        result = fetch_stock(args.fetch)
+        result = fetch_quote(args.fetch, use_cache=not args.no_cache)
         print(json.dumps(result, ensure_ascii=False, indent=2))
     elif args.web:
         from apps.web import start_web_app
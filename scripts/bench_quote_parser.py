@@ -0,0 +1,126 @@
+"""
+行情解析微基准：对比原先的解析实现（逐个 strptime 试错、每次编译正则、BeautifulSoup 遍历）
+与 `apps.core.stock.quote_parser` 的快速解析路径，输出每只股票的解析耗时
+用法：python -m scripts.bench_quote_parser [--number 2000] [--corpus ~/.cache/stock_project/quote_corpus.sqlite3]
+
+指定 `--corpus` 时额外针对录制模式保存的真实页面片段逐页对比。
+"""
+import argparse
+import datetime
+import re
+import timeit
+
+from bs4 import BeautifulSoup
+
+from apps.core.stock import quote_parser
+from apps.core.stock.fetcher import PANKOU_SELECTOR, TRADING_SELECTOR
+from apps.core.stock.quote_corpus import QuoteCorpus
+
+TRADING_HTML = (
+    "<div class='trading-info-box'><div class='price'>1688.00</div>"
+    "<div class='time-text'>10-17 15:00:00</div></div>"
+)
+PANKOU_HTML = "<div class='pankou-fold-box'>" + "".join(
+    f"<div class='pankou-item'><div class='key'>{key}</div><div class='value'>{value}</div></div>"
+    for key, value in (
+        ("今开", "1680.00"), ("最高", "1699.99"), ("最低", "1675.10"), ("成交量", "2.35万手"),
+        ("成交额", "39.71亿"), ("换手率", "0.19%"), ("市盈率(TTM)", "23.45"), ("市净率", "8.12"),
+        ("总市值", "2.12万亿"), ("振幅", "1.48%"),
+    )
+) + "</div>"
+TIME_SAMPLES = ["2026-10-17 15:00:00", "10-17 15:00:00", "15:00:00", "14:59"]
+NUMBER_SAMPLES = ["23.45", "8.12", "0.19%", "2.35万手", "1,234.56"]
+
+
+def legacy_extract_number(value):
+    if value is None:
+        return None
+    try:
+        v = value.replace('\u200b', '').strip()
+        cleaned = re.sub(r"[^0-9.%\-]", "", v)
+        if cleaned in ('', '.', '-', '%'):
+            return None
+        return float(cleaned.replace('%', ''))
+    except Exception:
+        return None
+
+
+def legacy_parse_time_string(time_str):
+    today = datetime.datetime.today()
+    for fmt in ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%m-%d %H:%M:%S", "%m-%d %H:%M", "%H:%M:%S", "%H:%M"):
+        try:
+            parsed = datetime.datetime.strptime(time_str, fmt)
+        except ValueError:
+            continue
+        if '%Y' in fmt:
+            return parsed.strftime("%Y-%m-%d %H:%M:%S")
+        if fmt.startswith('%m'):
+            target = datetime.datetime(today.year, parsed.month, parsed.day, parsed.hour, parsed.minute, parsed.second)
+            if target > today.replace(hour=0, minute=0, second=0):
+                target = target.replace(year=today.year - 1)
+            return target.strftime("%Y-%m-%d %H:%M:%S")
+        return datetime.datetime(today.year, today.month, today.day, parsed.hour, parsed.minute, parsed.second).strftime("%Y-%m-%d %H:%M:%S")
+    raise ValueError(f"无法解析时间字符串: {time_str}")
+
+
+def legacy_parse_quote(trading_html=TRADING_HTML, pankou_html=PANKOU_HTML):
+    soup = BeautifulSoup(trading_html or '', 'lxml')
+    price_div = soup.find('div', class_='price')
+    time_div = soup.find('div', class_='time-text')
+    price = price_div.get_text(strip=True) if price_div else None
+    time_text = time_div.get_text(strip=True) if time_div else None
+    pankou = {}
+    for item in BeautifulSoup(pankou_html or '', 'lxml').find_all('div', class_='pankou-item'):
+        key_div = item.find('div', class_='key')
+        value_div = item.find('div', class_='value')
+        if key_div and value_div:
+            pankou[key_div.get_text(strip=True)] = value_div.get_text(strip=True)
+    parsed_time = legacy_parse_time_string(time_text) if time_text else None
+    return price, parsed_time, [legacy_extract_number(v) for v in pankou.values()]
+
+
+def fast_parse_quote(trading_html=TRADING_HTML, pankou_html=PANKOU_HTML):
+    price, time_text = quote_parser.parse_trading_html(trading_html)
+    pankou = quote_parser.parse_pankou_html(pankou_html)
+    parsed_time = quote_parser.parse_time_string(time_text) if time_text else None
+    return price, parsed_time, [quote_parser.extract_number(v) for v in pankou.values()]
+
+
+def _bench(label, func, number):
+    per_call = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"{label:<28}{per_call * 1e6:>10.2f} µs")
+    return per_call
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情解析微基准")
+    parser.add_argument('--number', type=int, default=2000, help='每组重复次数')
+    parser.add_argument('--corpus', help='录制的页面片段语料库（sqlite 文件）')
+    args = parser.parse_args()
+
+    rows = [
+        ("数值提取", lambda: [legacy_extract_number(v) for v in NUMBER_SAMPLES],
+         lambda: [quote_parser.extract_number(v) for v in NUMBER_SAMPLES], args.number),
+        ("时间解析", lambda: [legacy_parse_time_string(t) for t in TIME_SAMPLES],
+         lambda: [quote_parser.parse_time_string(t) for t in TIME_SAMPLES], args.number),
+        ("整只股票（HTML+时间+数值）", legacy_parse_quote, fast_parse_quote, args.number),
+    ]
+    if args.corpus:
+        pages = [(f.get(TRADING_SELECTOR), f.get(PANKOU_SELECTOR)) for _, f in QuoteCorpus(args.corpus).iter_fragments()]
+        print(f"语料库页面数: {len(pages)}")
+        if pages:
+            # 每次调用解析全部页面，总重复次数与其他组大致相同
+            rows.append((f"语料库（每次 {len(pages)} 页）",
+                         lambda: [legacy_parse_quote(*page) for page in pages],
+                         lambda: [fast_parse_quote(*page) for page in pages],
+                         max(1, args.number // len(pages))))
+
+    for label, legacy, fast, number in rows:
+        print(f"== {label}")
+        before = _bench("原实现", legacy, number)
+        after = _bench("quote_parser", fast, number)
+        print(f"{'加速比':<28}{before / after:>10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -23,9 +23,11 @@ def run_alerts():
         return
 
     alert_manager = AlertManager(storage)
+    # 一次查询取得所有关注股票的最新价格
+    latest_prices = storage.get_latest_prices([stock.get('stock_code') for stock in stocks])
     for stock in stocks:
         stock_code = stock.get('stock_code')
-        latest = storage.get_latest_price(stock_code)
+        latest = latest_prices.get(stock_code)
         if not latest or 'stock_price' not in latest:
             logger.warning(f"未找到 {stock_code} 的最新价格，跳过")
             continue
@@ -6,18 +6,293 @@ import schedule
 import time
 import datetime
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from config.settings import settings
 from config.logging_config import setup_logging
 from config.database import get_db_storage, init_database
-from apps.core.stock.fetcher import fetch_stock
+from apps.core.stock.sources import fetch_quote, fetch_quotes, get_source, split_stock_path_code
+from apps.core.stock.trading_calendar import get_session_gate
+from apps.core.stock.polling import get_polling_planner, threshold_distance
+from apps.core.stock.fetch_queue import get_fetch_queue
+from apps.core.stock.last_quotes import get_last_quote_book
+from apps.core.stock.driver_pool import shutdown_driver_pool
+from apps.core.stock.watchdog import FetchDeadlineExceeded
+from apps.core.stock.worker_supervisor import get_worker_supervisor, shutdown_worker_supervisor
 
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+class PriceHistoryBatch:
+    """一轮抓取中待写入 `stock_price_history` 的行情，按加入顺序分小批在一个事务中批量写入
+
+    攒满 `flush_size` 条即写入一批；接近或越过阈值（相对距离不超过 `urgent_distance`）
+    或用户设置了优先级的股票加入后立即连同之前待写入的行情一起写入，保证先写入、先告警，
+    进程中途退出时也只丢失尚未写入的一小批。
+    """
+
+    def __init__(self, storage, flush_size=None, urgent_distance=None):
+        self.storage = storage
+        self.flush_size = max(1, int(settings.PRICE_HISTORY_FLUSH_SIZE if flush_size is None else flush_size))
+        self.urgent_distance = float(
+            settings.PRICE_HISTORY_URGENT_DISTANCE if urgent_distance is None else urgent_distance
+        )
+        self.saved = 0
+        self.failed = 0
+        self.failed_stocks = []
+        self._items = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._items)
+
+    def _is_urgent(self, stock, row):
+        if (stock.get('priority') or 0) > 0:
+            return True
+        distance = threshold_distance(row['stock_price'], stock.get('price_low'), stock.get('price_high'))
+        return distance is not None and distance <= self.urgent_distance
+
+    def add(self, stock, row):
+        """加入一条行情，攒满一批或行情紧急时立即写入"""
+        with self._lock:
+            self._items.append((stock, row))
+            pending = len(self._items)
+        if pending >= self.flush_size or self._is_urgent(stock, row):
+            self.flush()
+
+    def flush(self):
+        """批量写入待写入的行情并更新最近行情与轮询计划，返回本次 (成功条数, 失败条数)"""
+        with self._lock:
+            items, self._items = self._items, []
+        if not items:
+            return 0, 0
+
+        saved = self.storage.save_stock_price_history_many([row for _, row in items])
+        if saved is False:
+            with self._lock:
+                self.failed += len(items)
+                self.failed_stocks.extend(stock for stock, _ in items)
+            return 0, len(items)
+
+        book = get_last_quote_book()
+        for stock, row in items:
+            book.record(row['stock_code'], row['stock_price'], row['stock_time'])
+            if settings.FETCH_ADAPTIVE_POLLING:
+                get_polling_planner().observe(stock, row['stock_price'])
+        with self._lock:
+            self.saved += len(items)
+        return len(items), 0
+
+
+def _fetch_and_save_stock(storage, stock, batch=None):
+    """抓取单只股票并保存价格历史，返回结果状态：'success' / 'failed' / 'timeout' / 'skipped' / 'queued'"""
+    logger.info(f"关注的股票信息: {stock}")
+
+    stock_url = stock.get('stock_url')
+    if not stock_url:
+        logger.warning(f"股票信息中缺少股票地址或代码: {stock}")
+        return 'skipped'
+
+    try:
+        data_price = fetch_quote(stock_url)
+        logger.info(f"股票价格数据: {data_price}")
+    except FetchDeadlineExceeded as e:
+        logger.error(f"⏱️ 获取股票价格超时 {stock_url}: {e}")
+        return 'timeout'
+    except Exception as e:
+        logger.error(f"获取股票价格失败 {stock_url}: {e}")
+        return 'failed'
+
+    return _save_quote(storage, stock, data_price, batch)
+
+
+def _save_quote(storage, stock, data_price, batch=None):
+    """把一条行情保存到价格历史，返回结果状态：'success' / 'failed' / 'unchanged' / 'queued'
+
+    传入 `batch` 时加入本轮的待写入批次（返回 'queued'），写入结果计入 `batch.saved` / `batch.failed`。
+    """
+    stock_code = stock.get('stock_code')
+    stock_url = stock.get('stock_url')
+
+    # 如果未获取到任何数据则跳过
+    if not data_price:
+        logger.warning(f"未获取到价格数据: {stock_url}")
+        return 'failed'
+
+    price = data_price.get('price')
+    time_info = data_price.get('time')
+    pe_val = data_price.get('pe_ttm')
+    pb_val = data_price.get('pb')
+    roe_val = data_price.get('roe')
+
+    if price == 'N/A':
+        logger.warning(f"无法获取股票价格: {stock_code}")
+        return 'failed'
+
+    try:
+        price_numeric = float(price)
+        pe_numeric = float(pe_val) if pe_val is not None else None
+        pb_numeric = float(pb_val) if pb_val is not None else None
+        roe_numeric = float(roe_val) if roe_val is not None else None
+
+        if time_info:
+            if isinstance(time_info, datetime.datetime):
+                stock_datetime_str = time_info.strftime("%Y-%m-%d %H:%M:%S")
+                stock_date = time_info.strftime("%Y-%m-%d")
+            else:
+                stock_datetime_str = str(time_info)
+                if len(stock_datetime_str) >= 10:
+                    stock_date = stock_datetime_str[:10]
+                else:
+                    stock_date = datetime.datetime.now().strftime("%Y-%m-%d")
+        else:
+            current_datetime = datetime.datetime.now()
+            stock_datetime_str = current_datetime.strftime("%Y-%m-%d %H:%M:%S")
+            stock_date = current_datetime.strftime("%Y-%m-%d")
+
+        book = get_last_quote_book()
+        if settings.SKIP_UNCHANGED_QUOTES and time_info and book.is_unchanged(stock_code, stock_datetime_str):
+            # 页面时间没有前进（休市或行情未刷新）：与最近一次写入的是同一条行情，不再重复写入
+            logger.debug(f"行情未变化，跳过写入: {stock_code} {stock_datetime_str}")
+            if settings.FETCH_ADAPTIVE_POLLING:
+                get_polling_planner().reschedule(stock)
+            return 'unchanged'
+
+        row = {
+            'stock_code': stock_code,
+            'stock_date': stock_date,
+            'stock_price': price_numeric,
+            'stock_time': stock_datetime_str,
+            'pe_ttm': pe_numeric,
+            'pb': pb_numeric,
+            'roe': roe_numeric,
+        }
+        if batch is not None:
+            batch.add(stock, row)
+            return 'queued'
+
+        saved = storage.save_stock_price_history(**row)
+        if saved is not False:
+            book.record(stock_code, price_numeric, stock_datetime_str)
+        if settings.FETCH_ADAPTIVE_POLLING:
+            get_polling_planner().observe(stock, price_numeric)
+        return 'success' if saved is not False else 'failed'
+
+    except (TypeError, ValueError):
+        logger.warning(f"股票价格无法转换为数字: {price}")
+        return 'failed'
+
+
+def _fetch_and_save_batch(storage, stocks, source, batch=None):
+    """通过批量数据源一次获取所有股票行情并逐只保存，逐只产出 (股票, 结果状态)"""
+    valid = []
+    for stock in stocks:
+        if stock.get('stock_url'):
+            valid.append(stock)
+        else:
+            logger.warning(f"股票信息中缺少股票地址或代码: {stock}")
+            yield stock, 'skipped'
+
+    try:
+        quotes = fetch_quotes([stock['stock_url'] for stock in valid], source=source)
+    except Exception as e:
+        logger.error(f"批量获取股票价格失败: {e}")
+        quotes = {}
+
+    for stock in valid:
+        data_price = quotes.get(stock['stock_url'])
+        logger.info(f"股票价格数据: {stock.get('stock_code')} {data_price}")
+        try:
+            yield stock, _save_quote(storage, stock, data_price, batch)
+        except Exception as e:
+            logger.error(f"保存股票价格异常 {stock.get('stock_code')}: {e}")
+            yield stock, 'failed'
+
+
+def _fetch_and_save_with_workers(storage, stocks, batch=None):
+    """由抓取子进程逐只抓取、在本进程中逐只保存，逐只产出 (股票, 结果状态)"""
+    valid = []
+    for stock in stocks:
+        if stock.get('stock_url'):
+            valid.append(stock)
+        else:
+            logger.warning(f"股票信息中缺少股票地址或代码: {stock}")
+            yield stock, 'skipped'
+
+    for index, status, data_price in get_worker_supervisor().map([stock['stock_url'] for stock in valid]):
+        stock = valid[index]
+        if status != 'ok':
+            yield stock, status
+            continue
+        logger.info(f"股票价格数据: {stock.get('stock_code')} {data_price}")
+        try:
+            yield stock, _save_quote(storage, stock, data_price, batch)
+        except Exception as e:
+            logger.error(f"保存股票价格异常 {stock.get('stock_code')}: {e}")
+            yield stock, 'failed'
+
+
+def _market_of(stock):
+    stock_url = stock.get('stock_url')
+    return split_stock_path_code(stock_url)[0] if stock_url else None
+
+
+def _split_by_market_session(stocks):
+    """按交易时段拆分关注列表，返回 (本轮需要抓取的股票, 因休市跳过的股票, {本轮抓取收盘快照的市场: 收盘时间})
+
+    每个市场每轮只判断一次：开市时抓取；休市时每次收盘后只放行一次收盘快照。
+    """
+    gate = get_session_gate()
+    decisions = {}
+    snapshots = {}
+    to_fetch, closed = [], []
+    for stock in stocks:
+        market = _market_of(stock)
+        if market is None:
+            to_fetch.append(stock)
+            continue
+        if market not in decisions:
+            decisions[market], close = gate.decide(market)
+            if close is not None:
+                snapshots[market] = close
+        (to_fetch if decisions[market] else closed).append(stock)
+
+    if closed:
+        closed_markets = sorted(market for market, fetch in decisions.items() if not fetch)
+        logger.info(f"休市跳过 {len(closed)} 只股票（市场 {', '.join(closed_markets)}）")
+    return to_fetch, closed, snapshots
+
+
+def _release_failed_snapshots(snapshots, stocks, outcomes):
+    """收盘快照市场中有股票未能写入时撤销该市场的快照记录，下一轮重新抓取"""
+    if not snapshots:
+        return
+    gate = get_session_gate()
+    failed = {
+        _market_of(stock) for stock in stocks
+        if outcomes.get(stock.get('stock_code')) not in ('success', 'unchanged', 'queued')
+    }
+    for market in sorted(failed & set(snapshots)):
+        gate.release(market, snapshots[market])
+
+
 def fetch_task():
     """
     抓取任务：仅负责获取最新价格并保存到 `stock_price_history`，不进行告警或通知。
+
+    按 `settings.FETCH_CONCURRENCY` 并发抓取，单只股票失败不影响其他股票；
+    `settings.FETCH_MARKET_HOURS_ONLY` 开启时跳过休市市场的股票（收盘后仍抓取一次收盘快照，未能写入时下一轮重抓）；
+    `settings.FETCH_ADAPTIVE_POLLING` 开启时只抓取已到各自下一次抓取时间的股票；
+    `settings.FETCH_PRIORITY_ORDER` 开启时按优先队列顺序抓取；
+    `settings.SKIP_UNCHANGED_QUOTES` 开启时跳过与最近一次写入相同的行情（计入 'unchanged'）。
+    本轮行情按 `settings.PRICE_HISTORY_FLUSH_SIZE` 条一批通过 `save_stock_price_history_many` 在一个事务中写入，
+    接近阈值或设置了优先级的股票立即写入；
+    `settings.FETCH_WORKER_PROCESSES` 大于 0 时逐只抓取由受监管的子进程执行（批量数据源除外）。
+    返回本轮汇总：{'total', 'success', 'failed', 'timeout', 'skipped', 'unchanged', 'closed', 'deferred', 'elapsed'}，
+    抓取任务异常时返回 None。
     """
     current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     logger.info(f"抓取任务执行于: {current_time}")
@@ -30,71 +305,91 @@ def fetch_task():
             logger.info(f"关注的股票列表：{stocks}")
     except Exception as e:
         logger.error(f"❌ 抓取任务异常: {e}")
-        return
+        return None
 
-    for stock in stocks:
-        logger.info(f"关注的股票信息: {stock}")
+    started = time.monotonic()
+    summary = {'total': len(stocks), 'success': 0, 'failed': 0, 'timeout': 0, 'skipped': 0, 'unchanged': 0,
+               'closed': 0, 'deferred': 0}
 
-        stock_code = stock.get('stock_code')
-        stock_url = stock.get('stock_url')
-        if not stock_url:
-            logger.warning(f"股票信息中缺少股票地址或代码: {stock}")
-            continue
+    snapshots = {}
+    if settings.FETCH_MARKET_HOURS_ONLY:
+        stocks, closed, snapshots = _split_by_market_session(stocks)
+        summary['closed'] = len(closed)
 
-        try:
-            data_price = fetch_stock(stock_url)
-            logger.info(f"股票价格数据: {data_price}")
-        except Exception as e:
-            logger.error(f"获取股票价格失败 {stock_url}: {e}")
-            continue
+    if settings.FETCH_ADAPTIVE_POLLING:
+        # 抓取收盘快照的市场不受轮询计划限制，否则被推迟的股票当天拿不到收盘价
+        snapshot_stocks = [stock for stock in stocks if _market_of(stock) in snapshots]
+        stocks, deferred = get_polling_planner().split_due(
+            storage, [stock for stock in stocks if _market_of(stock) not in snapshots]
+        )
+        stocks += snapshot_stocks
+        summary['deferred'] = len(deferred)
 
-        # 如果未获取到任何数据则跳过
-        if not data_price:
-            logger.warning(f"未获取到价格数据: {stock_url}")
-            continue
+    if settings.SKIP_UNCHANGED_QUOTES:
+        # 首次遇到的股票从数据库载入最近一次写入的行情，用于判断行情是否变化
+        get_last_quote_book().seed(storage, stocks)
 
-        price = data_price.get('price')
-        time_info = data_price.get('time')
-        pe_val = data_price.get('pe_ttm')
-        pb_val = data_price.get('pb')
-        roe_val = data_price.get('roe')
-
-        if price != 'N/A':
-            try:
-                price_numeric = float(price)
-                pe_numeric = float(pe_val) if pe_val is not None else None
-                pb_numeric = float(pb_val) if pb_val is not None else None
-                roe_numeric = float(roe_val) if roe_val is not None else None
-
-                if time_info:
-                    if isinstance(time_info, datetime.datetime):
-                        stock_datetime_str = time_info.strftime("%Y-%m-%d %H:%M:%S")
-                        stock_date = time_info.strftime("%Y-%m-%d")
-                    else:
-                        stock_datetime_str = str(time_info)
-                        if len(stock_datetime_str) >= 10:
-                            stock_date = stock_datetime_str[:10]
-                        else:
-                            stock_date = datetime.datetime.now().strftime("%Y-%m-%d")
-                else:
-                    current_datetime = datetime.datetime.now()
-                    stock_datetime_str = current_datetime.strftime("%Y-%m-%d %H:%M:%S")
-                    stock_date = current_datetime.strftime("%Y-%m-%d")
-
-                storage.save_stock_price_history(
-                    stock_code=stock_code,
-                    stock_date=stock_date,
-                    stock_price=price_numeric,
-                    stock_time=stock_datetime_str,
-                    pe_ttm=pe_numeric,
-                    pb=pb_numeric,
-                    roe=roe_numeric
-                )
-
-            except ValueError:
-                logger.warning(f"股票价格无法转换为数字: {price}")
+    if settings.FETCH_PRIORITY_ORDER:
+        # 接近阈值、久未抓取与用户优先级高的股票先提交，先写入、先告警
+        stocks = get_fetch_queue().order(storage, stocks)
+
+    # 本轮行情按抓取顺序分小批写入，接近阈值的行情立即写入；加入批次的行情按批次的写入结果计数
+    batch = PriceHistoryBatch(storage)
+
+    outcomes = {}
+
+    def record(stock, status):
+        outcomes[stock.get('stock_code')] = status
+        if status != 'queued':
+            summary[status] += 1
+
+    source = get_source()
+    try:
+        if source.batch:
+            # 支持批量的数据源一次请求刷新一组股票：yfinance 整个关注列表一组，
+            # 多标签页浏览器抓取则按并发数分组，每组占用一个浏览器
+            workers = max(1, min(int(source.batch_workers), len(stocks) or 1))
+            groups = [stocks[i::workers] for i in range(workers)]
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+                futures = [executor.submit(list, _fetch_and_save_batch(storage, group, source, batch)) for group in groups]
+                for future in as_completed(futures):
+                    for stock, status in future.result():
+                        record(stock, status)
+        elif settings.FETCH_WORKER_PROCESSES > 0:
+            # 浏览器在独立的子进程中运行，内存超限或崩溃时由监管者回收重建
+            workers = int(settings.FETCH_WORKER_PROCESSES)
+            for stock, status in _fetch_and_save_with_workers(storage, stocks, batch):
+                record(stock, status)
         else:
-            logger.warning(f"无法获取股票价格: {stock_code}")
+            workers = max(1, min(int(settings.FETCH_CONCURRENCY), len(stocks) or 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch") as executor:
+                futures = {executor.submit(_fetch_and_save_stock, storage, stock, batch): stock for stock in stocks}
+                for future in as_completed(futures):
+                    try:
+                        status = future.result()
+                    except Exception as e:
+                        logger.error(f"抓取股票异常 {futures[future].get('stock_code')}: {e}")
+                        status = 'failed'
+                    record(futures[future], status)
+    except Exception as e:
+        logger.error(f"❌ 抓取任务异常: {e}")
+        return None
+    finally:
+        # 抓取中途出错也要写入已加入批次的行情
+        batch.flush()
+        summary['success'] += batch.saved
+        summary['failed'] += batch.failed
+        for stock in batch.failed_stocks:
+            outcomes[stock.get('stock_code')] = 'failed'
+        # 收盘快照只有在该市场的行情都已写入后才算完成，否则下一轮重新抓取
+        _release_failed_snapshots(snapshots, stocks, outcomes)
+
+    summary['elapsed'] = round(time.monotonic() - started, 2)
+    logger.info(
+        f"抓取任务完成（数据源 {source.name}）: 共 {summary['total']} 只，成功 {summary['success']}，"
+        f"失败 {summary['failed']}，超时 {summary['timeout']}，跳过 {summary['skipped']}，未变化 {summary['unchanged']}，休市 {summary['closed']}，未到期 {summary['deferred']}，耗时 {summary['elapsed']}s（并发 {workers}）"
+    )
+    return summary
 
 
 def alert_task():
@@ -112,13 +407,18 @@ def alert_task():
             logger.info(f"关注的股票列表：{stocks}")
             from apps.core.alerting import AlertManager
             alert_manager = AlertManager(storage)
+            # 一次查询取得所有关注股票的最新价格（同时用于优先队列排序）
+            latest_prices = storage.get_latest_prices([stock.get('stock_code') for stock in stocks])
+            if settings.FETCH_PRIORITY_ORDER:
+                get_last_quote_book().seed(storage, stocks, latest_prices)
+                stocks = get_fetch_queue().order(storage, stocks)
     except Exception as e:
         logger.error(f"❌ 告警任务异常: {e}")
         return
 
     for stock in stocks:
         stock_code = stock.get('stock_code')
-        latest = storage.get_latest_price(stock_code)
+        latest = latest_prices.get(stock_code)
         if not latest or 'stock_price' not in latest:
             logger.warning(f"未找到 {stock_code} 的最新价格，跳过")
             continue
@@ -149,12 +449,29 @@ def start_scheduler():
     # schedule.every().day.at("15:00").do(alert_task)
 
     logger.info("定时任务已启动...")
-    # 立即执行一次抓取任务（独立）
-    fetch_task()
-    # 立即执行一次告警任务（独立）
-    alert_task()
-
-    # 常驻循环（如果需要取消注释以启用）
-    # while True:
-    #     schedule.run_pending()
-    #     time.sleep(1)
\ No newline at end of file
+    try:
+        # 立即执行一次抓取任务（独立）
+        fetch_task()
+        # 立即执行一次告警任务（独立）
+        alert_task()
+
+        # 自适应轮询模式：每 POLL_MIN_INTERVAL 秒检查一次，只抓取已到期的股票
+        if settings.FETCH_ADAPTIVE_POLLING:
+            def poll():
+                fetch_task()
+                alert_task()
+
+            schedule.every(max(1, int(settings.POLL_MIN_INTERVAL))).seconds.do(poll)
+            logger.info(f"自适应轮询已启用：每 {settings.POLL_MIN_INTERVAL}s 检查一次到期股票")
+            while True:
+                schedule.run_pending()
+                time.sleep(1)
+
+        # 常驻循环（如果需要取消注释以启用）
+        # while True:
+        #     schedule.run_pending()
+        #     time.sleep(1)
+    finally:
+        # 退出前关闭抓取子进程与 WebDriver 池中的浏览器
+        shutdown_worker_supervisor()
+        shutdown_driver_pool()
\ No newline at end of file
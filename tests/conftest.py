@@ -0,0 +1,21 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def isolated_quote_cache(tmp_path, monkeypatch):
+    """每个测试使用独立的行情缓存文件，避免测试之间通过缓存互相影响"""
+    from apps.core.stock import quote_cache
+
+    monkeypatch.setattr(quote_cache.settings, 'QUOTE_CACHE_PATH', str(tmp_path / "quote_cache.sqlite3"))
+    monkeypatch.setattr(quote_cache, '_cache', None)
+    yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_market_snapshots(tmp_path, monkeypatch):
+    """每个测试使用独立的收盘快照记录文件"""
+    from apps.core.stock import trading_calendar
+
+    monkeypatch.setattr(trading_calendar.settings, 'MARKET_SNAPSHOT_STATE_PATH', str(tmp_path / "market_snapshots.sqlite3"))
+    monkeypatch.setattr(trading_calendar, '_gate', None)
+    yield
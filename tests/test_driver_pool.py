@@ -0,0 +1,267 @@
+import threading
+from unittest.mock import MagicMock, PropertyMock, patch
+
+import pytest
+
+from apps.core.stock import driver_pool
+from apps.core.stock.driver_pool import DriverPool
+
+
+def make_factory():
+    created = []
+
+    def factory(worker_id):
+        driver = MagicMock()
+        driver.worker_id = worker_id
+        driver.window_handles = ["main"]
+        created.append(driver)
+        return driver
+
+    return factory, created
+
+
+def test_driver_is_reused_between_borrows():
+    factory, created = make_factory()
+    pool = DriverPool(size=1, max_pages=10, driver_factory=factory)
+
+    with pool.driver() as item:
+        item.mark_page()
+    with pool.driver() as item:
+        item.mark_page()
+
+    assert len(created) == 1
+    created[0].quit.assert_not_called()
+
+
+def test_driver_recycled_after_max_pages():
+    factory, created = make_factory()
+    pool = DriverPool(size=1, max_pages=2, driver_factory=factory)
+
+    for _ in range(3):
+        with pool.driver() as item:
+            item.mark_page()
+
+    # 第 2 页后回收，第 3 页使用新 driver
+    assert len(created) == 2
+    created[0].quit.assert_called_once()
+
+
+def test_crashed_driver_is_discarded():
+    factory, created = make_factory()
+    pool = DriverPool(size=1, max_pages=0, driver_factory=factory)
+
+    with pytest.raises(RuntimeError):
+        with pool.driver():
+            raise RuntimeError("chrome crashed")
+
+    with pool.driver():
+        pass
+
+    assert len(created) == 2
+    created[0].quit.assert_called_once()
+
+
+def test_unhealthy_idle_driver_replaced_on_acquire():
+    factory, created = make_factory()
+    pool = DriverPool(size=1, max_pages=0, driver_factory=factory)
+
+    with pool.driver():
+        pass
+    # 模拟浏览器在空闲期间崩溃
+    type(created[0]).window_handles = PropertyMock(side_effect=Exception("gone"))
+
+    with pool.driver():
+        pass
+
+    assert len(created) == 2
+
+
+def test_pool_is_bounded():
+    factory, created = make_factory()
+    pool = DriverPool(size=1, driver_factory=factory)
+
+    item = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+    pool.release(item)
+
+    assert pool.acquire(timeout=0.05) is item
+
+
+def test_concurrent_borrow_never_exceeds_size():
+    factory, created = make_factory()
+    pool = DriverPool(size=2, max_pages=0, driver_factory=factory)
+
+    def worker():
+        for _ in range(5):
+            with pool.driver() as item:
+                item.mark_page()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(created) <= 2
+
+
+def test_shutdown_quits_idle_drivers():
+    factory, created = make_factory()
+    pool = DriverPool(size=2, driver_factory=factory)
+
+    with pool.driver():
+        pass
+    pool.shutdown()
+
+    created[0].quit.assert_called_once()
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+
+def test_lean_profile_options_and_blocked_patterns():
+    with patch.object(driver_pool.settings, 'CHROME_HEADLESS', True), \
+            patch.object(driver_pool.settings, 'CHROME_LEAN_PROFILE', True):
+        options = driver_pool.build_chrome_options()
+
+    assert "--headless=new" in options.arguments
+    assert "--blink-settings=imagesEnabled=false" in options.arguments
+    assert options.experimental_options["prefs"]["profile.managed_default_content_settings.images"] == 2
+
+    patterns = driver_pool.blocked_url_patterns(["font", "stylesheet", "unknown"], ["*hm.baidu.com*"])
+    assert "*.woff*" in patterns and "*.css*" in patterns
+    assert "*hm.baidu.com*" in patterns
+    assert "*.png*" not in patterns
+
+    driver = MagicMock()
+    driver_pool.apply_network_blocking(driver, patterns)
+    driver.execute_cdp_cmd.assert_any_call("Network.setBlockedURLs", {"urls": patterns})
+
+
+def test_default_profile_without_lean_options():
+    with patch.object(driver_pool.settings, 'CHROME_HEADLESS', False), \
+            patch.object(driver_pool.settings, 'CHROME_LEAN_PROFILE', False):
+        options = driver_pool.build_chrome_options()
+
+    assert options.arguments == ["--no-sandbox", "--disable-dev-shm-usage"]
+
+
+def test_each_live_driver_gets_a_distinct_worker_id():
+    factory, created = make_factory()
+    pool = DriverPool(size=2, max_pages=1, driver_factory=factory)
+
+    first = pool.acquire()
+    second = pool.acquire()
+    assert {first.worker_id, second.worker_id} == {0, 1}
+    first.mark_page()
+    second.mark_page()
+    pool.release(first)
+    pool.release(second)
+
+    # 回收后的 worker_id 被新 driver 复用，持久化目录不会无限增加
+    third = pool.acquire()
+    assert third.worker_id in (0, 1)
+    assert len(created) == 3
+
+
+def test_persistent_profile_options(tmp_path):
+    with patch.object(driver_pool.settings, 'CHROME_PROFILE_DIR', str(tmp_path)), \
+            patch.object(driver_pool.settings, 'CHROME_DISK_CACHE_MB', 10):
+        profile_dir = driver_pool.worker_profile_dir(1)
+        options = driver_pool.build_chrome_options(profile_dir)
+
+    assert profile_dir == tmp_path.resolve() / "worker-1"
+    assert f"--user-data-dir={profile_dir}" in options.arguments
+    assert f"--disk-cache-dir={profile_dir / 'cache'}" in options.arguments
+    assert f"--disk-cache-size={10 * 1024 * 1024}" in options.arguments
+
+
+def test_profile_size_cap_and_cleanup(tmp_path):
+    for worker_id, size in ((0, 3), (1, 1)):
+        cache = tmp_path / f"worker-{worker_id}" / "cache"
+        cache.mkdir(parents=True)
+        (cache / "data").write_bytes(b"x" * size * 1024 * 1024)
+
+    with patch.object(driver_pool.settings, 'CHROME_PROFILE_DIR', str(tmp_path)):
+        removed = driver_pool.enforce_profile_size_cap(max_mb=2)
+        assert removed == [tmp_path.resolve() / "worker-0"]
+        assert (tmp_path / "worker-1").exists()
+
+        driver_pool.cleanup_profile_dirs()
+        assert not (tmp_path / "worker-1").exists()
+
+
+def test_profile_dirs_in_use_are_skipped(tmp_path):
+    with patch.object(driver_pool.settings, 'CHROME_PROFILE_DIR', str(tmp_path)):
+        # 另一个进程（例如常驻调度器）已占用 worker-0
+        held = driver_pool.lock_profile_dir(0)
+        assert held.path == tmp_path.resolve() / "worker-0"
+
+        second = driver_pool.lock_profile_dir(0)
+        assert second.path == tmp_path.resolve() / "worker-1"
+
+        # 清理时跳过正在使用的目录
+        assert driver_pool.cleanup_profile_dirs() == []
+        second.release()
+        assert driver_pool.cleanup_profile_dirs() == [tmp_path.resolve() / "worker-1"]
+        assert (tmp_path / "worker-0").exists()
+
+        held.release()
+        assert driver_pool.lock_profile_dir(0).path == tmp_path.resolve() / "worker-0"
+
+
+def test_pool_releases_profile_lock_when_driver_quits(tmp_path):
+    def factory(worker_id):
+        driver = MagicMock()
+        driver.profile_lock = driver_pool.lock_profile_dir(worker_id)
+        return driver
+
+    with patch.object(driver_pool.settings, 'CHROME_PROFILE_DIR', str(tmp_path)):
+        pool = DriverPool(size=1, max_pages=1, driver_factory=factory)
+        with pool.driver() as item:
+            item.mark_page()
+            assert driver_pool.cleanup_profile_dirs() == []
+        # 达到页面上限后归还即退出，目录锁随之释放
+        assert driver_pool.cleanup_profile_dirs() == [tmp_path.resolve() / "worker-0"]
+
+
+@pytest.fixture
+def reset_chromedriver_cache():
+    driver_pool._chromedriver_path = None
+    yield
+    driver_pool._chromedriver_path = None
+
+
+def test_chromedriver_resolved_once_and_cached_to_file(tmp_path, reset_chromedriver_cache):
+    cache_file = tmp_path / "chromedriver_path"
+    binary = tmp_path / "chromedriver"
+    binary.write_text("")
+
+    with patch.object(driver_pool.settings, 'CHROMEDRIVER_PATH', ''), \
+            patch.object(driver_pool.settings, 'CHROMEDRIVER_CACHE_FILE', str(cache_file)), \
+            patch('apps.core.stock.driver_pool.ChromeDriverManager') as manager:
+        manager.return_value.install.return_value = str(binary)
+
+        assert driver_pool.resolve_chromedriver_path() == str(binary)
+        assert driver_pool.resolve_chromedriver_path() == str(binary)
+        manager.return_value.install.assert_called_once()
+        assert cache_file.read_text() == str(binary)
+
+        # 新进程（进程内缓存为空）直接读取缓存文件，不再调用 webdriver-manager
+        driver_pool._chromedriver_path = None
+        assert driver_pool.resolve_chromedriver_path() == str(binary)
+        manager.return_value.install.assert_called_once()
+
+
+def test_chromedriver_path_override(tmp_path, reset_chromedriver_cache):
+    binary = tmp_path / "chromedriver"
+    binary.write_text("")
+
+    with patch.object(driver_pool.settings, 'CHROMEDRIVER_PATH', str(binary)), \
+            patch('apps.core.stock.driver_pool.ChromeDriverManager') as manager:
+        assert driver_pool.resolve_chromedriver_path() == str(binary)
+        manager.assert_not_called()
+
+    with patch.object(driver_pool.settings, 'CHROMEDRIVER_PATH', str(tmp_path / "missing")):
+        with pytest.raises(RuntimeError):
+            driver_pool.resolve_chromedriver_path(refresh=True)
@@ -0,0 +1,57 @@
+import datetime
+from unittest.mock import MagicMock
+
+from apps.core.stock.fetch_queue import FetchPriorityQueue
+from apps.core.stock.last_quotes import LastQuoteBook
+
+NOW = datetime.datetime(2026, 1, 5, 10, 0, 0)
+
+
+def make_storage(latest):
+    storage = MagicMock()
+    storage.get_latest_prices.side_effect = lambda codes: {code: latest[code] for code in codes if code in latest}
+    return storage
+
+
+def test_order_by_user_priority_then_threshold_distance_and_staleness():
+    queue = FetchPriorityQueue(staleness_seconds=300, book=LastQuoteBook(clock=lambda: NOW.timestamp()))
+    fresh = NOW - datetime.timedelta(seconds=10)
+    stale = NOW - datetime.timedelta(hours=1)
+    storage = make_storage({
+        "QUIET": {"stock_price": 100.0, "stock_time": fresh},
+        "NEAR": {"stock_price": 100.0, "stock_time": fresh},
+        "STALE": {"stock_price": 100.0, "stock_time": stale},
+        "VIP": {"stock_price": 100.0, "stock_time": fresh},
+    })
+    stocks = [
+        {"stock_code": "QUIET", "price_low": 50, "price_high": None},
+        {"stock_code": "NEAR", "price_low": 99, "price_high": None},
+        {"stock_code": "STALE", "price_low": 50, "price_high": None},
+        {"stock_code": "NEW", "price_low": 50, "price_high": None},
+        {"stock_code": "VIP", "price_low": None, "price_high": None, "priority": 5},
+    ]
+
+    ordered = [stock["stock_code"] for stock in queue.order(storage, stocks)]
+
+    # 用户优先级最高；其余股票中从未抓取过的最先，其次离阈值近的，久未抓取的排在刚抓取过的前面
+    assert ordered == ["VIP", "NEW", "NEAR", "STALE", "QUIET"]
+    # 一次查询载入全部股票，且只载入一次
+    queue.order(storage, stocks)
+    storage.get_latest_prices.assert_called_once_with(["QUIET", "NEAR", "STALE", "NEW", "VIP"])
+
+
+def test_recorded_price_moves_stock_up():
+    book = LastQuoteBook(clock=lambda: NOW.timestamp())
+    queue = FetchPriorityQueue(staleness_seconds=300, book=book)
+    storage = make_storage({})
+    a = {"stock_code": "A", "price_low": 90, "price_high": None}
+    b = {"stock_code": "B", "price_low": 90, "price_high": None}
+
+    book.record("A", 100.0)
+    book.record("B", 100.0)
+    assert [s["stock_code"] for s in queue.order(storage, [a, b])] == ["A", "B"]
+
+    # B 跌近阈值后排到前面
+    book.record("B", 91.0)
+    assert [s["stock_code"] for s in queue.order(storage, [a, b])] == ["B", "A"]
+    storage.get_latest_prices.assert_not_called()
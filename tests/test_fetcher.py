@@ -1,5 +1,5 @@
-from apps.core.stock.fetcher import _extract_number, fetch_stock
-from unittest.mock import patch
+from apps.core.stock.fetcher import _extract_number, fetch_stock, get_elements_without_full_load, get_quote_from_page
+from unittest.mock import MagicMock, patch
 
 
 def test_extract_number_percent_and_units():
@@ -17,20 +17,180 @@ def test_fetch_stock_parses_pe_pb_and_computes_roe():
         "<div class='pankou-item'><div class='key'>市净率</div><div class='value'>1.234</div></div>"
     )
 
-    # 当按 selector 不同返回不同 html
-    def fake_fetch(stock_path_code, selector):
-        if selector == "div.trading-info-box":
-            return trading_html
-        if selector == "div.pankou-fold-box":
-            return pankou_html
-        return None
+    # 一次页面加载按 selector 返回不同 html
+    def fake_fetch(stock_path_code, selectors):
+        fragments = {"div.trading-info-box": trading_html, "div.pankou-fold-box": pankou_html}
+        return {selector: fragments.get(selector) for selector in selectors}
 
-    with patch('apps.core.stock.fetcher.fetch_stock_by_element_selector', side_effect=fake_fetch):
+    # HTML 解析路径
+    with patch('apps.core.stock.fetcher.settings.FETCH_EXTRACT_MODE', 'html'), \
+            patch('apps.core.stock.fetcher.fetch_stock_by_element_selectors', side_effect=fake_fetch) as mock_fetch:
         res = fetch_stock('AAPL')
+        mock_fetch.assert_called_once()
         assert res['price'] == '95.5'
         assert res['time'] == '2026-01-03 12:00:00'
         assert res['pe_ttm'] == 12.35  # rounded to two decimals
         assert res['pb'] == 1.23
         # ROE = PB / PE * 100
         expected_roe = round((1.234 / 12.3456) * 100, 2)
-        assert res['roe'] == expected_roe
\ No newline at end of file
+        assert res['roe'] == expected_roe
+
+
+def test_get_elements_loads_page_once_for_all_selectors():
+    driver = MagicMock()
+    element = MagicMock()
+    element.is_displayed.return_value = True
+    element.get_attribute.return_value = "<div>fragment</div>"
+    driver.find_element.return_value = element
+
+    pool = MagicMock()
+    item = MagicMock()
+    item.driver = driver
+    pool.driver.return_value.__enter__.return_value = item
+
+    with patch('apps.core.stock.fetcher.get_driver_pool', return_value=pool):
+        res = get_elements_without_full_load("http://example.com", ["div.a", "div.b"], timeout=1)
+
+    driver.get.assert_called_once_with("http://example.com")
+    assert res == {"div.a": "<div>fragment</div>", "div.b": "<div>fragment</div>"}
+
+
+def test_fetch_stock_uses_script_extraction_without_html_parse():
+    extracted = {
+        "price": "95.5",
+        "time": "2026-01-03 12:00:00",
+        "pankou": {"市盈率(TTM)": "12.3456", "市净率": "1.234"},
+    }
+
+    driver, element, pool = make_page_driver(extracted)
+
+    with patch('apps.core.stock.fetcher.settings.FETCH_EXTRACT_MODE', 'js'), \
+            patch('apps.core.stock.fetcher.get_driver_pool', return_value=pool), \
+            patch('apps.core.stock.fetcher.fetch_stock_by_element_selectors') as mock_html:
+        res = fetch_stock('AAPL')
+
+    mock_html.assert_not_called()
+    driver.find_elements.assert_not_called()
+    assert res == {
+        "price": "95.5",
+        "time": "2026-01-03 12:00:00",
+        "pe_ttm": 12.35,
+        "pb": 1.23,
+        "roe": round((1.234 / 12.3456) * 100, 2),
+    }
+
+
+def make_page_driver(script_result):
+    driver = MagicMock()
+    element = MagicMock()
+    element.is_displayed.return_value = True
+    driver.find_element.return_value = element
+    driver.execute_script.return_value = script_result
+
+    pool = MagicMock()
+    item = MagicMock()
+    item.driver = driver
+    pool.driver.return_value.__enter__.return_value = item
+    return driver, element, pool
+
+
+def test_get_quote_from_page_runs_one_script_per_page():
+    driver, element, pool = make_page_driver({"price": "1.0", "time": "2026-01-03 15:00:00", "pankou": {}})
+
+    with patch('apps.core.stock.fetcher.get_driver_pool', return_value=pool):
+        res = get_quote_from_page("http://example.com", "ab-600519", timeout=1)
+
+    driver.get.assert_called_once_with("http://example.com")
+    driver.execute_script.assert_called_once()
+    element.get_attribute.assert_not_called()
+    assert res["price"] == "1.0"
+
+
+def test_fetch_stock_falls_back_to_html_on_the_same_page_load():
+    driver, element, pool = make_page_driver(None)
+    trading = MagicMock()
+    trading.get_attribute.return_value = "<div><div class='price'>95.5</div><div class='time-text'>2026-01-03 12:00:00</div></div>"
+    pankou = MagicMock()
+    pankou.get_attribute.return_value = "<div><div class='pankou-item'><div class='key'>市净率</div><div class='value'>1.234</div></div></div>"
+    driver.find_elements.side_effect = lambda by, selector: [trading] if selector == "div.trading-info-box" else [pankou]
+
+    with patch('apps.core.stock.fetcher.get_driver_pool', return_value=pool), \
+            patch('apps.core.stock.fetcher.settings.FETCH_EXTRACT_MODE', 'js'):
+        res = fetch_stock('ab-600519')
+
+    # 脚本未取到价格时不再重新加载页面
+    driver.get.assert_called_once_with("https://gushitong.baidu.com/stock/ab-600519")
+    driver.execute_script.assert_called_once()
+    assert res["price"] == "95.5"
+    assert res["pb"] == 1.23
+
+
+class FakeTabbedDriver:
+    """模拟多标签页浏览器：每个页面在被轮询若干次后才出现交易/盘口区块"""
+
+    def __init__(self, ready_after):
+        self.ready_after = ready_after  # {stock_path_code: 轮询次数，None 表示永不就绪}
+        self.urls = {"base": "about:blank"}
+        self.polls = {}
+        self.current_window_handle = "base"
+        self.max_open_tabs = 0
+        self.switch_to = MagicMock()
+        self.switch_to.new_window.side_effect = self._new_window
+        self.switch_to.window.side_effect = self._switch
+
+    def _new_window(self, kind):
+        handle = f"tab-{len(self.polls) + len(self.urls)}"
+        self.urls[handle] = "about:blank"
+        self.current_window_handle = handle
+        self.max_open_tabs = max(self.max_open_tabs, len(self.urls) - 1)
+
+    def _switch(self, handle):
+        self.current_window_handle = handle
+
+    def _code(self):
+        return self.urls[self.current_window_handle].rsplit("/", 1)[-1]
+
+    def execute_script(self, script, *args):
+        if "window.location.href" in script:
+            self.urls[self.current_window_handle] = args[0]
+            return None
+        code = self._code()
+        return {"price": f"{len(code)}.0", "time": "2026-01-03 12:00:00", "pankou": {"市盈率(TTM)": "10", "市净率": "2"}}
+
+    def find_elements(self, by, selector):
+        code = self._code()
+        needed = self.ready_after.get(code)
+        if selector == "div.trading-info-box":
+            self.polls[code] = self.polls.get(code, 0) + 1
+        if needed is None or self.polls.get(code, 0) < needed:
+            return []
+        return [MagicMock()]
+
+    def close(self):
+        del self.urls[self.current_window_handle]
+
+    def execute_cdp_cmd(self, *args):
+        return None
+
+
+def test_fetch_stocks_harvests_tabs_as_they_become_ready():
+    from apps.core.stock.fetcher import fetch_stocks
+
+    driver = FakeTabbedDriver({"ab-600519": 3, "hk-00700": 1, "us-AAPL": 2, "us-SLOW": None})
+    pool = MagicMock()
+    item = MagicMock()
+    item.driver = driver
+    pool.driver.return_value.__enter__.return_value = item
+
+    with patch('apps.core.stock.fetcher.get_driver_pool', return_value=pool), \
+            patch('apps.core.stock.fetcher.settings.FETCH_EXTRACT_MODE', 'js'):
+        res = fetch_stocks(["ab-600519", "hk-00700", "us-AAPL", "us-SLOW"], max_tabs=2, timeout=0.3, poll_interval=0.01)
+
+    assert res["ab-600519"]["price"] == "9.0"
+    assert res["hk-00700"]["price"] == "8.0"
+    assert res["us-AAPL"]["pe_ttm"] == 10.0
+    assert res["us-AAPL"]["roe"] == 20.0
+    assert res["us-SLOW"] is None
+    # 同时在途的标签页不超过 max_tabs，结束后只剩初始标签页
+    assert driver.max_open_tabs == 2
+    assert list(driver.urls) == ["base"]
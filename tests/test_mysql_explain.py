@@ -0,0 +1,101 @@
+"""
+最新价格 / 最近价格查询的 EXPLAIN 检查（需要本地 MySQL）
+
+设置 MYSQL_TEST_HOST（可选 MYSQL_TEST_PORT / MYSQL_TEST_USER / MYSQL_TEST_PASSWORD / MYSQL_TEST_DB）后运行；
+用例会在测试库中重建 `stock_price_history` 表，请勿指向业务数据库。
+"""
+import datetime
+import os
+import re
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import pytest
+
+from apps.core.storage.mysql_storage import MySQLStorage
+
+pytestmark = pytest.mark.skipif(not os.getenv("MYSQL_TEST_HOST"), reason="未设置 MYSQL_TEST_HOST，跳过 MySQL EXPLAIN 检查")
+
+INDEX = "idx_stock_code_effective_time"
+SCHEMA = Path(__file__).resolve().parents[1] / "data" / "database_schema.sql"
+
+
+def history_ddl():
+    match = re.search(r"CREATE TABLE `stock_price_history` \(.*?\) ENGINE=[^;]*", SCHEMA.read_text(encoding="utf-8"), re.S)
+    return match.group(0)
+
+
+@pytest.fixture(scope="module")
+def mysql_conn():
+    pymysql = pytest.importorskip("pymysql")
+    from pymysql.cursors import DictCursor
+
+    conn = pymysql.connect(
+        host=os.environ["MYSQL_TEST_HOST"],
+        port=int(os.getenv("MYSQL_TEST_PORT", "3306")),
+        user=os.getenv("MYSQL_TEST_USER", "root"),
+        password=os.getenv("MYSQL_TEST_PASSWORD", ""),
+        database=os.getenv("MYSQL_TEST_DB", "stock_test"),
+        cursorclass=DictCursor,
+    )
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS `stock_price_history`")
+        cur.execute(history_ddl())
+        start = datetime.datetime(2026, 1, 5, 9, 30)
+        rows = [
+            (f"C{code:03d}", (start + datetime.timedelta(minutes=i)).date(), start + datetime.timedelta(minutes=i), 10 + i % 7)
+            for code in range(50) for i in range(100)
+        ]
+        cur.executemany(
+            "INSERT INTO `stock_price_history` (stock_code, stock_date, stock_time, stock_price) VALUES (%s, %s, %s, %s)",
+            rows,
+        )
+        cur.execute("ANALYZE TABLE `stock_price_history`")
+    conn.commit()
+    yield conn
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS `stock_price_history`")
+    conn.close()
+
+
+def captured_sql(method, *args):
+    """用假的连接池调用存储方法，取出它实际执行的 SQL 与参数"""
+    cur = MagicMock()
+    cur.fetchall.return_value = []
+    cur.fetchone.return_value = None
+    conn = MagicMock()
+    conn.cursor.return_value = cur
+    storage = MySQLStorage.__new__(MySQLStorage)
+    storage.pool = MagicMock()
+    storage.pool.connection.return_value = conn
+    storage.latest_price_table = False
+    storage.history_effective_time_column = True
+    getattr(storage, method)(*args)
+    return cur.execute.call_args[0]
+
+
+def explain(conn, sql, params):
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN " + sql, params)
+        return cur.fetchall()
+
+
+@pytest.mark.parametrize("method, args", [
+    ("get_latest_price", ("C007",)),
+    ("get_recent_prices", ("C007", 20)),
+])
+def test_single_stock_queries_use_composite_index_without_filesort(mysql_conn, method, args):
+    plan = explain(mysql_conn, *captured_sql(method, *args))
+    assert len(plan) == 1
+    assert plan[0]["key"] == INDEX
+    assert "filesort" not in (plan[0]["Extra"] or "")
+
+
+def test_latest_prices_group_by_is_index_only(mysql_conn):
+    plan = explain(mysql_conn, *captured_sql("get_latest_prices", ["C001", "C002", "C003"]))
+    history_rows = [row for row in plan if row["table"] in ("h", "stock_price_history")]
+    assert history_rows
+    assert all(row["type"] != "ALL" for row in history_rows)
+    assert all(row["key"] == INDEX for row in history_rows)
+    # 分组取最新时间只读索引
+    assert any("Using index" in (row["Extra"] or "") for row in history_rows if row["table"] == "stock_price_history")
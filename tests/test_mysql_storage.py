@@ -124,3 +124,170 @@ def test_save_stock_price_history_with_metrics():
     sql, params = cur.execute.call_args[0]
     assert 'pe_ttm' in sql and 'pb' in sql and 'roe' in sql
     assert params == ("AAPL", "2026-01-03", "2026-01-03 12:00:00", 95.5, 12.34, 1.23, 5.67)
+
+
+def test_save_stock_price_history_many_uses_one_transaction():
+    conn = make_mock_conn()
+    cur = conn.cursor.return_value
+
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+
+    ok = storage.save_stock_price_history_many([
+        {"stock_code": "AAPL", "stock_date": "2026-01-03", "stock_price": 95.5,
+         "stock_time": "2026-01-03 12:00:00", "pe_ttm": 12.34},
+        {"stock_code": "MSFT", "stock_date": "2026-01-03", "stock_price": 410.0},
+    ])
+    assert ok is True
+
+    cur.executemany.assert_called_once()
+    sql, params = cur.executemany.call_args[0]
+    assert 'ON DUPLICATE KEY UPDATE' in sql
+    assert params == [
+        ("AAPL", "2026-01-03", "2026-01-03 12:00:00", 95.5, 12.34, None, None),
+        ("MSFT", "2026-01-03", None, 410.0, None, None, None),
+    ]
+    conn.commit.assert_called_once()
+
+    cur.executemany.side_effect = RuntimeError("deadlock")
+    assert storage.save_stock_price_history_many([{"stock_code": "AAPL", "stock_date": "2026-01-03", "stock_price": 1}]) is False
+    conn.rollback.assert_called_once()
+    assert storage.save_stock_price_history_many([]) is True
+
+
+def test_get_recent_prices():
+    rows = [{"stock_price": 11.0, "stock_time": "2026-01-03 12:01:00"}, {"stock_price": 10.0, "stock_time": "2026-01-03 12:00:00"}]
+    conn = make_mock_conn(return_rows=rows)
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+    assert storage.get_recent_prices("AAPL", limit=2) == rows
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert "LIMIT %s" in sql
+    # 按生成列排序，可以使用 (stock_code, effective_time) 索引
+    assert "ORDER BY effective_time DESC" in sql and "COALESCE" not in sql
+    assert params == ("AAPL", 2)
+
+
+def test_history_queries_without_effective_time_column():
+    conn = make_mock_conn(return_rows=[])
+    cur = conn.cursor.return_value
+    # 未执行 20261019 迁移：SHOW COLUMNS 查不到 effective_time 列
+    cur.fetchone.return_value = None
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+    assert storage.get_recent_prices("AAPL", limit=2) == []
+    assert "ORDER BY COALESCE(stock_time, fetch_date) DESC" in cur.execute.call_args.args[0]
+
+    storage.get_latest_price("AAPL")
+    assert "ORDER BY COALESCE(stock_time, fetch_date) DESC" in cur.execute.call_args.args[0]
+
+    storage.get_latest_prices(["AAPL", "MSFT"])
+    sql = cur.execute.call_args.args[0]
+    assert "MAX(COALESCE(stock_time, fetch_date))" in sql
+    assert "COALESCE(h.stock_time, h.fetch_date) = m.latest" in sql and "effective_time" not in sql
+
+    storage.backfill_latest_prices()
+    assert "effective_time" not in cur.execute.call_args.args[0]
+
+    # 列检测只执行一次
+    show_columns = [call for call in cur.execute.call_args_list if call.args[0].startswith("SHOW COLUMNS")]
+    assert len(show_columns) == 1
+
+
+def test_add_and_update_concern_stock_priority():
+    conn = make_mock_conn()
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+    assert storage.add_concern_stock("贵州茅台", "600519", "ab-600519", priority=3) is True
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert "priority" in sql and params[-1] == 3
+
+    assert storage.update_concern_stock(1, priority=5) is True
+    sql, params = conn.cursor.return_value.execute.call_args.args
+    assert sql == "UPDATE `stock_concern` SET priority = %s WHERE id = %s"
+    assert params == [5, 1]
+
+
+def test_concern_stocks_without_priority_column():
+    conn = make_mock_conn(return_rows=[{"id": 1, "stock_code": "600519", "priority": 0}])
+    cur = conn.cursor.return_value
+    # 未执行 20261017 迁移：SHOW COLUMNS 查不到 priority 列
+    cur.fetchone.return_value = None
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+    assert storage.query_concern_stocks() == [{"id": 1, "stock_code": "600519", "priority": 0}]
+    sql = cur.execute.call_args.args[0]
+    assert "0 AS priority" in sql
+
+    assert storage.add_concern_stock("贵州茅台", "600519", "ab-600519", priority=3) is True
+    sql, params = cur.execute.call_args.args
+    assert "priority" not in sql and len(params) == 5
+
+    # 只修改优先级时没有可更新的字段
+    assert storage.update_concern_stock(1, priority=5) is False
+    assert storage.update_concern_stock(1, price_low=9.5, priority=5) is True
+    assert cur.execute.call_args.args == ("UPDATE `stock_concern` SET price_low = %s WHERE id = %s", [9.5, 1])
+
+    # 列检测只执行一次
+    show_columns = [call for call in cur.execute.call_args_list if call.args[0].startswith("SHOW COLUMNS")]
+    assert len(show_columns) == 1
+
+
+def test_price_history_partition_ddl():
+    import datetime
+
+    conn = make_mock_conn()
+    cur = conn.cursor.return_value
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+    inject_pooleddb(pool_instance)
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+
+    assert storage.add_price_history_partitions([datetime.date(2026, 11, 1), datetime.date(2026, 12, 1)]) is True
+    assert cur.execute.call_args.args[0] == (
+        "ALTER TABLE `stock_price_history` REORGANIZE PARTITION pmax INTO "
+        "(PARTITION p202611 VALUES LESS THAN ('2026-12-01'), PARTITION p202612 VALUES LESS THAN ('2027-01-01'), "
+        "PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+    )
+
+    assert storage.drop_price_history_partitions(["p202501", "p202502"]) is True
+    assert cur.execute.call_args.args[0] == "ALTER TABLE `stock_price_history` DROP PARTITION p202501, p202502"
+
+    # 归档表不存在：建表、去掉分区、交换、删除分区
+    cur.execute.reset_mock()
+    cur.fetchone.side_effect = [None, None]
+    assert storage.archive_price_history_partition("p202501") is True
+    statements = [c.args[0] for c in cur.execute.call_args_list[1:]]
+    assert statements == [
+        "CREATE TABLE `stock_price_history_p202501` LIKE `stock_price_history`",
+        "ALTER TABLE `stock_price_history_p202501` REMOVE PARTITIONING",
+        "SELECT 1 FROM `stock_price_history_p202501` LIMIT 1",
+        "ALTER TABLE `stock_price_history` EXCHANGE PARTITION p202501 WITH TABLE `stock_price_history_p202501`",
+        "ALTER TABLE `stock_price_history` DROP PARTITION p202501",
+    ]
+
+    # 上次已交换到归档表：只删除分区
+    cur.execute.reset_mock()
+    cur.fetchone.side_effect = [{"1": 1}, {"1": 1}]
+    assert storage.archive_price_history_partition("p202501") is True
+    assert "EXCHANGE PARTITION" not in " ".join(c.args[0] for c in cur.execute.call_args_list)
@@ -43,6 +43,35 @@ def test_get_latest_price():
     assert res == row
 
 
+def test_get_latest_prices_single_query():
+    rows = [
+        {"id": 1, "stock_code": "AAPL", "stock_price": 123.45, "stock_time": "2026-01-03 12:00:00"},
+        {"id": 2, "stock_code": "AAPL", "stock_price": 123.50, "stock_time": "2026-01-03 12:00:00"},
+        {"id": 3, "stock_code": "MSFT", "stock_price": 410.0, "stock_time": "2026-01-03 12:00:00"},
+    ]
+    conn = make_mock_conn_with_fetchone(fetchone_value=None)
+    cur = conn.cursor.return_value
+    cur.fetchall.return_value = rows
+
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+
+    inject_pooleddb(pool_instance)
+
+    storage = MySQLStorage("host", 3306, "user", "pass", "db")
+    storage.history_effective_time_column = True
+    res = storage.get_latest_prices(["AAPL", "MSFT", "AAPL", "TSLA"])
+    assert res == {"AAPL": rows[1], "MSFT": rows[2]}
+
+    cur.execute.assert_called_once()
+    sql, params = cur.execute.call_args[0]
+    assert "GROUP BY stock_code" in sql
+    assert params == ["AAPL", "MSFT", "TSLA"]
+
+    assert storage.get_latest_prices([]) == {}
+    assert pool_instance.connection.call_count == 1
+
+
 def test_upsert_alert_state_and_save_history():
     conn = make_mock_conn_with_fetchone(fetchone_value=None)
 
@@ -58,3 +87,61 @@ def test_upsert_alert_state_and_save_history():
 
     ok2 = storage.save_alert_history(1, "AAPL", "low", 100.0, 95.0, 1, None)
     assert ok2 is True
+
+
+def make_latest_storage(conn):
+    pool_instance = MagicMock()
+    pool_instance.connection.return_value = conn
+    inject_pooleddb(pool_instance)
+    return MySQLStorage("host", 3306, "user", "pass", "db", latest_price_table=True)
+
+
+def test_history_writes_upsert_latest_price_in_same_transaction():
+    conn = make_mock_conn_with_fetchone()
+    cur = conn.cursor.return_value
+    storage = make_latest_storage(conn)
+
+    assert storage.save_stock_price_history("AAPL", "2026-01-03", 95.5, "2026-01-03 12:00:00") is True
+    assert [call.args[0].split()[2] for call in cur.execute.call_args_list] == ["`stock_price_history`", "`stock_latest_price`"]
+    assert cur.execute.call_args_list[1].args[1] == ("AAPL", "2026-01-03", "2026-01-03 12:00:00", 95.5, None, None, None)
+    conn.commit.assert_called_once()
+
+    rows = [{"stock_code": "AAPL", "stock_date": "2026-01-03", "stock_price": 96.0, "stock_time": "2026-01-03 12:01:00"}]
+    assert storage.save_stock_price_history_many(rows) is True
+    latest_sql, params = cur.executemany.call_args_list[1].args
+    # 较旧的行情不会覆盖最新价格，stock_time 最后更新
+    assert "VALUES(stock_time) >= `stock_latest_price`.stock_time" in latest_sql
+    assert latest_sql.rstrip().endswith("VALUES(stock_time), `stock_latest_price`.stock_time)")
+    assert params == [("AAPL", "2026-01-03", "2026-01-03 12:01:00", 96.0, None, None, None)]
+    assert conn.commit.call_count == 2
+
+
+def test_latest_price_reads_use_latest_price_table():
+    row = {"stock_code": "AAPL", "stock_price": 96.0, "stock_time": "2026-01-03 12:01:00"}
+    conn = make_mock_conn_with_fetchone()
+    cur = conn.cursor.return_value
+    cur.fetchall.return_value = [row]
+    storage = make_latest_storage(conn)
+
+    assert storage.get_latest_price("AAPL") == row
+    sql, params = cur.execute.call_args[0]
+    assert "FROM `stock_latest_price` WHERE stock_code IN (%s)" in sql
+    assert "stock_price_history" not in sql
+    assert params == ["AAPL"]
+
+
+def test_backfill_latest_prices():
+    conn = make_mock_conn_with_fetchone()
+    cur = conn.cursor.return_value
+    cur.execute.return_value = 3
+    storage = make_latest_storage(conn)
+
+    assert storage.backfill_latest_prices() == 3
+    sql = cur.execute.call_args[0][0]
+    assert sql.startswith("INSERT INTO `stock_latest_price`")
+    assert "FROM `stock_price_history` GROUP BY stock_code" in sql
+    assert "ON DUPLICATE KEY UPDATE" in sql
+    conn.commit.assert_called_once()
+
+    cur.execute.side_effect = RuntimeError("no such table")
+    assert storage.backfill_latest_prices() is None
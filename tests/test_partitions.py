@@ -0,0 +1,68 @@
+import datetime
+from unittest.mock import MagicMock
+
+from apps.core.storage.partitions import add_months, parse_bound, plan_partitions, run_price_history_retention
+
+TODAY = datetime.date(2026, 10, 17)
+
+PARTITIONS = [
+    ("p_before_202601", "'2026-01-01'"),
+    ("p202601", "'2026-02-01'"),
+    ("p202602", "'2026-03-01'"),
+    ("p202610", "'2026-11-01'"),
+    ("pmax", "MAXVALUE"),
+]
+
+
+def test_month_helpers():
+    assert add_months(datetime.date(2026, 11, 15), 2) == datetime.date(2027, 1, 1)
+    assert add_months(datetime.date(2026, 1, 31), -1) == datetime.date(2025, 12, 1)
+    assert parse_bound("'2026-02-01'") == datetime.date(2026, 2, 1)
+    assert parse_bound("MAXVALUE") is None
+
+
+def test_plan_adds_future_months_and_expires_old_partitions():
+    to_add, to_expire = plan_partitions(PARTITIONS, TODAY, retention_months=8, months_ahead=2)
+    # 覆盖到 2026-12（当月之后 2 个月）
+    assert to_add == [datetime.date(2026, 11, 1), datetime.date(2026, 12, 1)]
+    # 保留期起点为 2026-02-01：上界不晚于它的分区过期
+    assert to_expire == ["p_before_202601", "p202601"]
+
+
+def test_plan_keeps_everything_without_retention():
+    to_add, to_expire = plan_partitions(PARTITIONS, TODAY, retention_months=0, months_ahead=0)
+    assert to_add == []
+    assert to_expire == []
+
+
+def make_storage(partitions=PARTITIONS):
+    storage = MagicMock()
+    storage.list_price_history_partitions.return_value = partitions
+    storage.add_price_history_partitions.return_value = True
+    storage.archive_price_history_partition.return_value = True
+    storage.drop_price_history_partitions.return_value = True
+    return storage
+
+
+def test_retention_archives_expired_partitions():
+    storage = make_storage()
+    summary = run_price_history_retention(storage, today=TODAY, retention_months=8, mode='archive', months_ahead=1)
+
+    storage.add_price_history_partitions.assert_called_once_with([datetime.date(2026, 11, 1)])
+    assert [c.args[0] for c in storage.archive_price_history_partition.call_args_list] == ["p_before_202601", "p202601"]
+    storage.drop_price_history_partitions.assert_not_called()
+    assert summary == {'added': ["p202611"], 'expired': ["p_before_202601", "p202601"], 'mode': 'archive'}
+
+
+def test_retention_drop_mode_stops_at_first_failure():
+    storage = make_storage()
+    storage.drop_price_history_partitions.side_effect = [True, False]
+    summary = run_price_history_retention(storage, today=TODAY, retention_months=8, mode='drop', months_ahead=0)
+    assert summary['expired'] == ["p_before_202601"]
+
+
+def test_retention_requires_partitioned_table_and_known_mode():
+    assert run_price_history_retention(make_storage([]), today=TODAY, retention_months=8, mode='drop') is None
+    storage = make_storage()
+    assert run_price_history_retention(storage, today=TODAY, mode='truncate') is None
+    storage.list_price_history_partitions.assert_not_called()
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from apps.core.stock.polling import PollingPlanner, threshold_distance, volatility
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_storage(history):
+    """history: {stock_code: 按时间从旧到新的价格列表}"""
+    storage = MagicMock()
+    storage.get_recent_prices.side_effect = lambda code, limit: [
+        {"stock_price": price} for price in reversed(history.get(code, []))
+    ][:limit]
+    return storage
+
+
+def test_volatility_and_threshold_distance():
+    assert volatility([10.0, 10.0]) is None
+    assert volatility([10.0, 10.0, 10.0]) == 0.0
+    assert volatility([10.0, 10.1, 10.0, 10.1]) > 0
+
+    assert threshold_distance(100.0, price_low=90, price_high=None) == pytest.approx(0.1)
+    assert threshold_distance(100.0, price_low=90, price_high=105) == pytest.approx(0.05)
+    # 已越过阈值
+    assert threshold_distance(80.0, price_low=90) == 0.0
+    assert threshold_distance(100.0) is None
+
+
+def test_near_threshold_polled_more_often_than_quiet_stock():
+    clock = FakeClock()
+    planner = PollingPlanner(min_interval=60, max_interval=900, clock=clock)
+    history = {
+        "NEAR": [100.0, 101.0, 99.5, 100.5, 100.0],
+        "FAR": [100.0, 100.1, 100.0, 100.1, 100.0],
+        "NOTHRESHOLD": [100.0, 101.0, 99.0, 100.0],
+    }
+    near = {"stock_code": "NEAR", "price_low": 99.0, "price_high": None}
+    far = {"stock_code": "FAR", "price_low": 50.0, "price_high": 200.0}
+    no_threshold = {"stock_code": "NOTHRESHOLD", "price_low": None, "price_high": None}
+    stocks = [near, far, no_threshold]
+
+    # 首次出现的股票立即到期，并从历史价格中载入波动率
+    due, deferred = planner.split_due(make_storage(history), stocks)
+    assert due == stocks and deferred == []
+
+    planner.observe(near, 100.0)
+    planner.observe(far, 100.0)
+    planner.observe(no_threshold, 100.0)
+    assert planner.interval_for(near) == 60
+    assert planner.interval_for(far) == 900
+    assert planner.interval_for(no_threshold) == 900
+
+    clock.now += 61
+    due, deferred = planner.split_due(make_storage(history), stocks)
+    assert due == [near]
+    assert deferred == [far, no_threshold]
+
+    clock.now += 900
+    due, _ = planner.split_due(make_storage(history), stocks)
+    assert due == stocks
+
+
+def test_unknown_history_polls_at_min_interval():
+    planner = PollingPlanner(min_interval=30, max_interval=600, clock=FakeClock())
+    stock = {"stock_code": "NEW", "price_low": 10, "price_high": None}
+    planner.split_due(make_storage({}), [stock])
+
+    assert planner.interval_for(stock) == 30
+    assert planner.next_due_in("NEW") is None
+    planner.observe(stock, 20.0)
+    # 只有一条价格时波动率取下限，距离阈值很远
+    assert planner.next_due_in("NEW") == 600
@@ -0,0 +1,77 @@
+import time
+from unittest.mock import MagicMock, patch
+
+from apps.core.stock.quote_cache import QuoteCache
+from apps.core.stock.sources import QuoteSource, fetch_quote, fetch_quotes
+
+
+QUOTE = {"price": "95.5", "time": "2026-01-03 12:00:00", "pe_ttm": 12.35}
+
+
+def make_source():
+    source = MagicMock(spec=QuoteSource)
+    source.fetch.return_value = dict(QUOTE)
+    source.fetch_many.side_effect = lambda codes: {code: dict(QUOTE) for code in codes}
+    return source
+
+
+def test_cache_hit_miss_and_ttl(tmp_path):
+    cache = QuoteCache(tmp_path / "c.sqlite3", ttl=0.2)
+
+    assert cache.get("ab-600519") is None
+    cache.set("ab-600519", QUOTE)
+    cache.set("ab-000001", None)  # 空结果不缓存
+    assert cache.get("ab-600519") == QUOTE
+    assert cache.get("ab-000001") is None
+
+    time.sleep(0.3)
+    assert cache.get("ab-600519") is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 3
+
+
+def test_cache_is_shared_between_instances_and_evicts(tmp_path):
+    path = tmp_path / "c.sqlite3"
+    writer = QuoteCache(path, ttl=60, max_entries=2)
+    reader = QuoteCache(path, ttl=60, max_entries=2)
+
+    writer.set("a", QUOTE)
+    writer.set("b", QUOTE)
+    writer.set("c", QUOTE)
+
+    assert reader.get("a") is None  # 超过条目上限，最早的被淘汰
+    assert reader.get_many(["b", "c"]).keys() == {"b", "c"}
+    assert reader.stats()["entries"] == 2
+    assert reader.stats()["evictions"] >= 1
+
+
+def test_fetch_quote_served_from_cache_within_ttl():
+    source = make_source()
+
+    assert fetch_quote("ab-600519", source=source) == QUOTE
+    assert fetch_quote("ab-600519", source=source) == QUOTE
+    source.fetch.assert_called_once()
+
+    # 绕过缓存强制抓取
+    fetch_quote("ab-600519", source=source, use_cache=False)
+    assert source.fetch.call_count == 2
+
+
+def test_fetch_quotes_only_fetches_misses():
+    source = make_source()
+    fetch_quote("ab-600519", source=source)
+
+    res = fetch_quotes(["ab-600519", "hk-00700"], source=source)
+
+    source.fetch_many.assert_called_once_with(["hk-00700"])
+    assert res == {"ab-600519": QUOTE, "hk-00700": QUOTE}
+
+
+def test_cache_disabled_by_setting():
+    source = make_source()
+    with patch('apps.core.stock.quote_cache.settings.QUOTE_CACHE_ENABLED', False):
+        fetch_quote("ab-600519", source=source)
+        fetch_quote("ab-600519", source=source)
+    assert source.fetch.call_count == 2
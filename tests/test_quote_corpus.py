@@ -0,0 +1,85 @@
+from unittest.mock import patch
+
+import pytest
+
+from apps.core.stock import fetcher, quote_corpus
+from apps.core.stock.quote_corpus import QuoteCorpus
+from apps.core.stock.sources import ReplaySource, fetch_quotes
+
+
+def fragments_for(price):
+    return {
+        fetcher.TRADING_SELECTOR: f"<div class='price'>{price}</div><div class='time-text'>2026-01-03 15:00:00</div>",
+        fetcher.PANKOU_SELECTOR: (
+            "<div class='pankou-item'><div class='key'>市盈率(TTM)</div><div class='value'>10</div></div>"
+            "<div class='pankou-item'><div class='key'>市净率</div><div class='value'>2</div></div>"
+        ),
+    }
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    path = tmp_path / "corpus.sqlite3"
+    monkeypatch.setattr(quote_corpus.settings, 'QUOTE_RECORD_ENABLED', True)
+    monkeypatch.setattr(quote_corpus.settings, 'QUOTE_CORPUS_PATH', str(path))
+    monkeypatch.setattr(quote_corpus, '_recorder', None)
+    yield path
+    quote_corpus._recorder = None
+
+
+def test_record_mode_saves_fragments_and_skips_script_extraction(recording):
+    def fake_fetch(stock_path_code, selectors):
+        return fragments_for("95.5")
+
+    with patch('apps.core.stock.fetcher.fetch_stock_by_script') as script, \
+            patch('apps.core.stock.fetcher.fetch_stock_by_element_selectors', side_effect=fake_fetch):
+        live = fetcher.fetch_stock('ab-600519')
+
+    script.assert_not_called()
+    assert QuoteCorpus(recording).load() == {'ab-600519': [fragments_for("95.5")]}
+
+    # 回放得到与在线抓取相同的解析结果
+    assert ReplaySource(str(recording)).fetch('ab-600519') == live
+    assert live['roe'] == 20.0
+
+
+def test_replay_rotates_records_and_plugs_into_fetch_quotes(tmp_path):
+    corpus = QuoteCorpus(tmp_path / "corpus.sqlite3")
+    corpus.record('ab-600519', fragments_for("1.00"))
+    corpus.record('ab-600519', fragments_for("2.00"))
+    corpus.record('hk-00700', fragments_for("3.00"))
+    corpus.record('us-AAPL', {fetcher.TRADING_SELECTOR: None, fetcher.PANKOU_SELECTOR: None})
+    assert corpus.count() == 3
+
+    source = ReplaySource(str(tmp_path / "corpus.sqlite3"))
+    assert [source.fetch('ab-600519')['price'] for _ in range(3)] == ["1.00", "2.00", "1.00"]
+
+    quotes = fetch_quotes(['hk-00700', 'us-AAPL'], source=source, use_cache=False)
+    assert quotes['hk-00700']['price'] == "3.00"
+    assert quotes['us-AAPL'] is None
+
+
+def test_replay_with_missing_corpus_returns_none(tmp_path):
+    source = ReplaySource(str(tmp_path / "missing" / "corpus.sqlite3"))
+    assert source.fetch('ab-600519') is None
+
+
+def test_replay_bypasses_the_live_quote_cache(tmp_path):
+    from apps.core.stock.quote_cache import get_quote_cache
+    from apps.core.stock.sources import fetch_quote
+
+    corpus = QuoteCorpus(tmp_path / "corpus.sqlite3")
+    corpus.record('ab-600519', fragments_for("1.00"))
+    corpus.record('hk-00700', fragments_for("3.00"))
+    cache = get_quote_cache()
+    live = {"price": "350.00", "time": "2026-01-05 10:00:00"}
+    cache.set('hk-00700', live)
+
+    source = ReplaySource(str(tmp_path / "corpus.sqlite3"))
+    quotes = fetch_quotes(['ab-600519', 'hk-00700'], source=source)
+    assert quotes['hk-00700']['price'] == "3.00"
+    assert fetch_quote('hk-00700', source=source)['price'] == "3.00"
+
+    # 回放的历史行情不写入实时行情缓存
+    assert cache.get('ab-600519') is None
+    assert cache.get('hk-00700') == live
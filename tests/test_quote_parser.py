@@ -0,0 +1,69 @@
+import datetime
+
+import pytest
+
+from apps.core.stock import quote_parser
+from apps.core.stock.fetcher import parse_html, price_data_from_fragments
+
+TODAY = datetime.datetime(2026, 1, 2, 10, 30, 15, 123456)
+
+
+@pytest.mark.parametrize("time_str, expected", [
+    ("2026-01-02 14:00:00", "2026-01-02 14:00:00"),
+    ("2026-01-02 14:00", "2026-01-02 14:00:00"),
+    ("2026-1-2", "2026-01-02 00:00:00"),
+    # 晚于今天的月日属于上一年
+    ("12-31 15:00:00", "2025-12-31 15:00:00"),
+    # 按日期比较：当天盘中的时间仍属于今年
+    ("01-02 09:30", "2026-01-02 09:30:00"),
+    ("01-03 09:30", "2025-01-03 09:30:00"),
+    ("9:30", "2026-01-02 09:30:00"),
+    ("15:00:01", "2026-01-02 15:00:01"),
+    # 只有月日时早于今天的顺延到下一年
+    ("12-31", "2026-12-31 00:00:00"),
+    ("01-02", "2026-01-02 00:00:00"),
+    ("01-01", "2027-01-01 00:00:00"),
+])
+def test_parse_time_string_shapes(time_str, expected):
+    assert quote_parser.parse_time_string(time_str, today=TODAY) == expected
+
+
+@pytest.mark.parametrize("time_str", ["", "abc", "2026-13-01", "25:00", "2026/01/02", " 14:00"])
+def test_parse_time_string_rejects_unknown_shapes(time_str):
+    with pytest.raises(ValueError):
+        quote_parser.parse_time_string(time_str, today=TODAY)
+
+
+def test_parse_time_string_cache_is_keyed_by_day():
+    assert quote_parser.parse_time_string("14:00", today=TODAY) == "2026-01-02 14:00:00"
+    next_day = TODAY + datetime.timedelta(days=1)
+    assert quote_parser.parse_time_string("14:00", today=next_day) == "2026-01-03 14:00:00"
+
+
+def test_extract_number():
+    assert quote_parser.extract_number("2.35万手") == 2.35
+    assert quote_parser.extract_number("-1.5%") == -1.5
+    assert quote_parser.extract_number("​--") is None
+    assert quote_parser.extract_number("1.2.3") is None
+    assert quote_parser.extract_number(None) is None
+    assert quote_parser.extract_number(12) is None
+
+
+def test_parse_pankou_and_trading_html():
+    pankou_html = (
+        "<div class='pankou-fold-box'>"
+        "<div class='pankou-item active'><div class='key'> 市盈率<span>(TTM)</span></div><div class='value'>12.3</div></div>"
+        "<div class='pankou-item'><div class='key'>市净率</div></div>"
+        "<div class='pankou-item-ext'><div class='key'>总市值</div><div class='value'>1万亿</div></div>"
+        "</div>"
+    )
+    assert quote_parser.parse_pankou_html(pankou_html) == {"市盈率(TTM)": "12.3"}
+    assert parse_html(pankou_html) == {"市盈率(TTM)": "12.3"}
+    assert quote_parser.parse_pankou_html("") == {}
+
+    trading_html = "<div><div class='price up'> 95.5 </div><div class='time-text'>2026-01-03 12:00:00</div></div>"
+    assert quote_parser.parse_trading_html(trading_html) == ("95.5", "2026-01-03 12:00:00")
+    assert quote_parser.parse_trading_html("<div></div>") == (None, None)
+
+    data = price_data_from_fragments({"div.trading-info-box": trading_html, "div.pankou-fold-box": pankou_html})
+    assert data == {"price": "95.5", "time": "2026-01-03 12:00:00", "pe_ttm": 12.3}
@@ -1,6 +1,29 @@
+import datetime
 import importlib
 from unittest.mock import MagicMock, patch
 
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def ignore_market_hours(monkeypatch):
+    """除专门测试交易时段的用例外，抓取任务不受当前时间影响"""
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_MARKET_HOURS_ONLY', False)
+
+
+@pytest.fixture(autouse=True)
+def fresh_last_quotes(monkeypatch):
+    """每个用例使用独立的最近行情记录与优先队列，避免用例之间互相影响"""
+    from apps.core.stock import fetch_queue, last_quotes
+    monkeypatch.setattr(last_quotes, '_book', None)
+    monkeypatch.setattr(fetch_queue, '_queue', None)
+
+
+def saved_rows(storage):
+    """抓取任务通过 save_stock_price_history_many 批量写入的全部行"""
+    return [row for call in storage.save_stock_price_history_many.call_args_list for row in call.args[0]]
+
 
 def reload_schedule_task():
     import scripts.schedule_task as schedule_task
@@ -14,19 +37,21 @@ def test_fetch_task_only_fetches_and_saves():
     storage.query_concern_stocks.return_value = [{"id": 1, "stock_code": "AAPL", "stock_url": "http://example.com"}]
 
     with patch('config.database.get_db_storage', return_value=storage):
-        with patch('apps.core.stock.fetcher.fetch_stock', return_value={"price": "95.5", "time": "2026-01-03 12:00:00", "pe_ttm": 12.34, "pb": 1.23, "roe": 5.67}):
+        with patch('apps.core.stock.sources.fetch_quote', return_value={"price": "95.5", "time": "2026-01-03 12:00:00", "pe_ttm": 12.34, "pb": 1.23, "roe": 5.67}):
             schedule_task = reload_schedule_task()
             schedule_task.fetch_task()
 
-            storage.save_stock_price_history.assert_called_once_with(
-                stock_code="AAPL",
-                stock_date="2026-01-03",
-                stock_price=95.5,
-                stock_time="2026-01-03 12:00:00",
-                pe_ttm=12.34,
-                pb=1.23,
-                roe=5.67
-            )
+            # 一轮抓取只提交一次
+            storage.save_stock_price_history_many.assert_called_once_with([{
+                'stock_code': "AAPL",
+                'stock_date': "2026-01-03",
+                'stock_price': 95.5,
+                'stock_time': "2026-01-03 12:00:00",
+                'pe_ttm': 12.34,
+                'pb': 1.23,
+                'roe': 5.67,
+            }])
+            assert not storage.save_stock_price_history.called
 
             # 确认抓取任务不会触发告警相关写入
             assert not storage.save_alert_history.called
@@ -37,7 +62,7 @@ def test_alert_task_invokes_alert_manager():
     storage = MagicMock()
     storage.connect.return_value = True
     storage.query_concern_stocks.return_value = [{"id": 1, "stock_code": "AAPL", "price_low": 120, "price_high": None}]
-    storage.get_latest_price.return_value = {"stock_price": "100.0", "stock_time": "2026-01-03 12:00:00"}
+    storage.get_latest_prices.return_value = {"AAPL": {"stock_price": "100.0", "stock_time": "2026-01-03 12:00:00"}}
 
     with patch('config.database.get_db_storage', return_value=storage):
         with patch('apps.core.alerting.AlertManager') as MockAlertManager:
@@ -46,3 +71,385 @@ def test_alert_task_invokes_alert_manager():
             schedule_task.alert_task()
 
             mock_mgr.handle_stock_price_update.assert_called_once_with({"id": 1, "stock_code": "AAPL", "price_low": 120, "price_high": None}, 100.0, "2026-01-03 12:00:00")
+            # 一次查询取得全部最新价格
+            storage.get_latest_prices.assert_called_once_with(["AAPL"])
+            storage.get_latest_price.assert_not_called()
+
+
+def test_fetch_task_concurrent_isolates_failures_and_reports_summary():
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "AAPL", "stock_url": "us-AAPL"},
+        {"id": 2, "stock_code": "BAD", "stock_url": "us-BAD"},
+        {"id": 3, "stock_code": "NOURL", "stock_url": None},
+        {"id": 4, "stock_code": "MSFT", "stock_url": "us-MSFT"},
+    ]
+
+    def fake_fetch(stock_url):
+        if stock_url == "us-BAD":
+            raise RuntimeError("page crashed")
+        return {"price": "10.0", "time": "2026-01-03 12:00:00"}
+
+    with patch('config.database.get_db_storage', return_value=storage):
+        with patch('apps.core.stock.sources.fetch_quote', side_effect=fake_fetch):
+            schedule_task = reload_schedule_task()
+            with patch.object(schedule_task.settings, 'FETCH_CONCURRENCY', 3):
+                summary = schedule_task.fetch_task()
+
+    assert summary['total'] == 4
+    assert summary['success'] == 2
+    assert summary['failed'] == 1
+    assert summary['skipped'] == 1
+    assert summary['elapsed'] >= 0
+    storage.save_stock_price_history_many.assert_called_once()
+    assert len(saved_rows(storage)) == 2
+
+
+def test_fetch_task_uses_one_batch_call_for_batch_sources():
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "00700", "stock_url": "hk-00700"},
+    ]
+
+    source = MagicMock()
+    source.name = 'yfinance'
+    source.batch = True
+    source.fetch_many.return_value = {
+        "ab-600519": {"price": "1502.46", "time": "2026-01-05 14:59:00"},
+        "hk-00700": None,
+    }
+
+    with patch('config.database.get_db_storage', return_value=storage):
+        with patch('apps.core.stock.sources.get_source', return_value=source):
+            schedule_task = reload_schedule_task()
+            summary = schedule_task.fetch_task()
+
+    source.fetch_many.assert_called_once_with(["ab-600519", "hk-00700"])
+    assert summary['success'] == 1
+    assert summary['failed'] == 1
+    assert [row['stock_code'] for row in saved_rows(storage)] == ["600519"]
+
+
+def test_fetch_task_records_timeouts_and_moves_on():
+    from apps.core.stock.watchdog import FetchDeadlineExceeded
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "HUNG", "stock_url": "ab-000001"},
+        {"id": 2, "stock_code": "OK", "stock_url": "ab-600519"},
+    ]
+
+    def fake_fetch(stock_url):
+        if stock_url == "ab-000001":
+            raise FetchDeadlineExceeded("deadline")
+        return {"price": "10.0", "time": "2026-01-03 12:00:00"}
+
+    with patch('config.database.get_db_storage', return_value=storage):
+        with patch('apps.core.stock.sources.fetch_quote', side_effect=fake_fetch):
+            schedule_task = reload_schedule_task()
+            summary = schedule_task.fetch_task()
+
+    assert summary['timeout'] == 1
+    assert summary['success'] == 1
+
+
+def test_fetch_task_skips_closed_markets(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_MARKET_HOURS_ONLY', True)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "000001", "stock_url": "ab-000001"},
+        {"id": 3, "stock_code": "AAPL", "stock_url": "us-AAPL"},
+    ]
+    gate = MagicMock()
+    gate.decide.side_effect = lambda market: (market == 'ab', None)
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.trading_calendar.get_session_gate', return_value=gate), \
+            patch('apps.core.stock.sources.fetch_quote', return_value={"price": "10.0", "time": "2026-01-05 10:00:00"}) as fetch:
+        schedule_task = reload_schedule_task()
+        summary = schedule_task.fetch_task()
+
+    assert sorted(call.args[0] for call in fetch.call_args_list) == ["ab-000001", "ab-600519"]
+    # 每个市场每轮只判断一次
+    assert gate.decide.call_count == 2
+    assert summary['total'] == 3
+    assert summary['success'] == 2
+    assert summary['closed'] == 1
+
+
+def test_fetch_task_releases_post_close_snapshot_when_a_quote_fails(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_MARKET_HOURS_ONLY', True)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_latest_prices.return_value = {}
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "00700", "stock_url": "hk-00700"},
+    ]
+    close = datetime.datetime(2026, 1, 5, 15, 0)
+    gate = MagicMock()
+    gate.decide.side_effect = lambda market: (True, close)
+
+    def fetch(stock_url):
+        if stock_url == "hk-00700":
+            raise RuntimeError("circuit open")
+        return {"price": "10.0", "time": "2026-01-05 15:00:00"}
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.trading_calendar.get_session_gate', return_value=gate), \
+            patch('apps.core.stock.sources.fetch_quote', side_effect=fetch):
+        schedule_task = reload_schedule_task()
+        summary = schedule_task.fetch_task()
+
+    assert (summary['success'], summary['failed']) == (1, 1)
+    # 只撤销抓取失败的市场，下一轮重新抓取其收盘快照
+    gate.release.assert_called_once_with('hk', close)
+
+
+def test_fetch_task_adaptive_polling_defers_stocks_not_yet_due(monkeypatch):
+    from config.settings import settings
+    from apps.core.stock.polling import PollingPlanner
+    monkeypatch.setattr(settings, 'FETCH_ADAPTIVE_POLLING', True)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_recent_prices.return_value = []
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "NEAR", "stock_url": "ab-600519", "price_low": 9.9, "price_high": None},
+        {"id": 2, "stock_code": "FAR", "stock_url": "ab-000001", "price_low": None, "price_high": None},
+    ]
+    planner = PollingPlanner(min_interval=0, max_interval=900)
+    quotes = ({"price": "10.0", "time": f"2026-01-05 10:0{minute}:00"} for minute in range(10))
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.polling.get_polling_planner', return_value=planner), \
+            patch('apps.core.stock.sources.fetch_quote', side_effect=lambda stock_url: next(quotes)) as fetch:
+        schedule_task = reload_schedule_task()
+        first = schedule_task.fetch_task()
+        second = schedule_task.fetch_task()
+
+    assert first['success'] == 2 and first['deferred'] == 0
+    # 没有阈值的股票按最长间隔安排，第二轮只抓取接近阈值的股票
+    assert second['success'] == 1 and second['deferred'] == 1
+    assert fetch.call_args_list[-1].args[0] == "ab-600519"
+
+
+def test_fetch_task_post_close_snapshot_includes_deferred_stocks(monkeypatch):
+    from config.settings import settings
+    from apps.core.stock.polling import PollingPlanner
+    monkeypatch.setattr(settings, 'FETCH_ADAPTIVE_POLLING', True)
+    monkeypatch.setattr(settings, 'FETCH_MARKET_HOURS_ONLY', True)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_recent_prices.return_value = []
+    storage.get_latest_prices.return_value = {}
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "NEAR", "stock_url": "ab-600519", "price_low": 9.9, "price_high": None},
+        {"id": 2, "stock_code": "FAR", "stock_url": "ab-000001", "price_low": None, "price_high": None},
+    ]
+    planner = PollingPlanner(min_interval=0, max_interval=900)
+    quotes = ({"price": "10.0", "time": f"2026-01-05 1{minute}:00:00"} for minute in range(10))
+    # 第一轮开市，第二轮收盘后抓取收盘快照
+    gate = MagicMock()
+    gate.decide.side_effect = [(True, None), (True, datetime.datetime(2026, 1, 5, 15, 0))]
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.polling.get_polling_planner', return_value=planner), \
+            patch('apps.core.stock.trading_calendar.get_session_gate', return_value=gate), \
+            patch('apps.core.stock.sources.fetch_quote', side_effect=lambda stock_url: next(quotes)):
+        schedule_task = reload_schedule_task()
+        first = schedule_task.fetch_task()
+        second = schedule_task.fetch_task()
+
+    assert first['success'] == 2
+    # 未到轮询时间的股票同样抓取收盘快照
+    assert second['success'] == 2 and second['deferred'] == 0
+    gate.release.assert_not_called()
+
+
+def test_fetch_task_fetches_in_priority_order(monkeypatch):
+    from config.settings import settings
+    from apps.core.stock.fetch_queue import FetchPriorityQueue
+    from apps.core.stock.last_quotes import LastQuoteBook
+    monkeypatch.setattr(settings, 'FETCH_CONCURRENCY', 1)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_latest_prices.side_effect = lambda codes: {code: {"stock_price": 100.0, "stock_time": None} for code in codes}
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "QUIET", "stock_url": "ab-000001", "price_low": 10, "price_high": None},
+        {"id": 2, "stock_code": "NEAR", "stock_url": "ab-600519", "price_low": 99.5, "price_high": None},
+        {"id": 3, "stock_code": "VIP", "stock_url": "ab-000002", "price_low": None, "price_high": None, "priority": 1},
+    ]
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.fetch_queue.get_fetch_queue', return_value=FetchPriorityQueue(book=LastQuoteBook())), \
+            patch('apps.core.stock.sources.fetch_quote', return_value={"price": "100.0", "time": "2026-01-05 10:00:00"}) as fetch:
+        schedule_task = reload_schedule_task()
+        schedule_task.fetch_task()
+
+    assert [call.args[0] for call in fetch.call_args_list] == ["ab-000002", "ab-600519", "ab-000001"]
+
+
+def test_fetch_task_skips_unchanged_quotes():
+    storage = MagicMock()
+    storage.connect.return_value = True
+    # 数据库中已有 600519 在 15:00:00 的收盘价
+    storage.get_latest_prices.return_value = {
+        "600519": {"stock_price": 1500.0, "stock_time": datetime.datetime(2026, 1, 5, 15, 0, 0)},
+    }
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "000001", "stock_url": "ab-000001"},
+    ]
+    closing = {"price": "1500.0", "time": "2026-01-05 15:00:00"}
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.sources.fetch_quote', return_value=closing):
+        schedule_task = reload_schedule_task()
+        first = schedule_task.fetch_task()
+        second = schedule_task.fetch_task()
+
+    assert (first['success'], first['unchanged']) == (1, 1)
+    assert (second['success'], second['unchanged']) == (0, 2)
+    assert [row['stock_code'] for row in saved_rows(storage)] == ["000001"]
+
+
+def test_fetch_task_dispatches_to_worker_processes(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_WORKER_PROCESSES', 2)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "00700", "stock_url": "hk-00700"},
+        {"id": 3, "stock_code": "AAPL", "stock_url": None},
+    ]
+    supervisor = MagicMock()
+    supervisor.map.return_value = iter([
+        (1, 'timeout', None),
+        (0, 'ok', {"price": "1502.46", "time": "2026-01-05 14:59:00"}),
+    ])
+
+    with patch('config.database.get_db_storage', return_value=storage):
+        with patch('apps.core.stock.worker_supervisor.get_worker_supervisor', return_value=supervisor):
+            schedule_task = reload_schedule_task()
+            summary = schedule_task.fetch_task()
+
+    supervisor.map.assert_called_once_with(["ab-600519", "hk-00700"])
+    assert summary['success'] == 1
+    assert summary['timeout'] == 1
+    assert summary['skipped'] == 1
+    assert [row['stock_code'] for row in saved_rows(storage)] == ["600519"]
+
+
+def test_fetch_task_counts_failed_bulk_write_as_failures():
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_latest_prices.return_value = {}
+    storage.save_stock_price_history_many.return_value = False
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "000001", "stock_url": "ab-000001"},
+    ]
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.sources.fetch_quote', return_value={"price": "10.0", "time": "2026-01-05 10:00:00"}):
+        schedule_task = reload_schedule_task()
+        summary = schedule_task.fetch_task()
+
+    assert (summary['success'], summary['failed']) == (0, 2)
+    assert 'queued' not in summary
+    # 写入失败的行情不记入最近行情，下一轮仍会写入
+    from apps.core.stock.last_quotes import get_last_quote_book
+    assert get_last_quote_book().get("600519") is None
+
+
+def test_fetch_task_flushes_quotes_in_small_ordered_chunks(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'PRICE_HISTORY_FLUSH_SIZE', 2)
+    monkeypatch.setattr(settings, 'FETCH_CONCURRENCY', 1)
+    monkeypatch.setattr(settings, 'FETCH_PRIORITY_ORDER', False)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_latest_prices.return_value = {}
+    storage.query_concern_stocks.return_value = [
+        {"id": i, "stock_code": code, "stock_url": f"ab-{code}"}
+        for i, code in enumerate(["600000", "600001", "600002", "600003", "600004"], start=1)
+    ]
+
+    with patch('config.database.get_db_storage', return_value=storage), \
+            patch('apps.core.stock.sources.fetch_quote', return_value={"price": "10.0", "time": "2026-01-05 10:00:00"}):
+        schedule_task = reload_schedule_task()
+        summary = schedule_task.fetch_task()
+
+    chunks = [[row['stock_code'] for row in call.args[0]] for call in storage.save_stock_price_history_many.call_args_list]
+    assert chunks == [["600000", "600001"], ["600002", "600003"], ["600004"]]
+    assert summary['success'] == 5
+    assert 'queued' not in summary
+
+
+def test_price_history_batch_writes_near_threshold_quotes_immediately(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_ADAPTIVE_POLLING', False)
+    schedule_task = reload_schedule_task()
+
+    storage = MagicMock()
+    batch = schedule_task.PriceHistoryBatch(storage, flush_size=10, urgent_distance=0.02)
+
+    def row(code, price):
+        return {'stock_code': code, 'stock_price': price, 'stock_time': "2026-01-05 10:00:00"}
+
+    batch.add({"stock_code": "600000", "price_low": 5.0, "price_high": 20.0}, row("600000", 10.0))
+    storage.save_stock_price_history_many.assert_not_called()
+
+    # 距上限不足 2%：连同之前待写入的行情立即写入
+    batch.add({"stock_code": "600001", "price_high": 10.1}, row("600001", 10.0))
+    assert [r['stock_code'] for r in saved_rows(storage)] == ["600000", "600001"]
+
+    # 用户设置了优先级的股票同样立即写入
+    batch.add({"stock_code": "600002", "priority": 3}, row("600002", 10.0))
+    assert storage.save_stock_price_history_many.call_count == 2
+    assert (batch.saved, batch.failed, len(batch)) == (3, 0, 0)
+
+
+def test_fetch_task_writes_queued_quotes_when_the_fetch_loop_fails(monkeypatch):
+    from config.settings import settings
+    monkeypatch.setattr(settings, 'FETCH_WORKER_PROCESSES', 1)
+    monkeypatch.setattr(settings, 'FETCH_PRIORITY_ORDER', False)
+
+    storage = MagicMock()
+    storage.connect.return_value = True
+    storage.get_latest_prices.return_value = {}
+    storage.query_concern_stocks.return_value = [
+        {"id": 1, "stock_code": "600519", "stock_url": "ab-600519"},
+        {"id": 2, "stock_code": "000001", "stock_url": "ab-000001"},
+    ]
+
+    def broken_map(stock_urls):
+        yield 0, 'ok', {"price": "1502.46", "time": "2026-01-05 14:59:00"}
+        raise RuntimeError("supervisor pipe closed")
+
+    supervisor = MagicMock()
+    supervisor.map.side_effect = broken_map
+
+    with patch('config.database.get_db_storage', return_value=storage):
+        with patch('apps.core.stock.worker_supervisor.get_worker_supervisor', return_value=supervisor):
+            schedule_task = reload_schedule_task()
+            summary = schedule_task.fetch_task()
+
+    assert summary is None
+    assert [row['stock_code'] for row in saved_rows(storage)] == ["600519"]
@@ -0,0 +1,135 @@
+from unittest.mock import MagicMock, patch
+
+from apps.core.stock.sources import (
+    FallbackSource,
+    GuardedSource,
+    HttpSource,
+    QuoteSource,
+    SeleniumSource,
+    get_source,
+    parse_quotation_payload,
+    split_stock_path_code,
+)
+
+
+QUOTATION_PAYLOAD = {
+    "ResultCode": "0",
+    "Result": {
+        "cur": {"price": "95.50", "time": "2026-01-03 12:00:00"},
+        "pankouinfos": {
+            "list": [
+                {"ename": "peratio", "name": "市盈率(TTM)", "value": "12.3456"},
+                {"ename": "pbratio", "name": "市净率", "value": "1.234"},
+            ]
+        },
+    },
+}
+
+
+def make_http_source(payload=None, exc=None):
+    source = HttpSource(url_template="http://quote/{market}/{code}", timeout=1, pool_size=2)
+    response = MagicMock()
+    response.json.return_value = payload
+    source.session = MagicMock()
+    if exc:
+        source.session.get.side_effect = exc
+    else:
+        source.session.get.return_value = response
+    return source
+
+
+def test_split_stock_path_code():
+    assert split_stock_path_code("ab-600519") == ("ab", "600519")
+    assert split_stock_path_code("HK-00700") == ("hk", "00700")
+    assert split_stock_path_code("600519") == ("ab", "600519")
+
+
+def test_parse_quotation_payload_matches_fetch_stock_shape():
+    res = parse_quotation_payload(QUOTATION_PAYLOAD)
+    assert res['price'] == '95.50'
+    assert res['time'] == '2026-01-03 12:00:00'
+    assert res['pe_ttm'] == 12.35
+    assert res['pb'] == 1.23
+    assert res['roe'] == round((1.234 / 12.3456) * 100, 2)
+
+
+def test_parse_quotation_payload_without_price_returns_none():
+    assert parse_quotation_payload({"Result": {"pankouinfos": []}}) is None
+    assert parse_quotation_payload(None) is None
+
+
+def test_parse_quotation_payload_without_cur_falls_back_to_browser():
+    # 没有 cur 时不能把分时数据中的开盘价当作当前价格
+    payload = {"Result": {"minute": [{"time": "09:30", "price": "10.00"}, {"time": "09:31", "price": "10.02"}]}}
+    assert parse_quotation_payload(payload) is None
+    assert parse_quotation_payload({"Result": {"cur": "95.50"}}) is None
+
+    fallback = MagicMock(spec=QuoteSource)
+    fallback.name = "gushitong"
+    fallback.fetch.return_value = {"price": "10.35", "time": "2026-01-03 12:00:00"}
+    source = FallbackSource(make_http_source(payload), fallback)
+    assert source.fetch("ab-600519")['price'] == "10.35"
+    fallback.fetch.assert_called_once_with("ab-600519")
+
+
+def test_http_source_builds_url_from_path_code():
+    source = make_http_source(QUOTATION_PAYLOAD)
+    res = source.fetch("ab-600519")
+    source.session.get.assert_called_once_with("http://quote/ab/600519", timeout=1.0)
+    assert res['price'] == '95.50'
+
+
+def test_http_source_returns_none_on_request_error():
+    source = make_http_source(exc=Exception("connection reset"))
+    assert source.fetch("ab-600519") is None
+
+
+def test_fallback_source_uses_fallback_only_when_primary_fails():
+    primary = MagicMock(spec=QuoteSource)
+    primary.name = 'http'
+    fallback = MagicMock(spec=QuoteSource)
+    fallback.name = 'gushitong'
+    fallback.fetch.return_value = {"price": "1.0"}
+    source = FallbackSource(primary, fallback)
+
+    primary.fetch.return_value = {"price": "2.0"}
+    assert source.fetch("ab-600519") == {"price": "2.0"}
+    fallback.fetch.assert_not_called()
+
+    primary.fetch.return_value = None
+    assert source.fetch("ab-600519") == {"price": "1.0"}
+
+    primary.fetch.side_effect = RuntimeError("blocked")
+    assert source.fetch("ab-600519") == {"price": "1.0"}
+    assert fallback.fetch.call_count == 2
+
+
+def test_get_source_selects_backend_by_name():
+    gushitong = get_source('gushitong')
+    assert isinstance(gushitong, GuardedSource)
+    assert isinstance(gushitong.source, SeleniumSource)
+    http = get_source('http')
+    assert isinstance(http, FallbackSource)
+    assert isinstance(http.primary.source, HttpSource)
+    # 浏览器回退与 'gushitong' 共用同一个限流器与熔断器
+    assert http.fallback is gushitong
+
+
+def test_selenium_source_delegates_to_fetch_stock():
+    with patch('apps.core.stock.fetcher.fetch_stock', return_value={"price": "3.0"}) as mock_fetch:
+        assert SeleniumSource().fetch("ab-600519") == {"price": "3.0"}
+        mock_fetch.assert_called_once_with("ab-600519")
+
+
+def test_selenium_source_batches_through_tabs_when_enabled():
+    source = SeleniumSource()
+    with patch('apps.core.stock.sources.settings.FETCH_TABS_PER_BROWSER', 1):
+        assert source.batch is False
+    with patch('apps.core.stock.sources.settings.FETCH_TABS_PER_BROWSER', 4), \
+            patch('apps.core.stock.sources.settings.FETCH_CONCURRENCY', 3):
+        assert source.batch is True
+        assert source.batch_workers == 3
+
+    with patch('apps.core.stock.fetcher.fetch_stocks', return_value={"ab-600519": None}) as mock_fetch:
+        assert source.fetch_many(["ab-600519"]) == {"ab-600519": None}
+        mock_fetch.assert_called_once_with(["ab-600519"])
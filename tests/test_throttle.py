@@ -0,0 +1,130 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from apps.core.stock.sources import GuardedSource, QuoteSource
+from apps.core.stock.throttle import CircuitBreaker, TokenBucket, parse_rate_limits
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_parse_rate_limits_ignores_malformed_items():
+    assert parse_rate_limits("gushitong=1, HTTP=5,bad,yfinance=x") == {"gushitong": 1.0, "http": 5.0}
+    assert parse_rate_limits("") == {}
+
+
+def test_token_bucket_allows_burst_then_waits():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=clock.sleep)
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == pytest.approx(0.5)
+
+    bucket.acquire()
+    assert clock.now == pytest.approx(0.5)
+
+
+def test_token_bucket_charges_full_cost_above_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=1, burst=2, clock=clock, sleep=clock.sleep)
+
+    # 一次批量加载 10 个页面：桶中 2 个令牌立即可用，其余 8 个按 1 个/秒等待
+    bucket.acquire(10)
+    assert clock.now == pytest.approx(8)
+    assert bucket.try_acquire() == pytest.approx(1)
+
+    with pytest.raises(ValueError):
+        bucket.try_acquire(3)
+
+
+def test_token_bucket_reserve_returns_wait_without_blocking():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock, sleep=MagicMock(side_effect=AssertionError))
+    assert bucket.reserve() == 0
+    # 透支的令牌让之后的预约依次顺延
+    assert bucket.reserve() == pytest.approx(0.5)
+    assert bucket.reserve(2) == pytest.approx(1.5)
+    clock.now = 1.5
+    assert bucket.reserve() == pytest.approx(0.5)
+
+
+def test_token_bucket_without_rate_is_unlimited():
+    bucket = TokenBucket(rate=0, clock=FakeClock(), sleep=MagicMock(side_effect=AssertionError))
+    for _ in range(100):
+        bucket.acquire()
+
+
+def test_circuit_breaker_opens_after_threshold_and_recovers_through_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker("http", failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()  # 半开：放行一个探测请求
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_circuit_breaker_success_resets_consecutive_failures():
+    breaker = CircuitBreaker("http", failure_threshold=2, clock=FakeClock())
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def make_guarded(inner, threshold=1):
+    clock = FakeClock()
+    limiter = TokenBucket(rate=0, clock=clock, sleep=clock.sleep)
+    breaker = CircuitBreaker(inner.name, failure_threshold=threshold, reset_timeout=60, clock=clock)
+    return GuardedSource(inner, limiter, breaker), clock
+
+
+def test_guarded_source_skips_upstream_while_open():
+    inner = MagicMock(spec=QuoteSource)
+    inner.name = 'http'
+    inner.fetch.side_effect = RuntimeError("blocked")
+    source, clock = make_guarded(inner)
+
+    with pytest.raises(RuntimeError):
+        source.fetch("ab-600519")
+    assert source.fetch("ab-600519") is None
+    assert inner.fetch.call_count == 1
+
+    clock.now = 60
+    inner.fetch.side_effect = None
+    inner.fetch.return_value = {"price": "1.0"}
+    assert source.fetch("ab-600519") == {"price": "1.0"}
+    assert source.breaker.state == CircuitBreaker.CLOSED
+
+
+def test_guarded_source_fetch_many_counts_empty_batch_as_failure():
+    inner = MagicMock(spec=QuoteSource)
+    inner.name = 'yfinance'
+    inner.request_cost.return_value = 1
+    inner.fetch_many.return_value = {"us-AAPL": None}
+    source, _ = make_guarded(inner)
+
+    assert source.fetch_many(["us-AAPL"]) == {"us-AAPL": None}
+    assert source.fetch_many(["us-AAPL"]) == {"us-AAPL": None}
+    assert inner.fetch_many.call_count == 1
@@ -0,0 +1,111 @@
+import datetime
+import importlib
+from zoneinfo import ZoneInfo
+
+from apps.core.stock import trading_calendar
+from apps.core.stock.trading_calendar import MarketSessionGate, SnapshotStore, TradingCalendar, load_holidays
+
+SHANGHAI = ZoneInfo('Asia/Shanghai')
+NEW_YORK = ZoneInfo('America/New_York')
+HONG_KONG = ZoneInfo('Asia/Hong_Kong')
+
+
+def at(tz, *args):
+    return datetime.datetime(*args, tzinfo=tz)
+
+
+def make_calendar():
+    return TradingCalendar({'ab': {datetime.date(2026, 10, 1), datetime.date(2026, 10, 2)}})
+
+
+def test_sessions_lunch_break_weekends_and_holidays():
+    calendar = make_calendar()
+
+    assert calendar.is_open('ab', at(SHANGHAI, 2026, 9, 30, 10, 0))
+    assert not calendar.is_open('ab', at(SHANGHAI, 2026, 9, 30, 12, 0))
+    assert not calendar.is_open('ab', at(SHANGHAI, 2026, 9, 30, 15, 0))
+    assert not calendar.is_open('ab', at(SHANGHAI, 2026, 10, 1, 10, 0))
+    assert not calendar.is_open('ab', at(SHANGHAI, 2026, 10, 3, 10, 0))
+    # 不同市场按各自交易所当地时间判断：北京时间 22:00 为纽约 10:00
+    assert calendar.is_open('us', at(SHANGHAI, 2026, 9, 30, 22, 0))
+    # 未知市场视为始终开市
+    assert calendar.is_open('xx', at(SHANGHAI, 2026, 10, 3, 3, 0))
+
+
+def test_last_close_skips_weekends_and_holidays():
+    calendar = make_calendar()
+
+    assert calendar.last_close('ab', at(SHANGHAI, 2026, 10, 5, 9, 0)) == at(SHANGHAI, 2026, 9, 30, 15, 0)
+    assert calendar.last_close('ab', at(SHANGHAI, 2026, 9, 30, 15, 1)) == at(SHANGHAI, 2026, 9, 30, 15, 0)
+    assert calendar.last_close('us', at(NEW_YORK, 2026, 10, 5, 9, 0)) == at(NEW_YORK, 2026, 10, 2, 16, 0)
+
+
+def test_gate_takes_one_post_close_snapshot_per_close():
+    gate = MarketSessionGate(make_calendar())
+
+    assert gate.should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 14, 0))
+    assert gate.should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 14, 30))
+    # 收盘后第一轮抓取收盘快照，之后跳过（包括节假日与周末）
+    assert gate.should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 15, 5))
+    assert not gate.should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 20, 0))
+    assert not gate.should_fetch('ab', at(SHANGHAI, 2026, 10, 1, 10, 0))
+    assert not gate.should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 9, 0))
+    # 午休不会触发收盘快照
+    assert gate.should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 10, 0))
+    assert not gate.should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 12, 0))
+    assert gate.should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 15, 30))
+
+
+def test_post_close_snapshot_is_remembered_across_runs(tmp_path):
+    path = tmp_path / "snapshots.sqlite3"
+    after_close = at(SHANGHAI, 2026, 9, 30, 20, 0)
+
+    # 每次一次性运行（cron、run_fetch.py）都创建新的闸门
+    assert MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', after_close)
+    assert not MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', after_close)
+    assert not MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 9, 0))
+    # 其他市场与下一次收盘各自放行一次
+    assert MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('us', after_close)
+    assert MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', at(SHANGHAI, 2026, 10, 5, 15, 30))
+
+
+def test_hk_snapshot_waits_for_the_closing_auction():
+    gate = MarketSessionGate(make_calendar())
+
+    # 16:00 收市后收市竞价持续到 16:10 左右：此前仍视为上一交易日的收盘（已抓取过则跳过）
+    assert gate.should_fetch('hk', at(HONG_KONG, 2026, 9, 29, 20, 0))
+    assert not gate.should_fetch('hk', at(HONG_KONG, 2026, 9, 30, 16, 5))
+    assert gate.should_fetch('hk', at(HONG_KONG, 2026, 9, 30, 16, 10))
+    assert not gate.should_fetch('hk', at(HONG_KONG, 2026, 9, 30, 17, 0))
+
+
+def test_released_snapshot_is_fetched_again(tmp_path):
+    path = tmp_path / "snapshots.sqlite3"
+    after_close = at(SHANGHAI, 2026, 9, 30, 20, 0)
+
+    fetch, close = MarketSessionGate(make_calendar(), SnapshotStore(path)).decide('ab', after_close)
+    assert (fetch, close) == (True, at(SHANGHAI, 2026, 9, 30, 15, 0))
+    # 收盘快照未能写入：撤销记录后下一次运行重新放行，写入成功后不再放行
+    MarketSessionGate(make_calendar(), SnapshotStore(path)).release('ab', close)
+    assert MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', after_close)
+    assert not MarketSessionGate(make_calendar(), SnapshotStore(path)).should_fetch('ab', after_close)
+
+    gate = MarketSessionGate(make_calendar())
+    assert gate.should_fetch('ab', after_close)
+    gate.release('ab', close)
+    assert gate.should_fetch('ab', after_close)
+
+
+def test_session_gate_state_survives_module_reload():
+    module = importlib.reload(trading_calendar)
+    assert module.get_session_gate().should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 20, 0))
+    module = importlib.reload(trading_calendar)
+    assert not module.get_session_gate().should_fetch('ab', at(SHANGHAI, 2026, 9, 30, 20, 0))
+
+
+def test_load_holidays(tmp_path):
+    path = tmp_path / "holidays.txt"
+    path.write_text("# 注释\nab 2026-10-01 国庆节\nUS 2026-12-25\nbad line\nhk 2026-13-01\n", encoding='utf-8')
+
+    assert load_holidays(path) == {'ab': {datetime.date(2026, 10, 1)}, 'us': {datetime.date(2026, 12, 25)}}
+    assert load_holidays(tmp_path / "missing.txt") == {}
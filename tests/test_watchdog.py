@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import time
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from apps.core.stock import fetcher
+from apps.core.stock.watchdog import (
+    FetchDeadline,
+    FetchDeadlineExceeded,
+    _descendant_pids,
+    current_deadline,
+    fetch_deadline,
+    kill_process_tree,
+)
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="依赖 /proc 或 psutil 查找子进程")
+def test_kill_process_tree_kills_children():
+    parent = subprocess.Popen(["sh", "-c", "sleep 30 & sleep 30 & wait"])
+    time.sleep(0.2)
+    children = _descendant_pids(parent.pid)
+    assert len(children) == 2
+
+    kill_process_tree(parent.pid)
+
+    assert parent.wait(timeout=5) != 0
+    time.sleep(0.1)
+    for pid in children:
+        assert not os.path.exists(f"/proc/{pid}") or "Z" in open(f"/proc/{pid}/stat").read().split(")")[-1][:3]
+
+
+def test_deadline_expiry_kills_attached_driver():
+    driver = MagicMock()
+    driver.service.process.pid = 12345
+
+    with patch('apps.core.stock.watchdog.kill_process_tree') as mock_kill:
+        deadline = FetchDeadline(0.05, "ab-600519").start()
+        deadline.attach(driver)
+        time.sleep(0.2)
+
+    assert deadline.expired
+    assert deadline.exceeded
+    mock_kill.assert_called_once_with(12345)
+
+
+def test_detached_driver_is_not_killed():
+    driver = MagicMock()
+    driver.service.process.pid = 12345
+
+    with patch('apps.core.stock.watchdog.kill_process_tree') as mock_kill:
+        deadline = FetchDeadline(0.05).start()
+        deadline.attach(driver)
+        deadline.detach(driver)
+        time.sleep(0.2)
+
+    mock_kill.assert_not_called()
+
+
+def test_fetch_deadline_is_thread_local_and_restored():
+    assert current_deadline() is None
+    with fetch_deadline(5) as deadline:
+        assert current_deadline() is deadline
+        assert 0 < deadline.remaining() <= 5
+    assert current_deadline() is None
+
+
+def test_fetch_stock_raises_when_deadline_exceeded():
+    def hung_fetch(stock_path_code):
+        time.sleep(0.3)
+        return None
+
+    with patch.object(fetcher.settings, 'FETCH_STOCK_DEADLINE', 0.1), \
+            patch('apps.core.stock.fetcher._fetch_stock', side_effect=hung_fetch):
+        with pytest.raises(FetchDeadlineExceeded):
+            fetcher.fetch_stock("ab-600519")
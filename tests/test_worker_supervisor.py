@@ -0,0 +1,146 @@
+import os
+import time
+
+import pytest
+
+from apps.core.stock.throttle import CircuitBreaker
+from apps.core.stock.worker_supervisor import FetchWorkerSupervisor, RemoteBreaker, RemoteLimiter
+
+
+def echo_worker(worker_id, conn, source_name=None):
+    """测试用子进程：回传进程号；'crash' 直接退出，'hang' 一直不返回"""
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, code = task
+        if code == 'crash':
+            os._exit(1)
+        if code == 'hang':
+            time.sleep(60)
+        conn.send((task_id, 'ok', {"price": "1.0", "code": code, "pid": os.getpid()}))
+
+
+def guarded_worker(worker_id, conn, source_name=None):
+    """测试用子进程：经父进程限流与熔断后“请求上游”；'bad' 视为上游失败，'crash' 在请求中途退出"""
+    limiter, breaker = RemoteLimiter(conn, "gushitong"), RemoteBreaker(conn, "gushitong")
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        task_id, code = task
+        if not breaker.allow():
+            conn.send((task_id, 'failed', None))
+            continue
+        limiter.acquire(1)
+        if code == 'crash':
+            os._exit(1)
+        if code == 'bad':
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        conn.send((task_id, 'ok', {"price": "1.0", "pid": os.getpid()}))
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.reserved = []
+
+    def reserve(self, tokens):
+        self.reserved.append(tokens)
+        return 0.0
+
+
+def make_supervisor(**kwargs):
+    kwargs.setdefault('worker_target', echo_worker)
+    kwargs.setdefault('workers', 2)
+    kwargs.setdefault('max_rss_mb', 0)
+    kwargs.setdefault('max_pages', 0)
+    kwargs.setdefault('task_timeout', 10)
+    return FetchWorkerSupervisor(start_method='fork', **kwargs)
+
+
+@pytest.fixture
+def supervisor_factory():
+    created = []
+
+    def factory(**kwargs):
+        supervisor = make_supervisor(**kwargs)
+        created.append(supervisor)
+        return supervisor
+
+    yield factory
+    for supervisor in created:
+        supervisor.shutdown()
+
+
+def test_map_returns_result_for_every_code(supervisor_factory):
+    supervisor = supervisor_factory()
+    codes = ["ab-600519", "hk-00700", "ab-600519", "us-AAPL"]
+    results = {index: (status, data) for index, status, data in supervisor.map(codes)}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert all(status == 'ok' for status, _ in results.values())
+    assert [results[i][1]['code'] for i in range(4)] == codes
+
+
+def test_crashed_worker_is_restarted_and_remaining_codes_fetched(supervisor_factory):
+    supervisor = supervisor_factory(workers=1)
+    results = {index: status for index, status, _ in supervisor.map(["crash", "ab-600519"])}
+    assert results == {0: 'failed', 1: 'ok'}
+    assert supervisor.restarts == 1
+
+
+def test_hung_worker_is_killed_after_task_timeout(supervisor_factory):
+    supervisor = supervisor_factory(workers=1, task_timeout=0.5)
+    results = {index: status for index, status, _ in supervisor.map(["hang", "ab-600519"])}
+    assert results == {0: 'timeout', 1: 'ok'}
+
+
+def test_worker_is_recycled_after_max_pages(supervisor_factory):
+    supervisor = supervisor_factory(workers=1, max_pages=2)
+    pids = [data['pid'] for _, _, data in supervisor.map(["a", "b", "c", "d"])]
+    assert pids[0] == pids[1]
+    assert pids[2] == pids[3]
+    assert pids[1] != pids[2]
+
+
+def test_worker_is_recycled_when_rss_exceeds_limit(supervisor_factory):
+    supervisor = supervisor_factory(workers=1, max_rss_mb=100, rss_reader=lambda pid: 200 * 1024 * 1024)
+    pids = [data['pid'] for _, _, data in supervisor.map(["a", "b"])]
+    assert pids[0] != pids[1]
+    assert supervisor.restarts == 2
+
+
+def test_workers_share_the_parent_rate_limiter(supervisor_factory):
+    limiter = RecordingLimiter()
+    breaker = CircuitBreaker("gushitong", failure_threshold=0)
+    supervisor = supervisor_factory(worker_target=guarded_worker, guards=lambda name: (limiter, breaker))
+
+    results = list(supervisor.map(["a", "b", "c", "d", "e", "f"]))
+    assert all(status == 'ok' for _, status, _ in results)
+    assert len({data['pid'] for _, _, data in results}) == 2
+    # 两个子进程的每次请求都在父进程的同一个令牌桶中预约
+    assert limiter.reserved == [1] * 6
+
+
+def test_workers_share_the_parent_circuit_breaker(supervisor_factory):
+    breaker = CircuitBreaker("gushitong", failure_threshold=2, reset_timeout=60)
+    supervisor = supervisor_factory(workers=1, worker_target=guarded_worker,
+                                    guards=lambda name: (RecordingLimiter(), breaker))
+
+    results = {index: status for index, status, _ in supervisor.map(["bad", "bad", "a"])}
+    assert results == {0: 'ok', 1: 'ok', 2: 'failed'}
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_crash_mid_request_is_recorded_as_breaker_failure(supervisor_factory):
+    breaker = CircuitBreaker("gushitong", failure_threshold=1, reset_timeout=60)
+    supervisor = supervisor_factory(workers=1, worker_target=guarded_worker,
+                                    guards=lambda name: (RecordingLimiter(), breaker))
+
+    results = {index: status for index, status, _ in supervisor.map(["crash", "a"])}
+    assert results == {0: 'failed', 1: 'failed'}
+    assert breaker.state == CircuitBreaker.OPEN
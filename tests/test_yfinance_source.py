@@ -0,0 +1,71 @@
+import sys
+from types import ModuleType
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+from apps.core.stock.sources import YFinanceSource, to_yfinance_symbol
+
+
+def inject_yfinance(monkeypatch, download_result, info=None):
+    """在 sys.modules 中注入一个离线的假 yfinance 模块"""
+    yf = ModuleType("yfinance")
+    yf.download = MagicMock(return_value=download_result)
+
+    def make_tickers(symbols):
+        tickers = MagicMock()
+        tickers.tickers = {s: MagicMock(info=(info or {}).get(s, {})) for s in symbols.split()}
+        return tickers
+
+    yf.Tickers = MagicMock(side_effect=make_tickers)
+    monkeypatch.setitem(sys.modules, "yfinance", yf)
+    return yf
+
+
+def make_download_frame():
+    index = pd.to_datetime(["2026-01-05 14:58:00", "2026-01-05 14:59:00"])
+    columns = pd.MultiIndex.from_product([["600519.SS", "0700.HK"], ["Open", "Close"]])
+    rows = [
+        [1500.0, 1501.0, 380.0, 381.0],
+        [1501.0, 1502.456, 381.0, float("nan")],
+    ]
+    return pd.DataFrame(rows, index=index, columns=columns)
+
+
+def test_to_yfinance_symbol():
+    assert to_yfinance_symbol("ab-600519") == "600519.SS"
+    assert to_yfinance_symbol("ab-000858") == "000858.SZ"
+    assert to_yfinance_symbol("hk-00700") == "0700.HK"
+    assert to_yfinance_symbol("us-aapl") == "AAPL"
+    assert to_yfinance_symbol("300750") == "300750.SZ"
+    assert to_yfinance_symbol("000858.SZ") == "000858.SZ"
+
+
+def test_fetch_many_downloads_all_symbols_in_one_call(monkeypatch):
+    yf = inject_yfinance(monkeypatch, make_download_frame())
+
+    res = YFinanceSource(fundamentals=False).fetch_many(["ab-600519", "hk-00700", "us-MISSING"])
+
+    yf.download.assert_called_once()
+    assert sorted(yf.download.call_args.kwargs["tickers"]) == ["0700.HK", "600519.SS", "MISSING"]
+    assert res["ab-600519"] == {"price": "1502.46", "time": "2026-01-05 14:59:00"}
+    # 最后一分钟为 NaN 时取最近一个有效价格
+    assert res["hk-00700"] == {"price": "381.00", "time": "2026-01-05 14:58:00"}
+    assert res["us-MISSING"] is None
+
+
+def test_fetch_many_with_fundamentals_matches_fetch_stock_shape(monkeypatch):
+    inject_yfinance(monkeypatch, make_download_frame(), info={"600519.SS": {"trailingPE": 12.3456, "priceToBook": 1.234}})
+
+    res = YFinanceSource(fundamentals=True).fetch_many(["ab-600519"])
+
+    assert res["ab-600519"]["pe_ttm"] == 12.35
+    assert res["ab-600519"]["pb"] == 1.23
+    assert res["ab-600519"]["roe"] == round((1.234 / 12.3456) * 100, 2)
+
+
+def test_fetch_many_returns_none_on_download_error(monkeypatch):
+    yf = inject_yfinance(monkeypatch, None)
+    yf.download.side_effect = Exception("network down")
+
+    assert YFinanceSource(fundamentals=False).fetch_many(["ab-600519"]) == {"ab-600519": None}